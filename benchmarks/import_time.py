@@ -0,0 +1,81 @@
+# import_time.py
+# Mohammad Usman
+#
+# Measures how long `import gemini` takes and how much memory it uses, for a
+# few common ways of using the package. Every measurement runs in a fresh
+# interpreter.
+#
+#   python benchmarks/import_time.py --runs 20 --output import_time.json
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'interpreter': '',
+    'import gemini': 'import gemini',
+    'PublicClient': 'import gemini; gemini.PublicClient',
+    'PrivateClient': 'import gemini; gemini.PrivateClient',
+    'OrderEventsWS': 'import gemini; gemini.OrderEventsWS',
+    'everything': 'import gemini; [getattr(gemini, name) '
+                  'for name in gemini.__all__ if name != "AsyncPrivateClient"]',
+}
+
+PROBE = '''
+import resource, sys, time, json
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'maxrss_kb': after,
+                  'rss_growth_kb': after - before,
+                  'modules': len(sys.modules)}}))
+'''
+
+
+def measure(code, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.check_output(
+            [sys.executable, '-c', PROBE.format(code=code)], cwd=ROOT)
+        samples.append(json.loads(out.decode('utf-8')))
+    seconds = [s['seconds'] * 1000 for s in samples]
+    return {
+        'median_ms': statistics.median(seconds),
+        'min_ms': min(seconds),
+        'max_ms': max(seconds),
+        'maxrss_kb': statistics.median(s['maxrss_kb'] for s in samples),
+        'rss_growth_kb': statistics.median(s['rss_growth_kb']
+                                           for s in samples),
+        'modules': samples[-1]['modules']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measures the import time and memory of gemini')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='Write the results to a JSON file')
+    args = parser.parse_args()
+    results = {name: measure(code, args.runs)
+               for name, code in SCENARIOS.items()}
+    print('{:<16}{:>12}{:>12}{:>14}{:>10}'.format(
+        'scenario', 'median ms', 'min ms', 'rss growth kB', 'modules'))
+    for name, result in results.items():
+        print('{:<16}{:>12.2f}{:>12.2f}{:>14}{:>10}'.format(
+            name, result['median_ms'], result['min_ms'],
+            result['rss_growth_kb'], result['modules']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version, 'runs': args.runs,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
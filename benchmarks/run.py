@@ -0,0 +1,206 @@
+# run.py
+# Mohammad Usman
+#
+# Benchmarks the websocket message handlers and request signing on
+# synthetic data, without touching the network.
+#
+#   python -m benchmarks.run --output before.json
+#   python -m benchmarks.run --compare before.json
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gemini import feeds
+from gemini.order_book import GeminiOrderBook
+from gemini.marketdataws import MarketDataWS
+from gemini.ordereventsws import OrderEventsWS
+from gemini.private_client import PrivateClient
+from gemini.ratelimit import RateLimiter
+
+
+class _Response:
+    status_code = 200
+    headers = {}
+
+    def json(self):
+        return {'result': 'ok'}
+
+
+class _Session:
+    """
+    Stands in for requests.Session, so api_query only does the signing
+    """
+    def post(self, url, headers=None, timeout=None):
+        return _Response()
+
+
+def _percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(p / 100.0 * len(sorted_values)))
+    return sorted_values[index]
+
+
+def measure(setup, call, inputs):
+    """
+    Calls call(target, item) for every item with a fresh target from
+    setup(). The first pass times each call, the second one traces memory
+    allocations.
+
+    Returns:
+        dict: Messages per second, per message latency percentiles in
+        microseconds, and the memory kept and peak memory in KiB
+    """
+    target = setup()
+    gc.collect()
+    gc.disable()
+    latencies = []
+    clock = time.perf_counter_ns
+    try:
+        start = clock()
+        for item in inputs:
+            t0 = clock()
+            call(target, item)
+            latencies.append(clock() - t0)
+        total = clock() - start
+    finally:
+        gc.enable()
+    del target
+    gc.collect()
+
+    target = setup()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for item in inputs:
+        call(target, item)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del target
+
+    latencies.sort()
+    return {
+        'messages': len(inputs),
+        'messages_per_sec': len(inputs) / (total / 1e9),
+        'p50_us': _percentile(latencies, 50) / 1000.0,
+        'p90_us': _percentile(latencies, 90) / 1000.0,
+        'p99_us': _percentile(latencies, 99) / 1000.0,
+        'max_us': latencies[-1] / 1000.0,
+        'memory_growth_kib': (after - before) / 1024.0,
+        'memory_peak_kib': (peak - before) / 1024.0
+    }
+
+
+def _signing_client():
+    r = PrivateClient('bench-public-key', 'bench-private-key')
+    r._session = _Session()
+    r._private_rate_limiter = RateLimiter(1e9, 1e9)
+    return r
+
+
+def benchmarks(n, depth, seed):
+    """
+    Returns:
+        dict: The name of every benchmark mapped to its setup, call and
+        inputs, as taken by measure
+    """
+    market_data = list(feeds.market_data_frames(n, depth=depth, seed=seed))
+    order_events = list(feeds.order_event_frames(n, seed=seed))
+    return {
+        'GeminiOrderBook.on_message': (
+            lambda: GeminiOrderBook('btcusd'),
+            lambda r, frame: r.on_message(frame), market_data),
+        'MarketDataWS.on_message': (
+            lambda: MarketDataWS('btcusd'),
+            lambda r, frame: r.on_message(frame), market_data),
+        'OrderEventsWS.on_message': (
+            lambda: OrderEventsWS('bench-public-key', 'bench-private-key'),
+            lambda r, frame: r.on_message(frame), order_events),
+        'PrivateClient.api_query': (
+            _signing_client,
+            lambda r, order_id: r.api_query('/v1/order/status',
+                                            {'order_id': order_id}),
+            [str(i) for i in range(n)]),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(n=20000, depth=500, seed=0, only=None):
+    """
+    Returns:
+        dict: The environment and the results of every benchmark
+    """
+    results = {}
+    for name, (setup, call, inputs) in benchmarks(n, depth, seed).items():
+        if only and only not in name:
+            continue
+        results[name] = measure(setup, call, inputs)
+    return {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'messages': n, 'depth': depth, 'seed': seed},
+        'results': results
+    }
+
+
+def compare(report, baseline):
+    """
+    Prints the throughput and latency of report relative to baseline.
+    """
+    print('\nCompared with {} ({}):'.format(baseline.get('commit'),
+                                             baseline.get('python')))
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        print('{:<28}{:>+10.1%} msg/s{:>+10.1%} p99'.format(
+            name,
+            result['messages_per_sec'] / old['messages_per_sec'] - 1,
+            result['p99_us'] / old['p99_us'] - 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the websocket handlers and request signing')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--depth', type=int, default=500,
+                        help='Price levels per side of the synthetic book')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help='Only run benchmarks containing this')
+    parser.add_argument('--output', help='Write the results to a JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run')
+    args = parser.parse_args()
+
+    report = run(args.messages, args.depth, args.seed, args.only)
+    print('{:<28}{:>12}{:>9}{:>9}{:>9}{:>12}'.format(
+        'benchmark', 'msg/s', 'p50 us', 'p90 us', 'p99 us', 'kept KiB'))
+    for name, result in report['results'].items():
+        print('{:<28}{:>12.0f}{:>9.1f}{:>9.1f}{:>9.1f}{:>12.1f}'.format(
+            name, result['messages_per_sec'], result['p50_us'],
+            result['p90_us'], result['p99_us'], result['memory_growth_kib']))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,51 @@
-from .public_client import PublicClient
-from .private_client import PrivateClient
-from .basewebsocket import BaseWebSocket
-from .marketdataws import MarketDataWS
-from .ordereventsws import OrderEventsWS
-from .order_book import GeminiOrderBook
+# The modules are only imported when one of their classes is first used,
+# so `import gemini` stays cheap for processes that only need a few of them
+import sys
+
+_modules = {
+    'PublicClient': 'public_client',
+    'PrivateClient': 'private_client',
+    'AsyncPrivateClient': 'async_private_client',
+    'BaseWebSocket': 'basewebsocket',
+    'MarketDataWS': 'marketdataws',
+    'OrderEventsWS': 'ordereventsws',
+    'GeminiOrderBook': 'order_book',
+    'TradeDownloader': 'trade_downloader',
+    'OrderStateStore': 'order_state',
+    'OrderEventJournal': 'order_journal',
+    'GapRecovery': 'gap_recovery',
+    'BalanceCache': 'balance_cache',
+    'HeartbeatKeeper': 'heartbeat',
+    'OrderLatencyTracker': 'order_latency',
+    'FakeExchange': 'fake_exchange',
+    'Profiler': 'profiling',
+    'SamplingProfiler': 'profiling',
+}
+
+__all__ = list(_modules)
+
+
+def __getattr__(name):
+    from importlib import import_module
+    if name not in _modules:
+        # Submodules such as gemini.nonce are imported on first access too
+        try:
+            return import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != '{}.{}'.format(__name__, name):
+                raise
+        raise AttributeError("module 'gemini' has no attribute {!r}"
+                             .format(name))
+    value = getattr(import_module('.' + _modules[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules))
+
+
+# Module level __getattr__ needs Python 3.7
+if sys.version_info < (3, 7):
+    for _name in _modules:
+        __getattr__(_name)
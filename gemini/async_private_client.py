@@ -0,0 +1,214 @@
+# async_private_client.py
+# Mohammad Usman
+#
+# An asyncio variant of PrivateClient. Requires aiohttp.
+
+from .private_client import PrivateClient, _invalid_nonce
+from .public_client import POOL_SIZE
+import asyncio
+import json
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class _Response:
+    """
+    The parts of an aiohttp response used to decide whether to retry, read
+    before the connection is released.
+    """
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncPrivateClient(PrivateClient):
+    """
+    Has the same methods as PrivateClient, but each one returns a coroutine
+    to be awaited instead of blocking. Requests are signed the same way as
+    PrivateClient.api_query, draw from the same rate limiters and nonce
+    allocator, and are sent over a pooled aiohttp session.
+
+    The batch methods (new_orders, cancel_orders, get_tickers, ...) run the
+    requests concurrently on the event loop, and the iter_* methods return
+    async generators to be used with `async for`.
+
+    Use the client as an async context manager, or await close() when done,
+    to release the connections.
+    """
+    def __init__(self, PUBLIC_API_KEY, PRIVATE_API_KEY, sandbox=False):
+        if aiohttp is None:
+            raise ImportError('AsyncPrivateClient requires aiohttp, install '
+                              'it with pip install gemini-python[async]')
+        super().__init__(PUBLIC_API_KEY, PRIVATE_API_KEY, sandbox)
+        self._async_session = None
+
+    def _aiohttp_session(self):
+        # The session is created on first use so that it belongs to the
+        # running event loop
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=POOL_SIZE))
+        return self._async_session
+
+    async def close(self):
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _send(self, request, limiter, retry_policy, resend_if=None,
+                    path=None):
+        """
+        Same as PublicClient._send, except that request must return the
+        keyword arguments of aiohttp.ClientSession.request for each attempt.
+        With a profiler attached, each attempt is timed under path like
+        Profiler.post.
+        """
+        session = self._aiohttp_session()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        profiler = None if path is None else self.profiler
+        clock = time.perf_counter_ns
+        attempt = 0
+        while True:
+            await limiter.acquire_async()
+            try:
+                kwargs = request()
+                start = clock()
+                async with session.request(timeout=timeout, **kwargs) as r:
+                    headers_at = clock()
+                    response = _Response(r.status, r.headers, await r.text())
+                    if profiler is not None:
+                        read = clock()
+                        profiler.record(path + ('server',), start, headers_at)
+                        profiler.record(path + ('read',), headers_at, read)
+                    resend = resend_if is not None and resend_if(response)
+                    if not resend and r.status not in retry_policy.statuses:
+                        body = response.json()
+                        if profiler is not None:
+                            profiler.record(path + ('decode',), read, clock())
+                        return body
+                    if attempt >= retry_policy.max_retries:
+                        r.raise_for_status()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if (not retry_policy.connection_errors or
+                        attempt >= retry_policy.max_retries):
+                    raise
+                await asyncio.sleep(retry_policy.delay(attempt))
+            else:
+                if not resend:
+                    await asyncio.sleep(retry_policy.delay(
+                        attempt, response.headers.get('Retry-After')))
+            attempt += 1
+
+    def _get(self, path, params=None, base_url=None):
+        url = (base_url or self.public_base_url) + path
+        return self._send(lambda: {'method': 'GET', 'url': url,
+                                   'params': params},
+                          self._rate_limiter, self.retry_policy)
+
+    def api_query(self, method, payload=None):
+        if payload is None:
+            payload = {}
+        path = ('AsyncPrivateClient.api_query', method)
+
+        def request():
+            start = time.perf_counter_ns()
+            headers = self._signed_headers(method, payload)
+            headers['X-GEMINI-PAYLOAD'] = headers['X-GEMINI-PAYLOAD'].decode('utf-8')
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.record(path + ('sign',), start,
+                                time.perf_counter_ns())
+            return {'method': 'POST', 'url': self._base_url + method,
+                    'headers': headers}
+
+        return self._send(request, self._private_rate_limiter,
+                          self.private_retry_policy, _invalid_nonce, path)
+
+    async def _tracked_order(self, payload):
+        tracker = self.order_tracker
+        tracker.sent(payload['client_order_id'], payload['symbol'])
+        try:
+            response = await self.api_query('/v1/order/new', payload)
+        except Exception:
+            tracker.forget(payload['client_order_id'])
+            raise
+        tracker.responded(payload['client_order_id'], response)
+        return response
+
+    async def _batch(self, func, product_ids, max_workers):
+        semaphore = asyncio.Semaphore(min(max_workers, POOL_SIZE))
+
+        async def _call(product_id):
+            async with semaphore:
+                try:
+                    return await func(product_id)
+                except (aiohttp.ClientError, asyncio.TimeoutError,
+                        ValueError) as e:
+                    return {
+                        'result': 'error',
+                        'reason': type(e).__name__,
+                        'message': str(e)
+                    }
+
+        results = await asyncio.gather(*map(_call, product_ids))
+        return dict(zip(product_ids, results))
+
+    async def _walk_forward(self, fetch, id_key, limit, since=None,
+                            until=None):
+        seen = set()
+        while True:
+            page = await fetch(since)
+            records = sorted((record for record in page
+                              if record[id_key] not in seen),
+                             key=lambda record: (record['timestampms'],
+                                                 record[id_key]))
+            for record in records:
+                if until is not None and record['timestampms'] > until:
+                    return
+                yield record
+            if len(page) < limit:
+                return
+            if not records:
+                raise ValueError('More than {} records share timestampms {}, '
+                                 'increase the page size to read past them'
+                                 .format(limit, since))
+            if records[-1]['timestampms'] != since:
+                since = records[-1]['timestampms']
+                seen = set()
+            seen.update(record[id_key] for record in records
+                        if record['timestampms'] == since)
+
+    async def iter_trade_history(self, product_id, since=None, until=None,
+                                 since_tid=None, limit_trades=500):
+        params = {'limit_trades': limit_trades}
+        if since_tid is not None:
+            params['since_tid'] = since_tid
+        elif since is not None:
+            params['timestamp'] = since
+        while True:
+            page = await self._get('/trades/' + product_id, params)
+            trades = sorted((trade for trade in page
+                             if since_tid is None or trade['tid'] > since_tid),
+                            key=lambda trade: trade['tid'])
+            for trade in trades:
+                if until is not None and trade['timestampms'] > until:
+                    return
+                yield trade
+            if not trades or len(page) < limit_trades:
+                return
+            since_tid = trades[-1]['tid']
+            params = {'limit_trades': limit_trades, 'since_tid': since_tid}
@@ -0,0 +1,214 @@
+# balance_cache.py
+# Mohammad Usman
+#
+# Balances kept current from fills on the order events websocket, so
+# buying power can be checked without a REST round-trip
+
+from .debugly import typeassert
+from decimal import Decimal
+from threading import Event, RLock, Thread
+import time
+
+
+class BalanceCache:
+    """
+    Starts from PrivateClient.get_balance and applies every fill received
+    on the order events websocket to the balances of the two currencies
+    of the symbol, including the fee.
+
+    Gemini holds funds for resting orders when they are booked, which the
+    cache does not track. A buy fill therefore takes its cost out of the
+    available balance a second time, so available is an underestimate, never
+    an overestimate, until the next sync. Call start_sync to re-sync on a
+    schedule.
+
+    on_event runs on the websocket's thread and never makes a request. The
+    currencies of the symbols passed in are looked up by sync. A fill on any
+    other symbol is held back while its currencies are looked up on a
+    worker thread, and applied once they are known.
+
+    Fills received while sync waits for get_balance are applied again on
+    top of the new balances if they are timestamped after the request was
+    sent. A fill made while the request was in flight can therefore still
+    be counted twice, until the next sync.
+    """
+    def __init__(self, client, symbols=None):
+        """
+        Args:
+            client(PrivateClient): Used to fetch the balances and the
+            currencies of each symbol
+            symbols(list): Symbols whose currencies sync looks up
+        """
+        self.client = client
+        self.symbols = [symbol.lower() for symbol in symbols or ()]
+        self.balances = {}
+        self._currencies = {}
+        # Fills waiting for the currencies of their symbol
+        self._unresolved = {}
+        self._resolving = set()
+        # Fills received while sync is running, and when the last sync
+        # requested the balances
+        self._during_sync = None
+        self._as_of = None
+        self._lock = RLock()
+        self._stop = Event()
+        self._thread = None
+
+    def sync(self):
+        """
+        Looks up the currencies of self.symbols and of fills still waiting
+        for them, then replaces the cached balances with the output of
+        self.client.get_balance.
+        """
+        with self._lock:
+            symbols = set(self.symbols) | set(self._unresolved)
+        for symbol in symbols:
+            if symbol not in self._currencies:
+                self._resolve(symbol)
+        with self._lock:
+            self._during_sync = []
+        as_of = int(time.time() * 1000)
+        try:
+            rows = self.client.get_balance()
+            balances = {}
+            for balance in rows:
+                balances[balance['currency'].upper()] = {
+                    'amount': Decimal(balance['amount']),
+                    'available': Decimal(balance['available']),
+                    'availableForWithdrawal':
+                        Decimal(balance['availableForWithdrawal'])
+                }
+        except Exception:
+            with self._lock:
+                self._during_sync = None
+            raise
+        with self._lock:
+            received, self._during_sync = self._during_sync, None
+            self.balances = balances
+            self._as_of = as_of
+            for event in received:
+                if self._is_new(event):
+                    self._apply(event)
+
+    def _is_new(self, event):
+        """
+        Whether a fill is newer than the balances of the last sync.
+        """
+        timestampms = event.get('timestampms')
+        return (self._as_of is None or timestampms is None or
+                timestampms > self._as_of)
+
+    def _resolve(self, symbol):
+        """
+        Looks up the base and quote currency of symbol with
+        self.client.symbol_details, then applies the fills waiting for
+        them.
+        """
+        try:
+            details = self.client.symbol_details(symbol)
+            currencies = (details['base_currency'].upper(),
+                          details['quote_currency'].upper())
+        except Exception as e:
+            # The fills stay held back and sync tries again
+            print('Symbol details of {} failed: {}'.format(symbol, e))
+            with self._lock:
+                self._resolving.discard(symbol)
+            return
+        with self._lock:
+            self._resolving.discard(symbol)
+            self._currencies[symbol] = currencies
+            for event in self._unresolved.pop(symbol, ()):
+                if self._is_new(event):
+                    self._received(event)
+
+    def _add(self, currency, amount):
+        balance = self.balances.setdefault(currency, {
+            'amount': Decimal(0),
+            'available': Decimal(0),
+            'availableForWithdrawal': Decimal(0)
+        })
+        balance['amount'] += amount
+        balance['available'] += amount
+
+    def on_event(self, event):
+        """
+        Applies a fill event of the order events websocket. Other events
+        are ignored. Pass this method to OrderEventsWS.add_listener, or use
+        self.attach.
+        """
+        if event.get('type') != 'fill':
+            return
+        symbol = event['symbol'].lower()
+        with self._lock:
+            if symbol in self._currencies:
+                self._received(event)
+                return
+            self._unresolved.setdefault(symbol, []).append(event)
+            if symbol in self._resolving:
+                return
+            self._resolving.add(symbol)
+        Thread(target=self._resolve, args=(symbol,), daemon=True).start()
+
+    def _received(self, event):
+        self._apply(event)
+        if self._during_sync is not None:
+            self._during_sync.append(event)
+
+    def _apply(self, event):
+        fill = event['fill']
+        base, quote = self._currencies[event['symbol'].lower()]
+        amount = Decimal(fill['amount'])
+        notional = amount * Decimal(fill['price'])
+        sign = 1 if event['side'] == 'buy' else -1
+        self._add(base, sign * amount)
+        self._add(quote, -sign * notional)
+        self._add(fill['fee_currency'].upper(), -Decimal(fill['fee']))
+
+    def attach(self, ws):
+        """
+        Applies the fills received by ws, an OrderEventsWS of the same
+        account as self.client.
+        """
+        ws.add_listener(self.on_event)
+
+    @typeassert(currency=str)
+    def available(self, currency):
+        """
+        Returns:
+            Decimal: The cached available balance of currency
+        """
+        with self._lock:
+            balance = self.balances.get(currency.upper())
+            return Decimal(0) if balance is None else balance['available']
+
+    @typeassert(currency=str)
+    def position(self, currency):
+        """
+        Returns:
+            Decimal: The cached total balance of currency
+        """
+        with self._lock:
+            balance = self.balances.get(currency.upper())
+            return Decimal(0) if balance is None else balance['amount']
+
+    def start_sync(self, interval=60):
+        """
+        Calls self.sync every interval seconds on a background thread until
+        stop_sync is called.
+        """
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    print('Balance sync failed: {}'.format(e))
+
+        self._stop.clear()
+        self._thread = Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -16,6 +16,8 @@ class BaseWebSocket(metaclass=Cached):
         self.base_url = base_url
         self.ws = None
         self.messages = 0
+        # Set with Profiler.attach to time every frame
+        self.profiler = None
 
     def start(self):
         def _go():
@@ -39,7 +41,10 @@ class BaseWebSocket(metaclass=Cached):
             except Exception as e:
                 self.on_error(e)
             else:
-                self.on_message(json.loads(data))
+                if self.profiler is None:
+                    self.on_message(json.loads(data))
+                else:
+                    self.profiler.websocket_message(self, data)
 
     def _disconnect(self):
         try:
@@ -3,27 +3,57 @@
 #
 # A metaclass that creates catched instances.
 
+from inspect import signature
+from threading import RLock
 import weakref
 
 
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+
 class Cached(type):
+    """
+    Classes using this metaclass return the same instance whenever they are
+    called with the same arguments, for as long as that instance is in use.
+    Arguments are matched by the signature of __init__ with its defaults
+    filled in, so PublicClient(), PublicClient(False) and
+    PublicClient(sandbox=False) are the same client.
+
+    Construction holds a lock per class, so threads creating the same
+    client at once get one instance. Arguments that can't be hashed give a
+    new instance every time.
+    """
     def __init__(self, *args, **kwargs):
-        self.__cache = weakref.WeakValueDictionary()
         super().__init__(*args, **kwargs)
+        self.__cache = weakref.WeakValueDictionary()
+        self.__lock = RLock()
+
+    def _cache_key(self, args, kwargs):
+        try:
+            bound = signature(self.__init__).bind(None, *args, **kwargs)
+        except TypeError:
+            # Let __init__ raise the error
+            return None
+        bound.apply_defaults()
+        try:
+            return tuple((name, _hashable(value))
+                         for name, value in list(bound.arguments.items())[1:])
+        except TypeError:
+            return None
 
     def __call__(self, *args, **kwargs):
-        if kwargs == {'sandbox': False}:
-            key = args + (False,)
-        elif kwargs == {'sandbox': True}:
-            key = args + (True,)
-        else:
-            if len(args) == 1 or len(args) == 3:
-                key = args
-            else:
-                key = args + (False,)
-        if key in self.__cache:
-            return self.__cache[key]
-        else:
-            obj = super().__call__(*args, **kwargs)
-            self.__cache[key] = obj
+        key = self._cache_key(args, kwargs)
+        if key is None:
+            return super().__call__(*args, **kwargs)
+        with self.__lock:
+            obj = self.__cache.get(key)
+            if obj is None:
+                obj = super().__call__(*args, **kwargs)
+                self.__cache[key] = obj
             return obj
@@ -0,0 +1,890 @@
+# fake_exchange.py
+# Mohammad Usman
+#
+# A local stand-in for Gemini's REST API and websockets, to load and soak
+# test against without network access. Requires aiohttp.
+
+from .basewebsocket import BaseWebSocket
+from .public_client import shared_session
+from . import feeds
+from collections import Counter
+from decimal import Decimal, InvalidOperation, ROUND_UP
+from threading import Event, Thread
+from urllib.parse import urlsplit
+import asyncio
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import time
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+TICK = Decimal('0.01')
+FEE_RATES = {'Maker': Decimal('0.0025'), 'Taker': Decimal('0.0035')}
+CANDLE_MS = {'1m': 60000, '5m': 300000, '15m': 900000, '30m': 1800000,
+             '1hr': 3600000, '6hr': 21600000, '1day': 86400000}
+ACCOUNT_ID = 1
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _rejected(reason, message, status=400):
+    body = json.dumps({'result': 'error', 'reason': reason,
+                       'message': message})
+    error = web.HTTPNotFound if status == 404 else web.HTTPBadRequest
+    return error(text=body, content_type='application/json')
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise _rejected('InvalidParameter',
+                        '{} {!r} is not an integer'.format(name, value))
+
+
+def _ms(value):
+    """
+    Timestamps may be given in seconds or milliseconds since the epoch.
+    """
+    value = _int(value, 'timestamp')
+    return value * 1000 if value < 10 ** 11 else value
+
+
+def _page(trades, limit, since=None, since_tid=None):
+    """
+    Pages trades, held oldest first, the way Gemini does: the oldest limit
+    trades after since_tid, or at or after the timestamp since, else the
+    newest limit trades. Either way they are returned newest first.
+    """
+    if since_tid is not None:
+        trades = [t for t in trades if t['tid'] > since_tid][:limit]
+    elif since is not None:
+        trades = [t for t in trades if t['timestampms'] >= since][:limit]
+    else:
+        trades = trades[-limit:] if limit else []
+    return trades[::-1]
+
+
+def _fmt(value):
+    return '{:f}'.format(value.normalize())
+
+
+def _decimal(value, reason):
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite() or number <= 0:
+        raise _rejected(reason, '{!r} is not a positive number'.format(value))
+    return number
+
+
+class _Stream:
+    """
+    One websocket connection. Frames are numbered with socket_sequence as
+    they are sent, and the faults set on the exchange are applied to them.
+    """
+    def __init__(self, exchange, ws):
+        self.exchange = exchange
+        self.ws = ws
+        self.sequence = 0
+        self.sent = 0
+        self._lock = asyncio.Lock()
+
+    async def send(self, frame, sequenced=True):
+        exchange = self.exchange
+        async with self._lock:
+            if self.ws.closed:
+                return
+            if sequenced:
+                sequence = self.sequence
+                self.sequence += 1
+                if isinstance(frame, list):
+                    frame = [dict(event, socket_sequence=sequence)
+                             for event in frame]
+                else:
+                    frame = dict(frame, socket_sequence=sequence)
+                if (exchange.gap_every and sequence and
+                        sequence % exchange.gap_every == 0):
+                    exchange.stats['dropped_frames'] += 1
+                    return
+            await self.ws.send_str(json.dumps(frame))
+            self.sent += 1
+            exchange.stats['frames'] += 1
+            if (exchange.disconnect_after and
+                    self.sent >= exchange.disconnect_after):
+                exchange.stats['disconnects'] += 1
+                await self.ws.close()
+
+
+class _Subscription(_Stream):
+    """
+    A connection to the order events websocket and its filters.
+    """
+    def __init__(self, exchange, ws, query):
+        super().__init__(exchange, ws)
+        self.symbol_filter = [s.lower() for s in query.getall('symbolFilter', [])]
+        self.api_session_filter = query.getall('apiSessionFilter', [])
+        self.event_type_filter = query.getall('eventTypeFilter', [])
+
+    def matches(self, event):
+        return ((not self.symbol_filter or
+                 event.get('symbol') in self.symbol_filter) and
+                (not self.api_session_filter or
+                 event.get('api_session') in self.api_session_filter) and
+                (not self.event_type_filter or
+                 event['type'] in self.event_type_filter))
+
+
+class FakeExchange:
+    """
+    Serves the REST endpoints used by PublicClient and PrivateClient, the
+    market data websocket and the order events websocket from a local
+    aiohttp server running on a background thread.
+
+    Private requests are checked like Gemini checks them: the API key must
+    be known, the payload signed with its secret, the payload's request
+    must match the path and every nonce must be larger than the last one
+    seen for the key, or the request is rejected with a 400 and the same
+    reason Gemini gives.
+
+    Orders are matched against a synthetic book one tick either side of
+    each symbol's mid price. An order crossing it fills straight away as a
+    taker, otherwise it is booked, or cancelled if it is immediate-or-cancel.
+    Booked orders are filled with self.fill. Each step is sent to the order
+    events websocket, so the whole order lifecycle can be tested locally.
+
+    Market data is streamed from gemini.feeds at market_data_rate frames
+    per second per connection, and with order_event_rate set, synthetic
+    order events are mixed into the order events websocket too. Faults can
+    be injected by setting these attributes, also while the exchange runs:
+
+        latency: Seconds added to every REST response, or a function
+        returning them
+        event_latency: Seconds between an order changing and its event
+        being sent, or a function returning them
+        gap_every: Drop every gap_every-th websocket frame, leaving a gap
+        in its socket_sequence
+        disconnect_after: Close every websocket connection after it has
+        sent this many frames
+    """
+    def __init__(self, keys=None, symbols=None, latency=0.0,
+                 event_latency=0.0, market_data_rate=10.0,
+                 order_event_rate=0.0, heartbeat_interval=5.0,
+                 gap_every=None, disconnect_after=None, depth=50, seed=0,
+                 host='127.0.0.1', port=0):
+        """
+        Args:
+            keys(dict): API secrets keyed by public API key
+            symbols(dict): Mid prices keyed by symbol. Defaults to btcusd
+            and ethusd
+            heartbeat_interval(float): Seconds between heartbeats on the
+            order events websocket
+            depth(int): Price levels on each side of the synthetic books
+            seed(int): Seed of the synthetic market data and order events
+            port(int): Defaults to any free port
+        """
+        if web is None:
+            raise ImportError('FakeExchange requires aiohttp, install it '
+                              'with pip install gemini-python[async]')
+        self.keys = dict(keys or {})
+        self.symbols = {symbol.lower(): Decimal(str(mid)).quantize(TICK)
+                        for symbol, mid in (symbols or {
+                            'btcusd': 6400, 'ethusd': 450}).items()}
+        self.latency = latency
+        self.event_latency = event_latency
+        self.market_data_rate = market_data_rate
+        self.order_event_rate = order_event_rate
+        self.heartbeat_interval = heartbeat_interval
+        self.gap_every = gap_every
+        self.disconnect_after = disconnect_after
+        self.depth = depth
+        self.seed = seed
+        self.host = host
+        self.port = port
+        self.url = None
+        self.ws_url = None
+        self.stats = Counter()
+        self.orders = {}
+        self.trades = []
+        self.balances = {}
+        for symbol in self.symbols:
+            for currency in (symbol[:-3], symbol[-3:]):
+                self.balances[currency.upper()] = Decimal(1000000)
+        self._owners = {}
+        self._public_trades = {symbol: [] for symbol in self.symbols}
+        self._nonces = {}
+        self._order_ids = itertools.count(100000000)
+        self._trade_ids = itertools.count(200000000)
+        self._event_ids = itertools.count(300000000)
+        self._streams = set()
+        self._loop = None
+        self._thread = None
+        self._error = None
+
+    def add_key(self, public_key, private_key):
+        self.keys[public_key] = private_key
+
+    # Running the server
+
+    def start(self):
+        """
+        Starts serving on a background thread and returns once self.url
+        and self.ws_url can be connected to.
+        """
+        ready = Event()
+        self._thread = Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._setup())
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._cleanup())
+        self._loop.close()
+
+    async def _setup(self):
+        @web.middleware
+        async def delay(request, handler):
+            self.stats['requests'] += 1
+            seconds = self._seconds(self.latency)
+            if seconds:
+                await asyncio.sleep(seconds)
+            return await handler(request)
+
+        app = web.Application(middlewares=[delay])
+        router = app.router
+        for path, handler in self._public_routes().items():
+            router.add_get(path, self._public(handler))
+        for path, handler in self._private_routes().items():
+            router.add_post(path, self._signed(handler))
+        router.add_get('/v1/marketdata/{symbol}', self._market_data)
+        router.add_get('/v1/order/events', self._order_events)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = 'http://{}:{}'.format(host, port)
+        self.ws_url = 'ws://{}:{}'.format(host, port)
+        self._events = asyncio.Queue()
+        self._publisher = asyncio.ensure_future(self._publish_events())
+
+    async def _cleanup(self):
+        self._publisher.cancel()
+        await self._close_streams()
+        await self._runner.cleanup()
+
+    async def _close_streams(self):
+        for stream in list(self._streams):
+            await stream.ws.close()
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _call(self, func, *args):
+        """
+        Runs func on the server's event loop and returns its result.
+        """
+        async def run():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self._loop).result()
+
+    def connect(self, *targets):
+        """
+        Points clients and websockets at this exchange instead of Gemini.
+        Instances are shared between everything created with the same
+        arguments, so give the clients keys of their own.
+
+        Args:
+            targets: PublicClient, PrivateClient, AsyncPrivateClient,
+            MarketDataWS or OrderEventsWS instances. Their rate limiters
+            are left as they are
+        """
+        for target in targets:
+            if isinstance(target, BaseWebSocket):
+                target.base_url = self.ws_url + urlsplit(target.base_url).path
+                continue
+            target.public_base_url = self.url + '/v1'
+            target.public_base_url_v2 = self.url + '/v2'
+            target._session = shared_session(self.url)
+            if hasattr(target, '_base_url'):
+                target._base_url = self.url
+
+    def disconnect(self):
+        """
+        Closes every websocket connection, as an outage would.
+        """
+        async def close():
+            self.stats['disconnects'] += len(self._streams)
+            await self._close_streams()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+
+    @staticmethod
+    def _seconds(value):
+        return value() if callable(value) else value
+
+    # Public API
+
+    def _public(self, handler):
+        async def respond(request):
+            return web.json_response(handler(request.query,
+                                              **request.match_info))
+        return respond
+
+    def _public_routes(self):
+        return {
+            '/v1/symbols': self._symbols,
+            '/v1/symbols/details/{symbol}': self._symbol_details,
+            '/v1/pubticker/{symbol}': self._ticker,
+            '/v1/book/{symbol}': self._book,
+            '/v1/trades/{symbol}': self._trades,
+            '/v1/auction/{symbol}': self._auction,
+            '/v1/auction/{symbol}/history': self._auction_history,
+            '/v1/pricefeed': self._price_feed,
+            '/v2/candles/{symbol}/{time_frame}': self._candles,
+        }
+
+    def _symbol(self, symbol):
+        symbol = symbol.lower()
+        if symbol not in self.symbols:
+            raise _rejected('InvalidSymbol',
+                            'Supplied value {!r} is not a valid symbol'
+                            .format(symbol))
+        return symbol
+
+    def _touch(self, symbol):
+        """
+        Returns:
+            tuple: The best bid and ask of symbol's synthetic book
+        """
+        mid = self.symbols[symbol]
+        return mid - TICK, mid + TICK
+
+    def _symbols(self, query):
+        return sorted(self.symbols)
+
+    def _symbol_details(self, query, symbol):
+        symbol = self._symbol(symbol)
+        return {'symbol': symbol.upper(), 'base_currency': symbol[:-3].upper(),
+                'quote_currency': symbol[-3:].upper(), 'tick_size': 1e-8,
+                'quote_increment': 0.01, 'min_order_size': '0.00001',
+                'status': 'open'}
+
+    def _ticker(self, query, symbol):
+        symbol = self._symbol(symbol)
+        bid, ask = self._touch(symbol)
+        trades = self._public_trades[symbol]
+        return {'bid': str(bid), 'ask': str(ask),
+                'last': trades[-1]['price'] if trades else str(self.symbols[symbol]),
+                'volume': {
+                    symbol[:-3].upper(): _fmt(sum(
+                        (Decimal(t['amount']) for t in trades), Decimal(0))),
+                    symbol[-3:].upper(): _fmt(sum(
+                        (Decimal(t['amount']) * Decimal(t['price'])
+                         for t in trades), Decimal(0))),
+                    'timestamp': _now_ms()}}
+
+    def _book(self, query, symbol):
+        symbol = self._symbol(symbol)
+        rng = random.Random(self.seed)
+        timestamp = str(_now_ms() // 1000)
+        book = {}
+        for side, sign, limit in (('bids', -1, 'limit_bids'),
+                                  ('asks', 1, 'limit_asks')):
+            levels = min(self.depth,
+                         _int(query.get(limit, 50), limit) or self.depth)
+            book[side] = [{'price': str(self.symbols[symbol] + sign * level * TICK),
+                           'amount': '{:.8f}'.format(rng.uniform(0.01, 5)),
+                           'timestamp': timestamp}
+                          for level in range(1, levels + 1)]
+        return book
+
+    def _trades(self, query, symbol):
+        trades = self._public_trades[self._symbol(symbol)]
+        since = query.get('timestamp', query.get('since'))
+        since_tid = query.get('since_tid')
+        return _page(
+            trades,
+            min(500, _int(query.get('limit_trades', 50), 'limit_trades')),
+            None if since is None else _ms(since),
+            None if since_tid is None else _int(since_tid, 'since_tid'))
+
+    def _auction(self, query, symbol):
+        symbol = self._symbol(symbol)
+        now = _now_ms()
+        bid, ask = self._touch(symbol)
+        return {'last_auction_price': str(self.symbols[symbol]),
+                'last_auction_quantity': '0', 'last_highest_bid_price': str(bid),
+                'last_lowest_ask_price': str(ask), 'last_auction_eid': 0,
+                'next_update_ms': now + 60000, 'next_auction_ms': now + 120000}
+
+    def _auction_history(self, query, symbol):
+        self._symbol(symbol)
+        return []
+
+    def _price_feed(self, query):
+        return [{'pair': symbol.upper(), 'price': str(mid),
+                 'percentChange24h': '0.0000'}
+                for symbol, mid in sorted(self.symbols.items())]
+
+    def _candles(self, query, symbol, time_frame):
+        symbol = self._symbol(symbol)
+        if time_frame not in CANDLE_MS:
+            raise _rejected('InvalidTimeFrame', 'Choose from {}'
+                            .format(sorted(CANDLE_MS)))
+        step = CANDLE_MS[time_frame]
+        newest = _now_ms() // step * step
+        mid = float(self.symbols[symbol])
+        rng = random.Random(self.seed)
+        return [[newest - i * step, mid, mid + rng.random(), mid - rng.random(),
+                 mid, rng.uniform(0, 10)] for i in range(100)]
+
+    # Private API
+
+    def _authenticate(self, headers, path):
+        """
+        Returns:
+            tuple: The public API key and the payload of a request to path
+        """
+        key = headers.get('X-GEMINI-APIKEY')
+        if not key:
+            raise _rejected('MissingApikeyHeader', 'No API key was given')
+        secret = self.keys.get(key)
+        if secret is None:
+            raise _rejected('InvalidApiKey',
+                            'Supplied value {!r} is not a known API key'
+                            .format(key))
+        b64_payload = headers.get('X-GEMINI-PAYLOAD', '')
+        signature = hmac.new(secret.encode('utf-8'), b64_payload.encode('utf-8'),
+                             hashlib.sha384).hexdigest()
+        if not hmac.compare_digest(signature,
+                                   headers.get('X-GEMINI-SIGNATURE', '')):
+            raise _rejected('InvalidSignature',
+                            'The signature does not match the payload')
+        try:
+            payload = json.loads(base64.b64decode(b64_payload).decode('utf-8'))
+            nonce = int(payload['nonce'])
+        except (ValueError, KeyError, TypeError):
+            raise _rejected('InvalidJson', 'The payload could not be read')
+        if payload.get('request') != path:
+            raise _rejected('EndpointMismatch',
+                            'The payload requests {!r}, not {!r}'
+                            .format(payload.get('request'), path))
+        last = self._nonces.get(key)
+        if last is not None and nonce <= last:
+            raise _rejected('InvalidNonce',
+                            'Nonce {} has not increased since your last '
+                            'call, which was {}'.format(nonce, last))
+        self._nonces[key] = nonce
+        return key, payload
+
+    def _signed(self, handler):
+        async def respond(request):
+            try:
+                key, payload = self._authenticate(request.headers,
+                                                  request.path)
+            except web.HTTPException:
+                self.stats['rejected'] += 1
+                raise
+            return web.json_response(handler(key, payload,
+                                             **request.match_info))
+        return respond
+
+    def _private_routes(self):
+        return {
+            '/v1/order/new': self._new_order,
+            '/v1/order/cancel': self._cancel_order,
+            '/v1/order/cancel/session': self._cancel_session,
+            '/v1/order/cancel/all': self._cancel_all,
+            '/v1/order/status': self._order_status,
+            '/v1/orders': self._active_orders,
+            '/v1/mytrades': self._past_trades,
+            '/v1/tradevolume': self._trade_volume,
+            '/v1/balances': self._get_balances,
+            '/v1/heartbeat': self._heartbeat,
+            '/v1/transfers': self._transfers,
+            '/v1/deposit/{currency}/newAddress': self._new_address,
+            '/v1/withdraw/{currency}': self._withdraw,
+            '/v1/wrap/{symbol}': self._wrap,
+        }
+
+    def _find(self, payload):
+        order_id = payload.get('order_id')
+        if order_id is not None:
+            order = self.orders.get(str(order_id))
+        else:
+            order = next((o for o in self.orders.values()
+                          if o.get('client_order_id') is not None and
+                          o['client_order_id'] == payload.get('client_order_id')),
+                         None)
+        if order is None:
+            raise _rejected('OrderNotFound', 'Order {} not found'.format(
+                order_id if order_id is not None
+                else payload.get('client_order_id')))
+        return order
+
+    def _new_order(self, key, payload):
+        symbol = self._symbol(str(payload.get('symbol', '')))
+        side = payload.get('side')
+        if side not in ('buy', 'sell'):
+            raise _rejected('InvalidSide', 'Side must be buy or sell')
+        amount = _decimal(payload.get('amount'), 'InvalidQuantity')
+        price = _decimal(payload.get('price'), 'InvalidPrice').quantize(TICK)
+        options = payload.get('options') or []
+        now = _now_ms()
+        order_id = str(next(self._order_ids))
+        order = {
+            'order_id': order_id, 'id': order_id, 'symbol': symbol,
+            'exchange': 'gemini', 'avg_execution_price': '0.00', 'side': side,
+            'type': 'exchange limit', 'timestamp': str(now // 1000),
+            'timestampms': now, 'is_live': True, 'is_cancelled': False,
+            'is_hidden': False, 'was_forced': False, 'executed_amount': '0',
+            'remaining_amount': _fmt(amount), 'options': options,
+            'price': str(price), 'original_amount': _fmt(amount)
+        }
+        if payload.get('client_order_id') is not None:
+            order['client_order_id'] = payload['client_order_id']
+        self.orders[order_id] = order
+        self._owners[order_id] = key
+        self.stats['orders'] += 1
+        self._publish([self._event(order, 'accepted')])
+
+        bid, ask = self._touch(symbol)
+        crosses = price >= ask if side == 'buy' else price <= bid
+        if crosses and 'maker-or-cancel' in options:
+            self._cancel(order, 'MakerOrCancelWouldTake')
+        elif crosses:
+            self._fill(order, amount, ask if side == 'buy' else bid, 'Taker')
+        elif 'immediate-or-cancel' in options:
+            self._cancel(order, 'ImmediateOrCancelWouldPost')
+        else:
+            self._publish([self._event(order, 'booked')])
+        return dict(order)
+
+    def _cancel_order(self, key, payload):
+        order = self._find(payload)
+        if order['is_live']:
+            self._cancel(order, 'Requested')
+        return dict(order)
+
+    def _cancel_many(self, keys):
+        cancelled = []
+        for order in list(self.orders.values()):
+            if order['is_live'] and self._owners[order['order_id']] in keys:
+                self._cancel(order, 'Requested')
+                cancelled.append(int(order['order_id']))
+        return {'result': 'ok',
+                'details': {'cancelledOrders': cancelled, 'cancelRejects': []}}
+
+    def _cancel_session(self, key, payload):
+        return self._cancel_many((key,))
+
+    def _cancel_all(self, key, payload):
+        return self._cancel_many(self.keys)
+
+    def _order_status(self, key, payload):
+        return dict(self._find(payload))
+
+    def _active_orders(self, key, payload):
+        return [dict(order) for order in self.orders.values()
+                if order['is_live']]
+
+    def _past_trades(self, key, payload):
+        symbol = self._symbol(str(payload.get('symbol', '')))
+        trades = [t for t in self.trades if t['symbol'] == symbol]
+        since = payload.get('timestamp')
+        limit = min(500, _int(payload.get('limit_trades') or 500,
+                              'limit_trades'))
+        return _page(trades, limit, None if since is None else _ms(since))
+
+    def _trade_volume(self, key, payload):
+        volume = []
+        for symbol in sorted(self.symbols):
+            amounts = [Decimal(t['amount']) for t in self.trades
+                       if t['symbol'] == symbol]
+            volume.append({'account_id': ACCOUNT_ID, 'symbol': symbol,
+                           'base_currency': symbol[:-3].upper(),
+                           'notional_currency': symbol[-3:].upper(),
+                           'total_volume_base': _fmt(sum(amounts, Decimal(0)))})
+        return [volume]
+
+    def _get_balances(self, key, payload):
+        return [{'type': 'exchange', 'currency': currency,
+                 'amount': _fmt(amount), 'available': _fmt(amount),
+                 'availableForWithdrawal': _fmt(amount)}
+                for currency, amount in sorted(self.balances.items())]
+
+    def _heartbeat(self, key, payload):
+        return {'result': 'ok'}
+
+    def _transfers(self, key, payload):
+        return []
+
+    def _new_address(self, key, payload, currency):
+        return {'currency': currency.upper(),
+                'address': 'fake-{}-{}'.format(currency.lower(),
+                                               next(self._event_ids)),
+                'label': payload.get('label')}
+
+    def _withdraw(self, key, payload, currency):
+        amount = _decimal(payload.get('amount'), 'InvalidQuantity')
+        currency = currency.upper()
+        if self.balances.get(currency, Decimal(0)) < amount:
+            raise _rejected('InsufficientFunds',
+                            'Not enough {} to withdraw'.format(currency))
+        self.balances[currency] -= amount
+        return {'destination': payload.get('address'), 'amount': _fmt(amount),
+                'txHash': hashlib.sha256(str(next(self._event_ids))
+                                         .encode('utf-8')).hexdigest()}
+
+    def _wrap(self, key, payload, symbol):
+        amount = _decimal(payload.get('amount'), 'InvalidQuantity')
+        return {'orderId': next(self._order_ids), 'pair': symbol.upper(),
+                'price': '1', 'priceCurrency': 'USD',
+                'side': payload.get('side'), 'quantity': _fmt(amount),
+                'quantityCurrency': symbol[:-3].upper(),
+                'totalSpend': _fmt(amount), 'totalSpendCurrency': 'USD',
+                'fee': '0', 'feeCurrency': 'USD', 'depositFee': '0',
+                'depositFeeCurrency': symbol[:-3].upper()}
+
+    # Order lifecycle
+
+    def _event(self, order, event_type, **extra):
+        event = {
+            'type': event_type,
+            'order_id': order['order_id'],
+            'event_id': str(next(self._event_ids)),
+            'api_session': self._owners[order['order_id']],
+            'symbol': order['symbol'],
+            'side': order['side'],
+            'order_type': order['type'],
+            'timestamp': str(_now_ms() // 1000),
+            'timestampms': _now_ms(),
+            'is_live': order['is_live'],
+            'is_cancelled': order['is_cancelled'],
+            'is_hidden': False,
+            'avg_execution_price': order['avg_execution_price'],
+            'executed_amount': order['executed_amount'],
+            'remaining_amount': order['remaining_amount'],
+            'original_amount': order['original_amount'],
+            'price': order['price']
+        }
+        if order.get('client_order_id') is not None:
+            event['client_order_id'] = order['client_order_id']
+        event.update(extra)
+        return event
+
+    def _cancel(self, order, reason):
+        order['is_live'] = False
+        order['is_cancelled'] = True
+        self._publish([self._event(order, 'cancelled', reason=reason),
+                       self._event(order, 'closed')])
+
+    def _fill(self, order, amount, price, liquidity):
+        symbol = order['symbol']
+        executed = Decimal(order['executed_amount'])
+        average = Decimal(order['avg_execution_price'])
+        total = executed + amount
+        remaining = Decimal(order['original_amount']) - total
+        order['avg_execution_price'] = str(
+            ((average * executed + price * amount) / total).quantize(TICK))
+        order['executed_amount'] = _fmt(total)
+        order['remaining_amount'] = _fmt(remaining)
+        order['is_live'] = remaining > 0
+
+        now = _now_ms()
+        tid = next(self._trade_ids)
+        fee = (price * amount * FEE_RATES[liquidity]).quantize(TICK, ROUND_UP)
+        base, quote = symbol[:-3].upper(), symbol[-3:].upper()
+        sign = 1 if order['side'] == 'buy' else -1
+        self.balances[base] += sign * amount
+        self.balances[quote] -= sign * price * amount + fee
+        self.trades.append({
+            'symbol': symbol, 'price': str(price), 'amount': _fmt(amount),
+            'timestamp': now // 1000, 'timestampms': now,
+            'type': order['side'].capitalize(),
+            'aggressor': liquidity == 'Taker', 'fee_currency': quote,
+            'fee_amount': str(fee), 'tid': tid, 'order_id': order['order_id'],
+            'exchange': 'gemini', 'is_auction_fill': False
+        })
+        if order.get('client_order_id') is not None:
+            self.trades[-1]['client_order_id'] = order['client_order_id']
+        taker_side = (order['side'] if liquidity == 'Taker' else
+                      'sell' if order['side'] == 'buy' else 'buy')
+        self._public_trades[symbol].append({
+            'timestamp': now // 1000, 'timestampms': now, 'tid': tid,
+            'price': str(price), 'amount': _fmt(amount),
+            'exchange': 'gemini', 'type': taker_side
+        })
+        self.stats['fills'] += 1
+
+        events = [self._event(order, 'fill', fill={
+            'trade_id': str(tid), 'liquidity': liquidity, 'price': str(price),
+            'amount': _fmt(amount), 'fee': str(fee), 'fee_currency': quote})]
+        if not order['is_live']:
+            events.append(self._event(order, 'closed'))
+        self._publish(events)
+
+    def fill(self, order_id, amount=None):
+        """
+        Fills a booked order as a maker at its own price, as if another
+        trader had taken it.
+
+        Args:
+            order_id(str): The order to fill
+            amount(str): Defaults to the whole remaining amount
+
+        Returns:
+            dict: The order status after the fill
+        """
+        def _fill():
+            order = self.orders[str(order_id)]
+            if not order['is_live']:
+                raise ValueError('Order {} is not live'.format(order_id))
+            remaining = Decimal(order['remaining_amount'])
+            fill_amount = remaining if amount is None else min(
+                Decimal(str(amount)), remaining)
+            self._fill(order, fill_amount, Decimal(order['price']), 'Maker')
+            return dict(order)
+        return self._call(_fill)
+
+    # Websockets
+
+    def _publish(self, events):
+        """
+        Queues a frame of order events for the order events websocket
+        after self.event_latency.
+        """
+        delay = self._seconds(self.event_latency) or 0
+        self._events.put_nowait((self._loop.time() + delay, events))
+
+    async def _publish_events(self):
+        # Frames are sent in the order they were published, so a random
+        # event_latency delays them without reordering them
+        while True:
+            due, events = await self._events.get()
+            wait = due - self._loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            for stream in list(self._streams):
+                if isinstance(stream, _Subscription):
+                    matching = [e for e in events if stream.matches(e)]
+                    if matching:
+                        await stream.send(matching)
+
+    async def _serve(self, stream, *coroutines):
+        """
+        Keeps stream open, running coroutines alongside it, until either
+        side closes it.
+        """
+        tasks = [asyncio.ensure_future(c) for c in coroutines]
+        self._streams.add(stream)
+        try:
+            async for _ in stream.ws:
+                pass
+        finally:
+            self._streams.discard(stream)
+            for task in tasks:
+                task.cancel()
+        return stream.ws
+
+    async def _pace(self, stream, frames, rate_attribute):
+        """
+        Sends frames at getattr(self, rate_attribute) frames per second,
+        skipping empty ones left by a subscription's filters. The rate is
+        read again every time round, so it can be changed while the
+        exchange runs.
+        """
+        credit = 0.0
+        last = self._loop.time()
+        while not stream.ws.closed:
+            rate = getattr(self, rate_attribute)
+            now = self._loop.time()
+            credit = min(credit + (now - last) * rate, max(rate, 1.0))
+            last = now
+            while credit >= 1 and not stream.ws.closed:
+                frame = next(frames)
+                if frame:
+                    await stream.send(frame)
+                credit -= 1
+            await asyncio.sleep(min(0.1, 1.0 / rate) if rate > 0 else 0.1)
+
+    async def _market_data(self, request):
+        symbol = self._symbol(request.match_info['symbol'])
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        stream = _Stream(self, ws)
+
+        def stamped(frames):
+            for frame in frames:
+                now = _now_ms()
+                frame['timestamp'], frame['timestampms'] = now // 1000, now
+                yield frame
+
+        frames = stamped(feeds.market_data_frames(
+            None, depth=self.depth, mid=float(self.symbols[symbol]),
+            tick=float(TICK), seed=self.seed))
+        await stream.send(next(frames))
+        return await self._serve(
+            stream, self._pace(stream, frames, 'market_data_rate'))
+
+    async def _order_events(self, request):
+        try:
+            self._authenticate(request.headers, request.path)
+        except web.HTTPException:
+            self.stats['rejected'] += 1
+            raise
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        stream = _Subscription(self, ws, request.query)
+        await stream.send({
+            'type': 'subscription_ack', 'accountId': ACCOUNT_ID,
+            'subscriptionId': 'ws-order-events-{}'.format(next(self._event_ids)),
+            'symbolFilter': stream.symbol_filter,
+            'apiSessionFilter': stream.api_session_filter,
+            'eventTypeFilter': stream.event_type_filter}, sequenced=False)
+        synthetic = (
+            [e for e in frame if stream.matches(e)]
+            for frame in feeds.order_event_frames(
+                None, symbols=sorted(self.symbols), seed=self.seed)
+            if isinstance(frame, list))
+        return await self._serve(
+            stream, self._heartbeats(stream),
+            self._pace(stream, synthetic, 'order_event_rate'))
+
+    async def _heartbeats(self, stream):
+        for sequence in itertools.count():
+            await asyncio.sleep(self.heartbeat_interval)
+            await stream.send({'type': 'heartbeat', 'timestampms': _now_ms(),
+                               'sequence': sequence,
+                               'trace_id': 'fake-{}'.format(sequence)})
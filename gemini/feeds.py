@@ -0,0 +1,138 @@
+# feeds.py
+# Mohammad Usman
+#
+# Synthetic websocket frames shaped like Gemini's market data and order
+# events feeds. Every generator takes a seed, so a benchmark sees exactly
+# the same frames from one run to the next. Also streamed by FakeExchange.
+
+import itertools
+import random
+
+START_MS = 1512080804958
+
+
+def market_data_frames(n, depth=500, trade_ratio=0.1, events_per_frame=3,
+                       mid=6400.0, tick=0.01, seed=0):
+    """
+    Yields the frames of the market data websocket: an initial frame
+    listing depth price levels on each side, then n update frames. Each
+    update holds events_per_frame changes near the top of the book, a
+    quarter of which remove a level, and with probability trade_ratio
+    starts with a trade. With n set to None the updates never end.
+
+    Yields:
+        dict: Frames with the keys 'type', 'eventId', 'socket_sequence',
+        'timestamp', 'timestampms' and 'events'
+    """
+    rng = random.Random(seed)
+    events = []
+    for side, sign in (('bid', -1), ('ask', 1)):
+        for level in range(1, depth + 1):
+            events.append({
+                'type': 'change',
+                'reason': 'initial',
+                'side': side,
+                'price': '{:.2f}'.format(mid + sign * level * tick),
+                'remaining': '{:.8f}'.format(rng.uniform(0.01, 5)),
+                'delta': '0'
+            })
+    yield {'type': 'update', 'eventId': 0, 'socket_sequence': 0,
+           'timestamp': START_MS // 1000, 'timestampms': START_MS,
+           'events': events}
+    for sequence in (itertools.count(1) if n is None else range(1, n + 1)):
+        events = []
+        if rng.random() < trade_ratio:
+            maker_side = rng.choice(('bid', 'ask'))
+            events.append({
+                'type': 'trade',
+                'tid': sequence,
+                'price': '{:.2f}'.format(
+                    mid + (tick if maker_side == 'ask' else -tick)),
+                'amount': '{:.8f}'.format(rng.uniform(0.001, 1)),
+                'makerSide': maker_side
+            })
+        for _ in range(events_per_frame):
+            side = rng.choice(('bid', 'ask'))
+            level = int(rng.expovariate(0.05)) % depth + 1
+            sign = -1 if side == 'bid' else 1
+            remaining = (0 if rng.random() < 0.25
+                         else rng.uniform(0.01, 5))
+            events.append({
+                'type': 'change',
+                'reason': 'place' if remaining else 'cancel',
+                'side': side,
+                'price': '{:.2f}'.format(mid + sign * level * tick),
+                'remaining': '{:.8f}'.format(remaining),
+                'delta': '0'
+            })
+        timestampms = START_MS + sequence * 10
+        yield {'type': 'update', 'eventId': sequence,
+               'socket_sequence': sequence,
+               'timestamp': timestampms // 1000, 'timestampms': timestampms,
+               'events': events}
+
+
+def order_event_frames(n, symbols=('btcusd', 'ethusd'), heartbeat_every=50,
+                       seed=0):
+    """
+    Yields the frames of the order events websocket: a subscription ack,
+    then n frames with consecutive socket_sequence numbers. Every
+    heartbeat_every-th frame is a heartbeat, and the rest each carry one
+    event of an order's lifecycle: accepted, booked, one to three fills,
+    then closed, or cancelled instead of filled. With n set to None the
+    frames never end.
+
+    Yields:
+        dict or list: A heartbeat or ack dict, or a list of order events
+    """
+    rng = random.Random(seed)
+    yield {'type': 'subscription_ack', 'accountId': 1, 'subscriptionId': 'bench',
+           'symbolFilter': [], 'apiSessionFilter': [], 'eventTypeFilter': []}
+    pending = []
+    next_order = 0
+    heartbeats = 0
+    for sequence in (itertools.count() if n is None else range(n)):
+        timestampms = START_MS + sequence * 10
+        if sequence % heartbeat_every == 0:
+            yield {'type': 'heartbeat', 'timestampms': timestampms,
+                   'sequence': heartbeats, 'socket_sequence': sequence,
+                   'trace_id': 'bench'}
+            heartbeats += 1
+            continue
+        if not pending or (len(pending) < 100 and rng.random() < 0.3):
+            next_order += 1
+            fills = rng.choice((0, 1, 1, 2, 3))
+            stages = (['accepted', 'booked'] + ['fill'] * fills +
+                      ['closed' if fills else 'cancelled'])
+            pending.append({'order_id': str(next_order),
+                            'client_order_id': 'bench-{}'.format(next_order),
+                            'symbol': rng.choice(symbols),
+                            'side': rng.choice(('buy', 'sell')),
+                            'stages': stages, 'fills': fills})
+        order = pending[rng.randrange(len(pending))]
+        stage = order['stages'].pop(0)
+        if not order['stages']:
+            pending.remove(order)
+        event = {
+            'type': stage,
+            'order_id': order['order_id'],
+            'event_id': str(sequence),
+            'client_order_id': order['client_order_id'],
+            'api_session': 'bench',
+            'symbol': order['symbol'],
+            'side': order['side'],
+            'order_type': 'exchange limit',
+            'timestamp': str(timestampms // 1000),
+            'timestampms': timestampms,
+            'is_live': stage in ('accepted', 'booked', 'fill'),
+            'is_cancelled': stage == 'cancelled',
+            'is_hidden': False,
+            'price': '6400.00',
+            'original_amount': '1',
+            'socket_sequence': sequence
+        }
+        if stage == 'fill':
+            event['fill'] = {'trade_id': str(sequence), 'liquidity': 'Maker',
+                             'price': '6400.00', 'amount': '0.25',
+                             'fee': '0.01', 'fee_currency': 'USD'}
+        yield [event]
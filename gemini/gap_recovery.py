@@ -0,0 +1,97 @@
+# gap_recovery.py
+# Mohammad Usman
+#
+# Catches up on order events missed because of a gap in the socket_sequence
+# of the order events websocket
+
+import time
+
+
+class GapRecovery:
+    """
+    Called by OrderEventsWS when a frame is missing from its sequence. Only
+    the symbols that could have been affected are reconciled: those with
+    live orders in ws.order_state, those the subscription is filtered to,
+    and those in the frame that arrived after the gap.
+
+    The state of their orders is brought in line with
+    PrivateClient.active_orders, and fills made since the last event
+    before the gap are fetched with PrivateClient.iter_past_trades. Fills
+    the websocket had not already delivered are passed to the listeners of
+    ws as fill events, marked with 'recovered': True, so a BalanceCache or
+    an OrderLatencyTracker sees them too.
+    """
+    def __init__(self, client):
+        """
+        Args:
+            client(PrivateClient): Client of the same account as the
+            websocket
+        """
+        self.client = client
+        self.recoveries = 0
+        self.recovered_fills = 0
+
+    def affected_symbols(self, ws, msg):
+        symbols = {order['symbol'] for order in ws.order_state.active_orders()
+                   if order.get('symbol')}
+        symbols.update(symbol.lower() for symbol in ws.symbol_filter)
+        if isinstance(msg, list):
+            symbols.update(event['symbol'] for event in msg
+                           if event.get('symbol'))
+        return sorted(symbols)
+
+    def recover(self, ws, msg, since):
+        """
+        Args:
+            ws(OrderEventsWS): The websocket that found the gap
+            msg(list or dict): The frame received after the gap
+            since(int): timestampms of the last frame before the gap. When
+            no frame before the gap carried one, fills are fetched from the
+            newest fill ws has received, or from the first fill of the
+            account
+
+        Returns:
+            list: The symbols that were reconciled
+        """
+        symbols = self.affected_symbols(ws, msg)
+        if not symbols:
+            return symbols
+        if since is None:
+            since = self._last_fill(ws)
+        as_of = int(time.time() * 1000)
+        ws.order_state.reconcile(self.client.active_orders(), as_of,
+                                 symbols=symbols)
+        for symbol in symbols:
+            for trade in self.client.iter_past_trades(symbol, since=since):
+                event = self._fill_event(symbol, trade)
+                if not ws.seen_trade(event['fill']['trade_id']):
+                    self.recovered_fills += 1
+                    ws.dispatch(event)
+        self.recoveries += 1
+        return symbols
+
+    @staticmethod
+    def _last_fill(ws):
+        return max((event['timestampms'] for event in ws.order_book['fill']
+                    if event.get('timestampms') is not None), default=0)
+
+    @staticmethod
+    def _fill_event(symbol, trade):
+        return {
+            'type': 'fill',
+            'order_id': str(trade['order_id']),
+            'symbol': symbol,
+            'side': trade['type'].lower(),
+            'timestamp': str(trade['timestamp']),
+            'timestampms': trade['timestampms'],
+            'fill': {
+                'trade_id': str(trade['tid']),
+                'liquidity': 'Maker' if trade.get('aggressor') is False
+                             else 'Taker',
+                'price': trade['price'],
+                'amount': trade['amount'],
+                'fee': trade['fee_amount'],
+                'fee_currency': trade['fee_currency']
+            },
+            'recovered': True
+        }
@@ -0,0 +1,259 @@
+# heartbeat.py
+# Mohammad Usman
+#
+# Keeps a heartbeat-enabled API key alive from a background thread
+
+from collections import deque
+from threading import Event, Lock, Thread
+import random
+import time
+import requests
+from .private_client import _invalid_nonce
+
+# Gemini cancels every order of a heartbeat-enabled API key if it receives
+# no request from the key for 30 seconds.
+HEARTBEAT_TIMEOUT = 30
+
+# Seconds between the heartbeats Gemini sends on the order events websocket
+WS_HEARTBEAT_INTERVAL = 5
+
+# Number of websocket heartbeats and subscription acks kept
+WS_HEARTBEAT_RETENTION = 100
+
+# Times a heartbeat rejected for its nonce is signed again and resent
+NONCE_RESENDS = 3
+
+
+class HeartbeatKeeper:
+    """
+    Sends /v1/heartbeat for the API key of a PrivateClient on a fixed
+    schedule. Heartbeats go over a connection of their own and skip the
+    client side rate limiter, so a burst of order traffic can't hold them
+    up. A beat rejected with InvalidNonce, which happens when an order
+    signed just before it reaches Gemini after it, is signed again and
+    resent straight away.
+
+    Beats are scheduled against a monotonic clock at start + n * interval,
+    each brought forward by a random amount of up to jitter seconds, so
+    they never drift later over time. The round-trip time of every beat is
+    recorded.
+
+    on_late is called with the number of seconds since the last successful
+    beat, or since start if none has succeeded, once no beat has succeeded
+    for more than late_after seconds. It is checked on every tick of the
+    schedule, so beats that keep failing are reported too, and called once
+    for each stretch without a successful beat. on_failure is called with the exception or error response
+    when a beat fails.
+    """
+    def __init__(self, client, interval=15, jitter=1.0, late_after=None,
+                 timeout=5, on_late=None, on_failure=None):
+        """
+        Args:
+            client(PrivateClient): Client of the heartbeat-enabled API key
+            interval(float): Seconds between beats
+            jitter(float): Maximum number of seconds a beat is sent early
+            late_after(float): Default is 1.5 * interval
+            timeout(float): Seconds to wait for each beat's response
+            on_late(callable): Called with the seconds since the last
+            successful beat
+            on_failure(callable): Called with the exception raised or the
+            error response returned
+        """
+        self.client = client
+        self.interval = interval
+        self.jitter = min(jitter, interval)
+        self.late_after = interval * 1.5 if late_after is None else late_after
+        self.timeout = timeout
+        self.on_late = on_late
+        self.on_failure = on_failure
+        self._session = requests.Session()
+        self._stop = Event()
+        self._thread = None
+        self._lock = Lock()
+        self.beats = 0
+        self.failures = 0
+        self.late = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_success = None
+        self._started = None
+        self._late_since = None
+
+    def beat(self):
+        """
+        Sends one heartbeat.
+
+        Returns:
+            bool: Whether Gemini acknowledged it
+        """
+        url = self.client._base_url + '/v1/heartbeat'
+        start = time.monotonic()
+        try:
+            for _ in range(NONCE_RESENDS + 1):
+                r = self._session.post(
+                    url,
+                    headers=self.client._signed_headers('/v1/heartbeat', {}),
+                    timeout=self.timeout)
+                if not _invalid_nonce(r):
+                    break
+            result = r.json()
+        except (requests.RequestException, ValueError) as e:
+            self._failed(e)
+            return False
+        end = time.monotonic()
+        if not isinstance(result, dict) or result.get('result') != 'ok':
+            self._failed(result)
+            return False
+        latency = end - start
+        with self._lock:
+            since_last = self._overdue(end)
+            self.beats += 1
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+            self.last_success = end
+        if since_last is not None and self.on_late is not None:
+            self.on_late(since_last)
+        return True
+
+    def _overdue(self, now):
+        """
+        Returns the seconds since the last successful beat if they are
+        more than late_after and haven't been reported yet, counting them
+        as late, else None. Must be called holding self._lock.
+        """
+        last = (self.last_success if self.last_success is not None
+                else self._started)
+        if last is None or last == self._late_since:
+            return None
+        since_last = now - last
+        if since_last <= self.late_after:
+            return None
+        self._late_since = last
+        self.late += 1
+        return since_last
+
+    def _check_late(self):
+        with self._lock:
+            since_last = self._overdue(time.monotonic())
+        if since_last is not None and self.on_late is not None:
+            self.on_late(since_last)
+
+    def _failed(self, error):
+        with self._lock:
+            self.failures += 1
+        if self.on_failure is not None:
+            self.on_failure(error)
+        else:
+            print('Heartbeat failed: {}'.format(error))
+
+    def stats(self):
+        """
+        Returns:
+            dict: Counts of beats, failures and late beats, and the last,
+            mean and maximum round-trip time in seconds
+        """
+        with self._lock:
+            return {
+                'beats': self.beats,
+                'failures': self.failures,
+                'late': self.late,
+                'last_latency': self.last_latency,
+                'mean_latency': (self.total_latency / self.beats
+                                 if self.beats else None),
+                'max_latency': self.max_latency
+            }
+
+    def start(self):
+        def _run():
+            start = time.monotonic()
+            n = 0
+            while not self._stop.is_set():
+                self.beat()
+                self._check_late()
+                n += 1
+                due = (start + n * self.interval -
+                       random.uniform(0, self.jitter))
+                if self._stop.wait(max(0, due - time.monotonic())):
+                    break
+
+        self._stop.clear()
+        with self._lock:
+            self._started = time.monotonic()
+        self._thread = Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class HeartbeatMonitor:
+    """
+    Records the heartbeats of the order events websocket. Only the last
+    size heartbeats are kept, in self.heartbeats, so memory stays the same
+    however long the connection lives. Liveness is tracked with counters:
+    the number of expected heartbeats that never arrived, judged from the
+    gaps between their timestampms, and the number of breaks in their
+    sequence numbers.
+    """
+    def __init__(self, interval=WS_HEARTBEAT_INTERVAL,
+                 size=WS_HEARTBEAT_RETENTION):
+        self.interval = interval
+        self.heartbeats = deque(maxlen=size)
+        self.count = 0
+        self.missed = 0
+        self.sequence_gaps = 0
+        self.last_seen = None
+        self.last_timestampms = None
+        self.last_sequence = None
+
+    def record(self, heartbeat):
+        now = time.monotonic()
+        timestampms = heartbeat.get('timestampms')
+        if self.last_timestampms is not None and timestampms is not None:
+            gap = (timestampms - self.last_timestampms) / 1000.0
+        elif self.last_seen is not None:
+            gap = now - self.last_seen
+        else:
+            gap = 0
+        self.missed += max(0, int(round(gap / self.interval)) - 1)
+        sequence = heartbeat.get('sequence')
+        # A new connection starts counting again from 0
+        if (sequence is not None and sequence != 0 and
+                self.last_sequence is not None and
+                sequence != self.last_sequence + 1):
+            self.sequence_gaps += 1
+        self.heartbeats.append(heartbeat)
+        self.count += 1
+        self.last_seen = now
+        self.last_timestampms = timestampms
+        self.last_sequence = sequence
+
+    def is_alive(self, tolerance=2):
+        """
+        Returns:
+            bool: Whether a heartbeat was received within the last
+            tolerance intervals
+        """
+        return (self.last_seen is not None and
+                time.monotonic() - self.last_seen <=
+                tolerance * self.interval)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of heartbeats received and missed, breaks in
+            their sequence, the seconds since the last one and its sequence
+        """
+        return {
+            'count': self.count,
+            'missed': self.missed,
+            'sequence_gaps': self.sequence_gaps,
+            'last_seen_ago': (None if self.last_seen is None
+                              else time.monotonic() - self.last_seen),
+            'last_sequence': self.last_sequence
+        }
@@ -6,10 +6,7 @@
 from .basewebsocket import BaseWebSocket
 from .debugly import typeassert
 from collections import OrderedDict
-from xml.etree.ElementTree import Element, tostring
-from xml.dom import minidom
 import os
-import csv
 
 
 class MarketDataWS(BaseWebSocket):
@@ -168,6 +165,7 @@ class MarketDataWS(BaseWebSocket):
             dir(str): Must be in raw string
             newline_selection(str): Default value is ''
         """
+        import csv
         headers = ['type', 'tid', 'price', 'amount', 'makerSide']
         with open(os.path.join(r'{}'.format(dir), 'gemini_market_data.csv'),
                   'w',
@@ -180,6 +178,7 @@ class MarketDataWS(BaseWebSocket):
         """
         Turn a list of dicts into XML.
         """
+        from xml.etree.ElementTree import Element
         parent_elem = Element('trades')
         for trade in self.trades:
             trade_elem = Element('trade')
@@ -198,6 +197,8 @@ class MarketDataWS(BaseWebSocket):
         Args:
             dir(str): Must be in raw string
         """
+        from xml.etree.ElementTree import tostring
+        from xml.dom import minidom
         rough_string = tostring(self._trades_to_xml(), 'utf-8')
         reparsed = minidom.parseString(rough_string).toprettyxml(indent="  ")
         with open(os.path.join(r'{}'.format(dir), 'gemini_market_data.xml'),
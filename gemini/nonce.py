@@ -0,0 +1,86 @@
+# nonce.py
+# Mohammad Usman
+#
+# Strictly increasing nonces shared by everything signing requests with the
+# same API key
+
+from threading import Lock
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class NonceAllocator:
+    """
+    Hands out nonces that are strictly increasing across threads and,
+    when given a path, across processes. Nonces follow the current time in
+    milliseconds, as Gemini expects, but never repeat when several are
+    requested within the same millisecond.
+    """
+    def __init__(self, path=None):
+        if path is not None and fcntl is None:
+            raise ValueError('Sharing nonces between processes requires '
+                             'fcntl, which is not available on this platform')
+        self.path = path
+        self._last = 0
+        self._lock = Lock()
+
+    def _next_shared(self, nonce):
+        """
+        Reads the last nonce handed out by any process from self.path under
+        an exclusive lock and writes back the new one.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            last = os.read(fd, 32).strip()
+            if last:
+                nonce = max(nonce, int(last) + 1)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(nonce).encode('utf-8'))
+        finally:
+            os.close(fd)
+        return nonce
+
+    def next(self):
+        with self._lock:
+            nonce = max(int(time.time() * 1000), self._last + 1)
+            if self.path is not None:
+                nonce = self._next_shared(nonce)
+            self._last = nonce
+            return nonce
+
+
+_allocators = {}
+_allocators_lock = Lock()
+
+
+def nonce_allocator(public_key, path=None):
+    """
+    Returns the NonceAllocator of an API key, creating it on first use.
+    Gemini rejects a nonce that isn't greater than the last one it received
+    for the key, so every client signing with the key must share one.
+
+    Args:
+        public_key(str): The public API key
+        path(str): Optional file used to share nonces with other
+        processes using the same key. Call this with the path before
+        creating any client for the key.
+    """
+    with _allocators_lock:
+        allocator = _allocators.get(public_key)
+        if allocator is None:
+            allocator = _allocators[public_key] = NonceAllocator(path)
+        elif path is not None and allocator.path != path:
+            with allocator._lock:
+                if fcntl is None:
+                    raise ValueError('Sharing nonces between processes '
+                                     'requires fcntl, which is not available '
+                                     'on this platform')
+                allocator.path = path
+        return allocator
@@ -0,0 +1,199 @@
+# order_journal.py
+# Mohammad Usman
+#
+# An append-only journal of order events, so the state of every order can
+# be rebuilt after a restart
+
+from .debugly import typeassert
+from threading import Event, Lock, Thread
+import os
+import json
+import time
+
+
+class OrderEventJournal:
+    """
+    Appends every order event received on OrderEventsWS to a file, one JSON
+    object per line. Writes are flushed to disk with fsync in batches: once
+    sync_every events have been written or sync_interval seconds have
+    passed since the last fsync, whichever comes first. The check is made
+    as each event is appended, so call start_sync to also fsync on a timer
+    when events stop arriving. A crash loses at most the events written
+    since the last fsync.
+
+    After a restart, replay feeds the journal into an OrderStateStore and
+    sets last_timestampms to the time of the last journaled event. The
+    socket_sequence of events isn't kept, since it starts again from 0 on
+    every connection. Orders are then reconciled with one
+    OrderStateStore.sync, and only fills made since last_timestampms need
+    fetching with PrivateClient.iter_past_trades.
+    """
+    @typeassert(path=str, sync_every=int)
+    def __init__(self, path, sync_every=100, sync_interval=1.0):
+        """
+        Args:
+            path(str): The journal file, created if missing
+            sync_every(int): Events written between fsyncs
+            sync_interval(float): Maximum seconds between fsyncs
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = Lock()
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._stop = Event()
+        self._thread = None
+        self.last_timestampms = None
+
+    def _open(self):
+        if self._file is None:
+            self._truncate_partial_line()
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def _truncate_partial_line(self):
+        """
+        Drops a partially written last line left behind by a crash.
+        """
+        try:
+            f = open(self.path, 'rb+')
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            end = tail.rfind(b'\n') + 1
+            if end < len(tail):
+                f.truncate(size - len(tail) + end)
+
+    def append(self, event):
+        """
+        Writes one order event. Pass this method to OrderEventsWS.add_listener,
+        or use self.attach.
+        """
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._lock:
+            f = self._open()
+            f.write(line)
+            self._unsynced += 1
+            self._track(event)
+            if (self._unsynced >= self.sync_every or
+                    time.monotonic() - self._synced_at >= self.sync_interval):
+                self._sync()
+
+    def _track(self, event):
+        if event.get('timestampms') is not None:
+            self.last_timestampms = event['timestampms']
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def sync(self):
+        """
+        Writes every event appended so far to disk.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+
+    def start_sync(self):
+        """
+        Calls self.sync every sync_interval seconds on a background thread
+        until stop_sync or close is called.
+        """
+        def _run():
+            while not self._stop.wait(self.sync_interval):
+                self.sync()
+
+        self._stop.clear()
+        self._thread = Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop_sync()
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def attach(self, ws):
+        """
+        Journals the order events received by ws, an OrderEventsWS.
+        """
+        ws.add_listener(self.append)
+
+    def events(self):
+        """
+        Yields:
+            dict: The journaled events, oldest first. A partially written
+            last line is skipped
+        """
+        try:
+            f = open(self.path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith('\n'):
+                    return
+                yield json.loads(line)
+
+    def replay(self, store):
+        """
+        Rebuilds the state of every journaled order in store, an
+        OrderStateStore. Call store.sync afterwards to pick up anything
+        that happened while nothing was being journaled.
+
+        Returns:
+            int: The number of events replayed
+        """
+        count = 0
+        for event in self.events():
+            store.apply(event)
+            self._track(event)
+            count += 1
+        return count
+
+    def compact(self, store):
+        """
+        Replaces the journal with the journaled events of the orders still
+        in store, so orders that have expired or been removed stop taking
+        up space. The events are read back from the journal under the same
+        lock as append, rather than taken from store, so an event applied
+        to store but not yet appended is neither lost nor written twice.
+        The file is swapped atomically, so a crash leaves either the old
+        journal or the new one.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            events = list(self.events())
+            kept = {order_id for order_id in
+                    {event.get('order_id') for event in events}
+                    if order_id is not None and
+                    store.status_of_order(order_id) is not None}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for event in events:
+                    if event.get('order_id') in kept:
+                        f.write(json.dumps(event, separators=(',', ':')) +
+                                '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._unsynced = 0
+            self._synced_at = time.monotonic()
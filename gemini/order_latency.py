@@ -0,0 +1,196 @@
+# order_latency.py
+# Mohammad Usman
+#
+# Measures how long orders take to go from PrivateClient.new_order to each
+# event on the order events websocket
+
+from .order_state import CLOSING_EVENTS
+from collections import OrderedDict
+from threading import Lock
+import bisect
+import time
+
+# Upper bounds of the histogram buckets, in milliseconds. Anything slower
+# lands in a final overflow bucket
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Stages timed from the moment an order is sent
+STAGES = ('response', 'accepted', 'booked', 'fill')
+
+
+class LatencyHistogram:
+    """
+    Counts latencies in fixed buckets, so memory stays the same however
+    many are recorded. Percentiles are reported as the upper bound of the
+    bucket they fall in.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        """
+        Returns:
+            float: The bucket bound at or below which p percent of the
+            latencies fall, or self.max if they are in the overflow bucket
+        """
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': dict(zip(BUCKETS + ('inf',), self.counts))
+        }
+
+
+class OrderLatencyTracker:
+    """
+    Links each order placed with PrivateClient.new_order to its events on
+    OrderEventsWS by client_order_id, and records how many milliseconds
+    after the request was sent the response arrived and the order was
+    accepted, booked and first filled. Latencies are kept in a
+    LatencyHistogram per symbol and stage.
+
+    Attach the tracker to both the client and the websocket. Orders placed
+    without a client_order_id are given a random one.
+
+    Orders are forgotten once they are filled or closed and the response
+    has been received. At most
+    max_pending orders are followed at a time, the oldest being dropped.
+    """
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._histograms = {}
+        self._lock = Lock()
+
+    def attach(self, client=None, ws=None):
+        """
+        Args:
+            client(PrivateClient): Orders placed with client are timed
+            ws(OrderEventsWS): Websocket of the same account
+        """
+        if client is not None:
+            client.order_tracker = self
+        if ws is not None:
+            ws.add_listener(self.on_event)
+
+    def _record(self, symbol, stage, ms):
+        key = (symbol.lower(), stage)
+        if key not in self._histograms:
+            self._histograms[key] = LatencyHistogram()
+        self._histograms[key].record(ms)
+
+    def sent(self, client_order_id, symbol):
+        """
+        Records that the request for an order is about to be sent.
+        """
+        with self._lock:
+            self._pending[client_order_id] = {
+                'symbol': symbol,
+                'sent': time.monotonic(),
+                'stages': set(),
+                'closed': False
+            }
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+
+    def _stage(self, client_order_id, stage, done=False):
+        now = time.monotonic()
+        with self._lock:
+            order = self._pending.get(client_order_id)
+            if order is None:
+                return
+            if stage in STAGES and stage not in order['stages']:
+                order['stages'].add(stage)
+                self._record(order['symbol'], stage,
+                             (now - order['sent']) * 1000)
+            # The response can arrive after the order has already been
+            # filled, so the order is only dropped once it has both
+            order['closed'] = order['closed'] or done
+            if order['closed'] and 'response' in order['stages']:
+                del self._pending[client_order_id]
+
+    def responded(self, client_order_id, response):
+        """
+        Records that the response for an order was received.
+        """
+        rejected = (not isinstance(response, dict) or
+                    response.get('result') == 'error')
+        self._stage(client_order_id, 'response', done=rejected)
+
+    def forget(self, client_order_id):
+        """
+        Stops following an order whose request failed.
+        """
+        with self._lock:
+            self._pending.pop(client_order_id, None)
+
+    def on_event(self, event):
+        """
+        Records an event of the order events websocket. Pass this method to
+        OrderEventsWS.add_listener, or use self.attach.
+        """
+        client_order_id = event.get('client_order_id')
+        if client_order_id is None:
+            return
+        self._stage(client_order_id, event.get('type'),
+                    done=(event.get('type') == 'fill' or
+                          event.get('type') in CLOSING_EVENTS))
+
+    def pending(self):
+        """
+        Returns:
+            int: The number of orders still waiting on an event
+        """
+        return len(self._pending)
+
+    def histogram(self, symbol, stage):
+        """
+        Returns:
+            LatencyHistogram: The latencies of stage for symbol, or None
+            if none have been recorded
+        """
+        return self._histograms.get((symbol.lower(), stage))
+
+    def stats(self):
+        """
+        Returns:
+            dict: The histogram of every stage, keyed by symbol
+            example: {
+                'btcusd': {
+                    'response': {'count': 10, 'mean': 84.2, 'p50': 100,
+                                 'p90': 100, 'p99': 200, 'max': 132.5,
+                                 'buckets': {...}},
+                    'accepted': {...},
+                    'booked': {...},
+                    'fill': {...}
+                }
+            }
+        """
+        with self._lock:
+            stats = {}
+            for (symbol, stage), histogram in self._histograms.items():
+                stats.setdefault(symbol, {})[stage] = histogram.to_dict()
+            return stats
@@ -0,0 +1,261 @@
+# order_state.py
+# Mohammad Usman
+#
+# An in-process copy of the state of every order, kept current by the
+# order events websocket
+
+from .debugly import typeassert
+from collections import OrderedDict
+from threading import Event, RLock, Thread
+import time
+
+# Event types after which an order is no longer on the book
+CLOSING_EVENTS = ('rejected', 'cancelled', 'closed')
+
+
+class OrderStateStore:
+    """
+    Keeps the latest state and the events of every order seen on the order
+    events websocket, so the status of an order can be looked up without a
+    REST round-trip. Each state has the same fields as
+    PrivateClient.status_of_order where the events carry them. Orders are
+    indexed by order_id and client_order_id.
+
+    Events only reach the store while the websocket is connected, so
+    start_reconciliation can periodically compare it with
+    PrivateClient.active_orders to catch anything missed.
+
+    If retention is given, orders are dropped that many seconds after they
+    stop being live, so a long running session doesn't grow without bound.
+    """
+    def __init__(self, retention=None):
+        """
+        Args:
+            retention(float): Seconds to keep orders that are no longer
+            live. By default they are kept until removed or reset
+        """
+        self.retention = retention
+        self._orders = {}
+        # When each order was last updated by an event, in milliseconds
+        self._updated = {}
+        self._history = {}
+        self._client_order_ids = {}
+        # Orders that are no longer live, oldest first, with the monotonic
+        # time they closed at
+        self._closed = OrderedDict()
+        self._lock = RLock()
+        self._stop = Event()
+        self._thread = None
+        self.reconciled_at = None
+        self.drift = 0
+
+    def apply(self, event):
+        """
+        Updates the state of an order from one event of the order events
+        websocket. Events without an order_id, such as heartbeats, are
+        ignored.
+        """
+        order_id = event.get('order_id')
+        if order_id is None:
+            return
+        with self._lock:
+            state = self._orders.setdefault(order_id, {})
+            for key, value in event.items():
+                if key not in ('type', 'socket_sequence', 'event_id', 'fill'):
+                    state[key] = value
+            state['last_event'] = event['type']
+            self._updated[order_id] = int(time.time() * 1000)
+            self._history.setdefault(order_id, []).append(event)
+            if event.get('client_order_id') is not None:
+                self._client_order_ids[event['client_order_id']] = order_id
+            if event['type'] in CLOSING_EVENTS:
+                state['is_live'] = False
+            if event['type'] == 'cancelled':
+                state['is_cancelled'] = True
+            self._track_closed(order_id, state)
+            self._expire()
+
+    def _track_closed(self, order_id, state):
+        if state.get('is_live') is False:
+            if order_id not in self._closed:
+                self._closed[order_id] = time.monotonic()
+        else:
+            self._closed.pop(order_id, None)
+
+    def _expire(self):
+        if self.retention is None:
+            return
+        cutoff = time.monotonic() - self.retention
+        while self._closed:
+            order_id, closed_at = next(iter(self._closed.items()))
+            if closed_at > cutoff:
+                break
+            self._remove(order_id)
+
+    def _remove(self, order_id):
+        state = self._orders.pop(order_id, None)
+        self._updated.pop(order_id, None)
+        self._history.pop(order_id, None)
+        self._closed.pop(order_id, None)
+        if state is not None and state.get('client_order_id') is not None:
+            if self._client_order_ids.get(state['client_order_id']) == order_id:
+                del self._client_order_ids[state['client_order_id']]
+        return state is not None
+
+    @typeassert(order_id=str)
+    def remove(self, order_id):
+        """
+        Forgets an order and its events.
+
+        Returns:
+            bool: Whether the order was in the store
+        """
+        with self._lock:
+            return self._remove(order_id)
+
+    @typeassert(order_id=str)
+    def status_of_order(self, order_id):
+        """
+        Returns:
+            dict: A copy of the latest state of the order, or None if no
+            event has been received for it
+        """
+        with self._lock:
+            state = self._orders.get(order_id)
+            return None if state is None else dict(state)
+
+    @typeassert(client_order_id=str)
+    def status_of_client_order(self, client_order_id):
+        """
+        Returns:
+            dict: A copy of the latest state of the order placed with
+            client_order_id, or None if no event has been received for it
+        """
+        with self._lock:
+            order_id = self._client_order_ids.get(client_order_id)
+            return None if order_id is None else dict(self._orders[order_id])
+
+    @typeassert(order_id=str)
+    def history(self, order_id):
+        """
+        Returns:
+            list: The events received for the order, in the order they
+            arrived. Orders added by reconciliation have none
+        """
+        with self._lock:
+            return list(self._history.get(order_id, ()))
+
+    def active_orders(self, symbol=None):
+        """
+        Args:
+            symbol(str): Optionally only return orders on this symbol
+
+        Returns:
+            list: Copies of the state of every live order
+        """
+        with self._lock:
+            return [dict(state) for state in self._orders.values()
+                    if state.get('is_live') and
+                    (symbol is None or state.get('symbol') == symbol)]
+
+    def events(self):
+        """
+        Returns:
+            list: The events of every order in the store, grouped by order
+            and in the order they arrived for each
+        """
+        with self._lock:
+            return [event for history in self._history.values()
+                    for event in history]
+
+    def __len__(self):
+        return len(self._orders)
+
+    def reset(self):
+        with self._lock:
+            self._orders.clear()
+            self._updated.clear()
+            self._history.clear()
+            self._client_order_ids.clear()
+            self._closed.clear()
+
+    def reconcile(self, active_orders, as_of, symbols=None):
+        """
+        Brings the store in line with the output of
+        PrivateClient.active_orders.
+
+        Orders missing from the store are added, and live orders missing
+        from active_orders are marked as no longer live. Orders updated by an
+        event received after as_of are left alone, since the REST snapshot
+        may predate the event.
+
+        Args:
+            active_orders(list): The output of PrivateClient.active_orders
+            as_of(int): Milliseconds since the epoch just before
+            active_orders was requested
+            symbols(list): Optionally only reconcile orders on these
+            symbols
+
+        Returns:
+            int: The number of orders whose state was corrected
+        """
+        corrected = 0
+        live = {order['order_id']: order for order in active_orders
+                if symbols is None or order.get('symbol') in symbols}
+        with self._lock:
+            for order_id, order in live.items():
+                state = self._orders.get(order_id)
+                if state is not None and (state.get('is_live') or
+                                          self._updated[order_id] > as_of):
+                    continue
+                self._orders[order_id] = dict(order, last_event='reconciled')
+                self._updated[order_id] = as_of
+                if order.get('client_order_id') is not None:
+                    self._client_order_ids[order['client_order_id']] = order_id
+                self._track_closed(order_id, self._orders[order_id])
+                corrected += 1
+            for order_id, state in self._orders.items():
+                if (state.get('is_live') and order_id not in live and
+                        self._updated[order_id] <= as_of and
+                        (symbols is None or state.get('symbol') in symbols)):
+                    state['is_live'] = False
+                    state['last_event'] = 'reconciled'
+                    self._track_closed(order_id, state)
+                    corrected += 1
+            self._expire()
+            self.drift += corrected
+            self.reconciled_at = as_of
+        return corrected
+
+    def sync(self, client):
+        """
+        Fetches the active orders with client and reconciles against them.
+
+        Args:
+            client(PrivateClient): Client of the same account as the
+            websocket feeding the store
+        """
+        as_of = int(time.time() * 1000)
+        return self.reconcile(client.active_orders(), as_of)
+
+    def start_reconciliation(self, client, interval=30):
+        """
+        Calls self.sync(client) every interval seconds on a background
+        thread until stop_reconciliation is called.
+        """
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    self.sync(client)
+                except Exception as e:
+                    print('Order state reconciliation failed: {}'.format(e))
+
+        self._stop.clear()
+        self._thread = Thread(target=_run, daemon=True)
+        self._thread.start()
+
+    def stop_reconciliation(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,109 @@
+# order_validation.py
+# Mohammad Usman
+#
+# Checks orders against cached symbol details before they are sent
+
+from .debugly import typeassert
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_UP
+from threading import Lock
+import time
+
+# Symbol statuses under which Gemini accepts new orders
+OPEN_STATUSES = ('open', 'post_only', 'limit_only')
+
+
+def _round(value, increment, rounding):
+    return (value / increment).to_integral_value(rounding) * increment
+
+
+class OrderValidator:
+    """
+    Rounds the amount and price of an order to the increments of its
+    symbol and rejects orders Gemini would refuse, using a cached copy of
+    PublicClient.symbol_details. Once a symbol's details are cached an
+    order is checked without touching the network.
+
+    The amount is rounded down to tick_size, so no more is ever traded than
+    asked for. The price is rounded to quote_increment away from the other
+    side of the book: down for a buy and up for a sell.
+    """
+    def __init__(self, client, max_age=3600):
+        """
+        Args:
+            client(PublicClient): Used to fetch symbol details
+            max_age(float): Seconds before a symbol's details are fetched
+            again
+        """
+        self.client = client
+        self.max_age = max_age
+        self._details = {}
+        self._lock = Lock()
+
+    def _store(self, symbol, details):
+        self._details[symbol] = (time.monotonic(), {
+            'tick_size': Decimal(str(details['tick_size'])),
+            'quote_increment': Decimal(str(details['quote_increment'])),
+            'min_order_size': Decimal(str(details['min_order_size'])),
+            'status': details.get('status', 'open')
+        })
+
+    @typeassert(symbol=str)
+    def details(self, symbol):
+        """
+        Returns:
+            dict: tick_size, quote_increment and min_order_size of symbol
+            as Decimals, and its status
+        """
+        symbol = symbol.lower()
+        with self._lock:
+            cached = self._details.get(symbol)
+        if cached is None or time.monotonic() - cached[0] > self.max_age:
+            details = self.client.symbol_details(symbol)
+            with self._lock:
+                self._store(symbol, details)
+                cached = self._details[symbol]
+        return cached[1]
+
+    @typeassert(symbols=list)
+    def preload(self, symbols):
+        """
+        Fetches the details of every symbol concurrently, so the first
+        order on each of them doesn't wait on the network.
+        """
+        details = self.client.symbols_details([s.lower() for s in symbols])
+        with self._lock:
+            for symbol, d in details.items():
+                if d.get('result') != 'error':
+                    self._store(symbol, d)
+
+    @typeassert(symbol=str, amount=str, price=str, side=str)
+    def normalize(self, symbol, amount, price, side):
+        """
+        Raises a ValueError if the order would be rejected by Gemini.
+
+        Returns:
+            tuple: The amount and price rounded to the symbol's increments,
+            as strings
+        """
+        if side not in ('buy', 'sell'):
+            raise ValueError('Side must be buy or sell, not {}'.format(side))
+        try:
+            amount, price = Decimal(amount), Decimal(price)
+        except InvalidOperation:
+            amount = price = Decimal('NaN')
+        if not (amount.is_finite() and price.is_finite()):
+            raise ValueError('Amount and price of an order must be numbers')
+        details = self.details(symbol)
+        if details['status'] not in OPEN_STATUSES:
+            raise ValueError('{} is not accepting new orders, its status is '
+                             '{}'.format(symbol, details['status']))
+        amount = _round(amount, details['tick_size'], ROUND_DOWN)
+        price = _round(price, details['quote_increment'],
+                       ROUND_DOWN if side == 'buy' else ROUND_UP)
+        if amount < details['min_order_size']:
+            raise ValueError('Amount {:f} is below the minimum order size {:f} '
+                             'of {}'.format(amount, details['min_order_size'],
+                                            symbol))
+        if price <= 0:
+            raise ValueError('Price {:f} must be positive'.format(price))
+        return '{:f}'.format(amount), '{:f}'.format(price)
@@ -6,30 +6,67 @@
 
 from .basewebsocket import BaseWebSocket
 from .debugly import typeassert
+from .nonce import nonce_allocator
+from .order_state import OrderStateStore
+from .heartbeat import HeartbeatMonitor, WS_HEARTBEAT_RETENTION
 from websocket import create_connection
-from collections import OrderedDict
-from xml.etree.ElementTree import Element, tostring
-from xml.dom import minidom
+from collections import OrderedDict, deque
+from urllib.parse import urlencode
 import os
-import csv
 import json
 import hmac
 import hashlib
 import base64
-import time
+
+# Number of fill trade ids remembered to tell recovered fills apart from
+# ones already received
+TRADE_ID_RETENTION = 10000
+
+ORDER_EVENT_TYPES = ['initial', 'accepted', 'rejected', 'booked', 'fill',
+                     'cancelled', 'cancel_rejected', 'closed']
 
 
 class OrderEventsWS(BaseWebSocket):
-    @typeassert(PUBLIC_API_KEY=str, PRIVATE_API_KEY=str, sandbox=bool)
-    def __init__(self, PUBLIC_API_KEY, PRIVATE_API_KEY, sandbox=False):
+    """
+    Gemini can filter the events it sends by symbol, by the API session
+    that placed the order and by event type. Each filter is a list, and an
+    empty or missing filter lets everything through. Clients created with
+    different filters are separate connections, so one process can follow
+    several filtered subscriptions at once.
+    """
+    @typeassert(PUBLIC_API_KEY=str, PRIVATE_API_KEY=str, sandbox=bool,
+                symbol_filter=list, api_session_filter=list,
+                event_type_filter=list)
+    def __init__(self, PUBLIC_API_KEY, PRIVATE_API_KEY, sandbox=False,
+                 symbol_filter=None, api_session_filter=None,
+                 event_type_filter=None):
         if sandbox:
             super().__init__(base_url='wss://api.sandbox.gemini.com/v1/order/events')
         else:
             super().__init__(base_url='wss://api.gemini.com/v1/order/events')
+        unknown = set(event_type_filter or ()) - set(ORDER_EVENT_TYPES)
+        if unknown:
+            raise ValueError('Unknown event types {}, choose from {}'
+                             .format(sorted(unknown), ORDER_EVENT_TYPES))
+        self.symbol_filter = symbol_filter or []
+        self.api_session_filter = api_session_filter or []
+        self.event_type_filter = event_type_filter or []
         self._public_key = PUBLIC_API_KEY
         self._private_key = PRIVATE_API_KEY
+        self._nonce = nonce_allocator(PUBLIC_API_KEY)
         self.order_book = OrderedDict()
+        self.heartbeat_monitor = HeartbeatMonitor()
         self._reset_order_book()
+        self.order_state = OrderStateStore()
+        self.listeners = []
+        self.gap_recovery = None
+        self.last_socket_sequence = None
+        self.sequence_gaps = 0
+        self.duplicates = 0
+        self._last_timestampms = None
+        # Trade ids of recent fills, so recovered fills aren't repeated
+        self._trade_ids = deque(maxlen=TRADE_ID_RETENTION)
+        self._trade_id_set = set()
 
     @property
     def get_order_types(self):
@@ -40,20 +77,26 @@ class OrderEventsWS(BaseWebSocket):
     def _reset_order_book(self):
         """
         Will create a dict with all the following msg types to be received
-        by the websocket.
+        by the websocket. Heartbeats and subscription acks are kept in rings
+        of the last WS_HEARTBEAT_RETENTION messages, since one arrives every
+        few seconds for as long as the connection lives.
         """
         order_types = ['subscription_ack', 'heartbeat', 'initial', 'accepted',
                        'rejected', 'booked', 'fill', 'cancelled',
                        'cancel_rejected', 'closed']
         for order_type in order_types:
             self.order_book[order_type] = list()
+        self.order_book['subscription_ack'] = deque(
+            maxlen=WS_HEARTBEAT_RETENTION)
+        self.heartbeat_monitor.heartbeats.clear()
+        self.order_book['heartbeat'] = self.heartbeat_monitor.heartbeats
 
     @typeassert(method=str, payload=dict)
     def api_query(self, method, payload=None):
         if payload is None:
             payload = {}
         payload['request'] = method
-        payload['nonce'] = int(time.time() * 1000)
+        payload['nonce'] = self._nonce.next()
         b64_payload = base64.b64encode(json.dumps(payload).encode('utf-8'))
         signature = hmac.new(self._private_key.encode('utf-8'),
                              b64_payload, hashlib.sha384).hexdigest()
@@ -65,8 +108,25 @@ class OrderEventsWS(BaseWebSocket):
         }
         return headers
 
+    def subscription_url(self):
+        """
+        Returns:
+            str: self.base_url with the filters as query parameters. It is
+            built again on every connection, so changes to the filters take
+            effect the next time the websocket is started
+        """
+        params = [('symbolFilter', symbol.lower())
+                  for symbol in self.symbol_filter]
+        params += [('apiSessionFilter', session)
+                   for session in self.api_session_filter]
+        params += [('eventTypeFilter', event_type)
+                   for event_type in self.event_type_filter]
+        if not params:
+            return self.base_url
+        return '{}?{}'.format(self.base_url, urlencode(params))
+
     def _connect(self):
-        self.ws = create_connection(self.base_url,
+        self.ws = create_connection(self.subscription_url(),
                                     header=self.api_query('/v1/order/events'),
                                     skip_utf8_validation=True)
 
@@ -78,26 +138,137 @@ class OrderEventsWS(BaseWebSocket):
         'apiSessionFilter' and 'eventTypeFilter'.
 
         Any messages recieved further will be of two types: either a heartbeat
-        or a list of events. Gemini will send a hearbeat every 5 seconds and
-        recommends the user store all hearbeats. Each list of events will have
+        or a list of events. Gemini will send a hearbeat every 5 seconds.
+        The latest are kept, and self.heartbeat_monitor tracks whether any
+        went missing. Each list of events will have
         the following keys: 'type', 'socket_sequence', 'order_id', 'event_id',
         'api_session', 'client_order_id', 'symbol', 'side', 'behavior',
         'order_type', 'timestamp', 'timestampms', 'is_live', 'is_cancelled',
         'is_hidden', 'avg_execution_price', 'executed_amount',
         'remaining_amount', 'original_amount', 'price' and 'total_spend'. This
         method will check the type of any orders and assign them to their
-        appropriate keys within self.order_book.
+        appropriate keys within self.order_book, and update the state of
+        the order in self.order_state. Each order event is then passed to
+        every callable in self.listeners.
+
+        Frames are checked against their socket_sequence first, and stale or
+        duplicate frames are dropped. See self._in_sequence.
         """
+        if not self._in_sequence(msg):
+            return
         if isinstance(msg, list):
             for order in msg:
-                self.order_book[order['type']].append(order)
+                self.dispatch(order)
         elif msg['type'] == 'subscription_ack':
             self.order_book['subscription_ack'].append(msg)
         elif msg['type'] == 'heartbeat':
-            self.order_book['heartbeat'].append(msg)
+            self.heartbeat_monitor.record(msg)
         else:
             pass
 
+    def _in_sequence(self, msg):
+        """
+        Checks the socket_sequence of a frame. Every frame after the
+        subscription ack carries the next number, so a jump means frames
+        were lost and self.on_gap is called. A frame with a number already
+        seen is a stale or duplicate replay and is dropped.
+
+        Returns:
+            bool: Whether the frame should be processed
+        """
+        if isinstance(msg, dict) and msg.get('type') == 'subscription_ack':
+            self.last_socket_sequence = None
+            return True
+        first = msg[0] if isinstance(msg, list) and msg else msg
+        sequence = first.get('socket_sequence') if isinstance(first, dict) else None
+        if sequence is None:
+            return True
+        last = self.last_socket_sequence
+        if last is not None and sequence <= last:
+            self.duplicates += 1
+            return False
+        self.last_socket_sequence = sequence
+        since = self._last_timestampms
+        if first.get('timestampms') is not None:
+            self._last_timestampms = first['timestampms']
+        if last is not None and sequence > last + 1:
+            self.sequence_gaps += 1
+            self.on_gap(last + 1, sequence, msg, since)
+        return True
+
+    def on_gap(self, expected, received, msg, since):
+        """
+        Called when frames expected to socket_sequence received - 1 were
+        lost, before msg is processed. If self.gap_recovery is set, the
+        affected symbols are reconciled over REST on this thread, so no
+        further frame is handled until that is done. See GapRecovery.
+
+        Args:
+            since(int): timestampms of the last frame before the gap
+        """
+        print('Missed order events {} to {}'.format(expected, received - 1))
+        if self.gap_recovery is not None:
+            try:
+                self.gap_recovery.recover(self, msg, since)
+            except Exception as e:
+                self.on_error(e)
+
+    def dispatch(self, event):
+        """
+        Records one order event in self.order_book and self.order_state and
+        passes it to every listener. A listener that raises is reported to
+        self.on_error, and the other listeners still get the event.
+        """
+        self.order_book[event['type']].append(event)
+        self.order_state.apply(event)
+        trade_id = event.get('fill', {}).get('trade_id')
+        if trade_id is not None:
+            self._remember_trade(trade_id)
+        profiler = self.profiler
+        for listener in self.listeners:
+            try:
+                if profiler is None:
+                    listener(event)
+                else:
+                    profiler.call((type(self).__name__, 'on_message'),
+                                  listener, event)
+            except Exception as e:
+                self.on_error(e)
+
+    def _remember_trade(self, trade_id):
+        if trade_id in self._trade_id_set:
+            return
+        if len(self._trade_ids) == self._trade_ids.maxlen:
+            self._trade_id_set.discard(self._trade_ids[0])
+        self._trade_ids.append(trade_id)
+        self._trade_id_set.add(trade_id)
+
+    def seen_trade(self, trade_id):
+        """
+        Returns:
+            bool: Whether a fill with trade_id was received recently
+        """
+        return str(trade_id) in self._trade_id_set
+
+    def add_listener(self, listener):
+        """
+        Registers a callable to be called with every order event received,
+        after self.order_state has been updated.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def liveness(self):
+        """
+        Returns:
+            dict: self.heartbeat_monitor.stats() and whether a heartbeat
+            arrived within the last two intervals
+        """
+        return dict(self.heartbeat_monitor.stats(),
+                    alive=self.heartbeat_monitor.is_alive())
+
     def get_order_book(self):
         return self.order_book
 
@@ -109,21 +280,21 @@ class OrderEventsWS(BaseWebSocket):
     def remove_order(self, type, order_id):
         """
         Will remove a order given a type within self.order_book and the
-        orders id number.
+        orders id number. This scans the list of the given type; to forget
+        everything about an order use self.order_state.remove, which is
+        indexed by order_id.
 
         Args:
             type(str): Can be any value in self.get_order_types
             order_id(str): Must already be in self.order_book[type]
         """
         order_type = self.order_book[type]
-        for index, order in enumerate(order_type):
-            if order['order_id'] == order_id:
-                pop_index = index
-        try:
-            del order_type[pop_index]
-            print('Deleted order with order_id:{}'.format(order_id))
-        except NameError as e:
-            print('Order with order_id:{} does not exist '.format(order_id))
+        for index in reversed(range(len(order_type))):
+            if order_type[index].get('order_id') == order_id:
+                del order_type[index]
+                print('Deleted order with order_id:{}'.format(order_id))
+                return
+        print('Order with order_id:{} does not exist '.format(order_id))
 
     @typeassert(dir=str, type=str, newline_selection=str)
     def export_to_csv(self, dir, type, newline_selection=''):
@@ -138,6 +309,7 @@ class OrderEventsWS(BaseWebSocket):
             type(str): Can be any valie in self.get_order_types
             newline_selection(str): Default value is ''
         """
+        import csv
         if type in self.order_book.keys():
             order_type = self.order_book[type]
             if len(order_type) >= 1:
@@ -161,6 +333,7 @@ class OrderEventsWS(BaseWebSocket):
         """
         Turn a list of dicts into XML.
         """
+        from xml.etree.ElementTree import Element
         order_type = self.order_book[type]
         parent_elem = Element(type + 'orders')
         for trade in order_type:
@@ -184,6 +357,8 @@ class OrderEventsWS(BaseWebSocket):
             dir(str): Must be in raw string
             type(str): Can be any valie in self.get_order_types
         """
+        from xml.etree.ElementTree import tostring
+        from xml.dom import minidom
         if type in self.order_book.keys():
             if len(self.order_book[type]) >= 1:
                 rough_string = tostring(self._trades_to_xml(type), 'utf-8')
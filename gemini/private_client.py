@@ -5,12 +5,56 @@
 
 from .public_client import PublicClient
 from .debugly import typeassert
-import requests
+from .ratelimit import shared_limiter, RetryPolicy, PRIVATE_RATE, PRIVATE_BURST
+from .nonce import nonce_allocator
+from collections import OrderedDict
 import json
 import hmac
 import hashlib
 import base64
-import time
+import uuid
+
+
+ORDER_ARGUMENTS = {
+    'symbol': str,
+    'amount': str,
+    'price': str,
+    'side': str,
+    'options': list,
+    'client_order_id': str
+}
+
+
+def _invalid_nonce(r):
+    """
+    Requests signed concurrently can reach Gemini in a different order to
+    their nonces, in which case the later nonce is rejected. Gemini did not
+    act on such a request, so it is safe to sign it again and resend it.
+    """
+    if r.status_code != 400:
+        return False
+    try:
+        return r.json().get('reason') == 'InvalidNonce'
+    except (ValueError, AttributeError):
+        return False
+
+
+def _check_order(order):
+    """
+    Raises a TypeError if order can't be passed to PrivateClient.new_order
+    """
+    unknown = set(order) - set(ORDER_ARGUMENTS)
+    if unknown:
+        raise TypeError('Unknown order arguments {}'.format(sorted(unknown)))
+    for name in ('symbol', 'amount', 'price', 'side'):
+        if name not in order:
+            raise TypeError('Missing order argument {}'.format(name))
+    for name, value in order.items():
+        if name == 'client_order_id' and value is None:
+            continue
+        if not isinstance(value, ORDER_ARGUMENTS[name]):
+            raise TypeError('Argument {} must be {}'
+                            .format(name, ORDER_ARGUMENTS[name]))
 
 
 class PrivateClient(PublicClient):
@@ -19,23 +63,33 @@ class PrivateClient(PublicClient):
         super().__init__(sandbox)
         self._public_key = PUBLIC_API_KEY
         self._private_key = PRIVATE_API_KEY
+        self._nonce = nonce_allocator(PUBLIC_API_KEY)
         if sandbox:
             self._base_url = 'https://api.sandbox.gemini.com'
         else:
             self._base_url = 'https://api.gemini.com'
-
-    @typeassert(method=str, payload=dict)
-    def api_query(self, method, payload=None):
-        if payload is None:
-            payload = {}
-        request_url = self._base_url + method
-
+        self._private_rate_limiter = shared_limiter(
+            (self._base_url, PUBLIC_API_KEY), PRIVATE_RATE, PRIVATE_BURST)
+        # Order placement is not idempotent, so only requests that Gemini
+        # refused outright with a 429 are retried
+        self.private_retry_policy = RetryPolicy(statuses=(429,),
+                                                connection_errors=False)
+        self.order_validator = None
+        self.order_tracker = None
+        # Set with Profiler.attach to time every private request
+        self.profiler = None
+
+    def _signed_headers(self, method, payload):
+        """
+        Adds the request and a new nonce to payload and returns the headers
+        carrying the signed payload.
+        """
         payload['request'] = method
-        payload['nonce'] = int(time.time() * 1000)
+        payload['nonce'] = self._nonce.next()
         b64_payload = base64.b64encode(json.dumps(payload).encode('utf-8'))
         signature = hmac.new(self._private_key.encode('utf-8'), b64_payload, hashlib.sha384).hexdigest()
 
-        headers = {
+        return {
             'Content-Type': "text/plain",
             'Content-Length': "0",
             'X-GEMINI-APIKEY': self._public_key,
@@ -44,12 +98,61 @@ class PrivateClient(PublicClient):
             'Cache-Control': "no-cache"
         }
 
-        r = requests.post(request_url, headers=headers)
-        return r.json()
+    @typeassert(method=str, payload=dict)
+    def api_query(self, method, payload=None):
+        if payload is None:
+            payload = {}
+        request_url = self._base_url + method
+        profiler = self.profiler
+
+        def send():
+            # Every attempt is signed with a fresh nonce
+            if profiler is not None:
+                return profiler.post(
+                    method, self._session, request_url,
+                    lambda: self._signed_headers(method, payload), self.timeout)
+            return self._session.post(request_url,
+                                      headers=self._signed_headers(method, payload),
+                                      timeout=self.timeout)
+
+        return self._send(send, self._private_rate_limiter,
+                          self.private_retry_policy, _invalid_nonce)
+
+    def rate_limit_stats(self):
+        stats = super().rate_limit_stats()
+        stats['private'] = self._private_rate_limiter.stats()
+        return stats
+
+    def enable_order_validation(self, symbols=None, max_age=3600):
+        """
+        Checks every order placed with self.new_order against the details
+        of its symbol before it is sent. The amount and price are rounded to
+        the symbol's increments, and an order Gemini would reject raises a
+        ValueError without making a request. See OrderValidator.
+
+        Symbol details are fetched the first time a symbol is traded and
+        cached for max_age seconds.
+
+        Args:
+            symbols(list): Optionally fetch the details of these symbols
+            straight away
+
+        Returns:
+            OrderValidator: Also kept as self.order_validator. Set that to
+            None to stop validating orders
+        """
+        from .order_validation import OrderValidator
+        self.order_validator = OrderValidator(PublicClient(self.sandbox),
+                                              max_age)
+        if symbols:
+            self.order_validator.preload(symbols)
+        return self.order_validator
 
     # Order Placement API
-    @typeassert(symbol=str, amount=str, price=str, side=str, options=list)
-    def new_order(self, symbol, amount, price, side, options=["immediate-or-cancel"]):
+    @typeassert(symbol=str, amount=str, price=str, side=str, options=list,
+                client_order_id=str)
+    def new_order(self, symbol, amount, price, side, options=["immediate-or-cancel"],
+                  client_order_id=None):
         """
         This endpoint is used for the creation of a new order.
         Requires you to provide the symbol, amount, price, side and options.
@@ -63,6 +166,16 @@ class PrivateClient(PublicClient):
             price(str): The price at which you want to buy the currency/
             side(str): Either "buy" or "ask"
             options(list): Currently, can only be ["immediate-or-cancel"]
+            client_order_id(str): Optional id echoed back in the response
+            and in order events
+
+        If order validation is enabled, the amount and price are rounded
+        to the symbol's increments and a ValueError is raised for an order
+        Gemini would reject. See self.enable_order_validation.
+
+        If self.order_tracker is set, an order without a client_order_id is
+        given a random one and its latency is recorded. See
+        OrderLatencyTracker.
 
         Returns:
             dict: These are the same fields returned by order/status
@@ -87,6 +200,9 @@ class PrivateClient(PublicClient):
                 'original_amount': '0.02'
             }
         """
+        if self.order_validator is not None:
+            amount, price = self.order_validator.normalize(symbol, amount,
+                                                           price, side)
         payload = {
             'symbol': symbol,
             'amount': amount,
@@ -95,8 +211,61 @@ class PrivateClient(PublicClient):
             'options': options,
             'type': 'exchange limit'
         }
+        if self.order_tracker is not None:
+            payload['client_order_id'] = client_order_id or uuid.uuid4().hex
+            return self._tracked_order(payload)
+        if client_order_id is not None:
+            payload['client_order_id'] = client_order_id
         return self.api_query('/v1/order/new', payload)
 
+    def _tracked_order(self, payload):
+        tracker = self.order_tracker
+        tracker.sent(payload['client_order_id'], payload['symbol'])
+        try:
+            response = self.api_query('/v1/order/new', payload)
+        except Exception:
+            tracker.forget(payload['client_order_id'])
+            raise
+        tracker.responded(payload['client_order_id'], response)
+        return response
+
+    @typeassert(orders=list, max_workers=int)
+    def new_orders(self, orders, max_workers=8):
+        """
+        Places several orders concurrently over the client's connection
+        pool, within the private rate limit.
+
+        Args:
+            orders(list): Dicts with the arguments of self.new_order. An
+            order without a client_order_id is given a random one
+            example: [
+                {'symbol': 'btcusd', 'amount': '0.02', 'price': '6400.28',
+                 'side': 'buy', 'options': ['maker-or-cancel']},
+                ...
+            ]
+            max_workers(int): Maximum number of requests in flight, at
+            most POOL_SIZE
+
+        Every order is checked before any is sent, so a malformed order
+        raises a TypeError without placing the others.
+
+        Returns:
+            dict: Maps the client_order_id of each order to the output of
+            self.new_order, or to an error dict if the request failed
+        """
+        by_client_order_id = OrderedDict()
+        for order in orders:
+            _check_order(order)
+            client_order_id = order.get('client_order_id') or uuid.uuid4().hex
+            if client_order_id in by_client_order_id:
+                raise ValueError('Duplicate client_order_id {}'
+                                 .format(client_order_id))
+            by_client_order_id[client_order_id] = dict(
+                order, client_order_id=client_order_id)
+        return self._batch(lambda client_order_id: self.new_order(
+                               **by_client_order_id[client_order_id]),
+                           list(by_client_order_id), max_workers)
+
     @typeassert(order_id=str)
     def cancel_order(self, order_id):
         """
@@ -134,6 +303,23 @@ class PrivateClient(PublicClient):
         }
         return self.api_query('/v1/order/cancel', payload)
 
+    @typeassert(order_ids=list, max_workers=int)
+    def cancel_orders(self, order_ids, max_workers=8):
+        """
+        Cancels several orders concurrently over the client's connection
+        pool, within the private rate limit.
+
+        Args:
+            order_ids(list): The ids of the orders to cancel
+            max_workers(int): Maximum number of requests in flight, at
+            most POOL_SIZE
+
+        Returns:
+            dict: Maps each order_id to the output of self.cancel_order, or
+            to an error dict if the request failed
+        """
+        return self._batch(self.cancel_order, order_ids, max_workers)
+
     @typeassert(symbol=str, amount=str, side=str)
     def wrap_order(self, symbol, amount, side):
         """
@@ -236,8 +422,8 @@ class PrivateClient(PublicClient):
         """
         return self.api_query('/v1/orders')
 
-    @typeassert(symbol=str, limit_trades=int)
-    def get_past_trades(self, symbol, limit_trades=None):
+    @typeassert(symbol=str, limit_trades=int, timestamp=int)
+    def get_past_trades(self, symbol, limit_trades=None, timestamp=None):
         """
         Returns all the past trades associated with the API.
         Providing a limit_trade is optional.
@@ -245,6 +431,8 @@ class PrivateClient(PublicClient):
         Args:
             symbols(str): Can be any value in self.symbols()
             limit_trades(int): Default value is 500
+            timestamp(int): Optional. Only trades on or after this time,
+            in seconds or milliseconds since the epoch, are returned
 
         Results:
             array: An array of of dicts of the past trades
@@ -253,8 +441,32 @@ class PrivateClient(PublicClient):
             "symbol": symbol,
             "limit_trades": 500 if limit_trades is None else limit_trades
         }
+        if timestamp is not None:
+            payload["timestamp"] = timestamp
         return self.api_query('/v1/mytrades', payload)
 
+    @typeassert(symbol=str, since=int, until=int, limit_trades=int)
+    def iter_past_trades(self, symbol, since=0, until=None, limit_trades=500):
+        """
+        Walks forward through all the past trades associated with the API,
+        one page at a time. Trades on the boundary between two pages are
+        only yielded once.
+
+        Args:
+            symbol(str): Can be any value in self.symbols()
+            since(int): Milliseconds since the epoch to start from. Default
+            is the first trade of the account
+            until(int): Milliseconds since the epoch to stop at
+            limit_trades(int): Page size, at most 500
+
+        Yields:
+            dict: The same fields returned by self.get_past_trades, oldest
+            first
+        """
+        return self._walk_forward(
+            lambda since: self.get_past_trades(symbol, limit_trades, since),
+            'tid', limit_trades, since, until)
+
     def get_trade_volume(self):
         """
         Returns the trade volume associated with the API for the past
@@ -337,8 +549,10 @@ class PrivateClient(PublicClient):
         return self.api_query('/v1/withdraw/{}'.format(currency), payload)
 
     # Transfers API
-    @typeassert(limit_transfers=int, show_completed_deposit_advances=bool)
-    def get_past_transfers(self, limit_transfers=None, show_completed_deposit_advances=False):
+    @typeassert(limit_transfers=int, show_completed_deposit_advances=bool,
+                timestamp=int)
+    def get_past_transfers(self, limit_transfers=None, show_completed_deposit_advances=False,
+                           timestamp=None):
         """
         Returns all the past transfers associated with the API.
         Providing a limit_trade is optional.
@@ -347,6 +561,8 @@ class PrivateClient(PublicClient):
         Args:
             limit_trades(int): Default value is 500
             show_completed_deposit_advances(bool): Default value is False
+            timestamp(int): Optional. Only transfers on or after this time,
+            in seconds or milliseconds since the epoch, are returned
 
         Results:
             array: An array of of dicts of the past transfers
@@ -355,8 +571,35 @@ class PrivateClient(PublicClient):
             "limit_transfers": 500 if limit_transfers is None else limit_transfers,
             "show_completed_deposit_advances": show_completed_deposit_advances
         }
+        if timestamp is not None:
+            payload["timestamp"] = timestamp
         return self.api_query('/v1/transfers', payload)
 
+    @typeassert(since=int, until=int, limit_transfers=int,
+                show_completed_deposit_advances=bool)
+    def iter_past_transfers(self, since=0, until=None, limit_transfers=500,
+                            show_completed_deposit_advances=False):
+        """
+        Walks forward through all the past transfers associated with the
+        API, one page at a time. Transfers on the boundary between two pages
+        are only yielded once.
+
+        Args:
+            since(int): Milliseconds since the epoch to start from. Default
+            is the first transfer of the account
+            until(int): Milliseconds since the epoch to stop at
+            limit_transfers(int): Page size, at most 500
+            show_completed_deposit_advances(bool): Default value is False
+
+        Yields:
+            dict: The same fields returned by self.get_past_transfers,
+            oldest first
+        """
+        return self._walk_forward(
+            lambda since: self.get_past_transfers(
+                limit_transfers, show_completed_deposit_advances, since),
+            'eid', limit_transfers, since, until)
+
     # HeartBeat API
     def revive_hearbeat(self):
         """
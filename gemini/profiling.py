@@ -0,0 +1,403 @@
+# profiling.py
+# Mohammad Usman
+#
+# Opt-in profiling of websocket callbacks and REST requests, exported as
+# collapsed stacks for flame graphs or as Chrome trace events
+
+from .public_client import POOL_SIZE
+from collections import Counter, deque
+from requests.adapters import HTTPAdapter
+from threading import Event, Lock, Thread, get_ident, local
+from threading import enumerate as threads
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import json
+import os
+import sys
+import time
+
+_connect_times = local()
+
+
+def _add_connect_time(start):
+    _connect_times.ns = (getattr(_connect_times, 'ns', 0) +
+                         time.perf_counter_ns() - start)
+
+
+def take_connect_time():
+    """
+    Returns:
+        int: Nanoseconds the calling thread spent opening connections since
+        the last call
+    """
+    ns = getattr(_connect_times, 'ns', 0)
+    _connect_times.ns = 0
+    return ns
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter_ns()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter_ns()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connections note how long they took to open, so
+    connecting can be told apart from waiting on the server. Only new
+    connections pay for it, and only with a thread local write.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+
+def _time_connections(session):
+    """
+    Mounts a TimedHTTPAdapter on session, unless one is mounted already.
+    Connections open on the adapter it replaces are dropped and opened
+    again when next needed.
+    """
+    if isinstance(session.get_adapter('https://'), TimedHTTPAdapter):
+        return
+    adapter = TimedHTTPAdapter(pool_maxsize=POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+
+def _name(func):
+    return getattr(func, '__qualname__', type(func).__name__)
+
+
+def _self_times(totals):
+    """
+    Takes the total time of every path and returns the time spent in each
+    path itself, outside the paths nested under it.
+    """
+    own = dict(totals)
+    for path, total in totals.items():
+        if len(path) > 1 and path[:-1] in own:
+            own[path[:-1]] -= total
+    return {path: max(0, ns) for path, ns in own.items()}
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+class _ProfiledResponse:
+    """
+    Passes everything through to a requests.Response, timing json().
+    """
+    def __init__(self, response, profiler, path):
+        self._response = response
+        self._profiler = profiler
+        self._path = path
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def json(self):
+        start = time.perf_counter_ns()
+        body = self._response.json()
+        self._profiler.record(self._path + ('decode',), start,
+                              time.perf_counter_ns())
+        return body
+
+
+class Profiler:
+    """
+    Keeps the cumulative time spent in websocket callbacks and REST
+    requests of the clients and websockets it is attached to. Each timing
+    is recorded under a path, a tuple such as
+    ('OrderEventsWS', 'on_message', 'BalanceCache.on_event'), nested under
+    the path of the call it was made from.
+
+    For a websocket the time spent decoding each frame and in on_message
+    is kept, and for OrderEventsWS the time spent in each listener. For
+    PrivateClient.api_query the time of each endpoint is split into
+    signing, opening a connection, waiting on the server for the response
+    headers, reading the body and decoding it. AsyncPrivateClient.api_query
+    is split the same way, except that opening a connection is counted as
+    waiting on the server. Time queued on the rate limiter is in
+    PrivateClient.rate_limit_stats.
+
+    Profiling is switched on and off while things run with attach and
+    detach. A client or websocket that isn't attached only checks that its
+    profiler is None. To time connections, attaching a client mounts a
+    TimedHTTPAdapter on its session, which is shared by every client of the
+    same host. It stays mounted after detach, costing each new connection
+    a thread local write.
+    """
+    def __init__(self, trace_events=100000):
+        """
+        Args:
+            trace_events(int): The most recent timings kept for
+            self.chrome_trace
+        """
+        self._lock = Lock()
+        self._stats = {}
+        self._trace = deque(maxlen=trace_events)
+
+    def attach(self, *targets):
+        """
+        Starts profiling PrivateClient, AsyncPrivateClient or websocket
+        instances.
+        """
+        for target in targets:
+            session = getattr(target, '_session', None)
+            if session is not None:
+                _time_connections(session)
+            target.profiler = self
+
+    def detach(self, *targets):
+        for target in targets:
+            target.profiler = None
+
+    def record(self, path, start, end):
+        """
+        Records a call under path that ran from start to end, both from
+        time.perf_counter_ns.
+        """
+        elapsed = end - start
+        with self._lock:
+            stats = self._stats.get(path)
+            if stats is None:
+                self._stats[path] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+            self._trace.append((path, start, elapsed, get_ident()))
+
+    def call(self, path, func, *args):
+        """
+        Calls func, recording its time under path followed by its name.
+        """
+        start = time.perf_counter_ns()
+        try:
+            return func(*args)
+        finally:
+            self.record(path + (_name(func),), start, time.perf_counter_ns())
+
+    def websocket_message(self, ws, data):
+        """
+        Decodes a frame received by ws and passes it to ws.on_message,
+        timing both. Called by BaseWebSocket._listen.
+        """
+        name = type(ws).__name__
+        start = time.perf_counter_ns()
+        msg = json.loads(data)
+        decoded = time.perf_counter_ns()
+        try:
+            ws.on_message(msg)
+        finally:
+            self.record((name, 'decode'), start, decoded)
+            self.record((name, 'on_message'), decoded, time.perf_counter_ns())
+
+    def post(self, endpoint, session, url, sign, timeout):
+        """
+        Signs and sends a private request like PrivateClient.api_query,
+        timing each step. Called by PrivateClient.api_query.
+
+        Args:
+            endpoint(str): The path the request is recorded under
+            sign: Returns the headers of the signed request
+
+        Returns:
+            The response, whose json method is timed as it is decoded
+        """
+        clock = time.perf_counter_ns
+        path = ('PrivateClient.api_query', endpoint)
+        start = clock()
+        headers = sign()
+        signed = clock()
+        take_connect_time()
+        r = session.post(url, headers=headers, timeout=timeout)
+        done = clock()
+        connect = take_connect_time()
+        # requests times the request up to the response headers, which
+        # includes opening the connection but not reading the body
+        headers_at = signed + max(connect, min(
+            done - signed, int(r.elapsed.total_seconds() * 1e9)))
+        self.record(path + ('sign',), start, signed)
+        if connect:
+            self.record(path + ('connect',), signed, signed + connect)
+        self.record(path + ('server',), signed + connect, headers_at)
+        self.record(path + ('read',), headers_at, done)
+        return _ProfiledResponse(r, self, path)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of calls, total milliseconds, mean and maximum
+            microseconds of every path
+        """
+        with self._lock:
+            stats = {path: list(values) for path, values in self._stats.items()}
+        return {path: {'count': count, 'total_ms': total / 1e6,
+                       'mean_us': total / count / 1e3, 'max_us': longest / 1e3}
+                for path, (count, total, longest) in sorted(stats.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._trace.clear()
+
+    def collapsed(self):
+        """
+        Returns:
+            str: One line per path in the collapsed stack format read by
+            flamegraph.pl, speedscope and most flame graph tools, weighted
+            by the microseconds spent in the path itself
+        """
+        with self._lock:
+            totals = {path: values[1] for path, values in self._stats.items()}
+        return ''.join('{} {}\n'.format(';'.join(path), ns // 1000)
+                       for path, ns in sorted(_self_times(totals).items())
+                       if ns >= 1000)
+
+    def write_collapsed(self, path):
+        _write(path, self.collapsed())
+
+    def chrome_trace(self):
+        """
+        Returns:
+            dict: The most recent timings as complete events of the Trace
+            Event Format, which chrome://tracing and Perfetto open
+        """
+        with self._lock:
+            trace = list(self._trace)
+        pid = os.getpid()
+        # A call has to come before the calls nested in it
+        trace.sort(key=lambda event: (event[1], -event[2]))
+        return {'displayTimeUnit': 'ms', 'traceEvents': [
+            {'name': path[-1], 'cat': path[0], 'ph': 'X', 'ts': start / 1e3,
+             'dur': elapsed / 1e3, 'pid': pid, 'tid': tid,
+             'args': {'path': ';'.join(path)}}
+            for path, start, elapsed, tid in trace]}
+
+    def write_chrome_trace(self, path):
+        _write(path, json.dumps(self.chrome_trace()))
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread each interval seconds on a
+    background thread, counting how often each stack is seen. Stacks are
+    taken with sys._current_frames, so nothing is added to the code being
+    profiled and it can be started and stopped at any time.
+    """
+    def __init__(self, interval=0.005, thread_names=None):
+        """
+        Args:
+            interval(float): Seconds between samples
+            thread_names(list): Only sample threads with these names.
+            Defaults to every thread
+        """
+        self.interval = interval
+        self.thread_names = thread_names
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='gemini-sampler',
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        own = get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=own)
+
+    def sample(self, skip=None):
+        """
+        Takes one sample of every thread but skip, a thread ident.
+        """
+        names = {thread.ident: thread.name for thread in threads()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, str(ident))
+            if ident == skip or (self.thread_names is not None and
+                                 name not in self.thread_names):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}'.format(
+                    frame.f_globals.get('__name__', code.co_filename),
+                    code.co_name))
+                frame = frame.f_back
+            stack.append(name)
+            stacks.append(';'.join(reversed(stack)))
+        with self._lock:
+            self.samples += 1
+            self._stacks.update(stacks)
+
+    def reset(self):
+        with self._lock:
+            self.samples = 0
+            self._stacks.clear()
+
+    def collapsed(self):
+        """
+        Returns:
+            str: One line per distinct stack in the collapsed stack format,
+            rooted at the thread name and weighted by its number of samples
+        """
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        return ''.join('{} {}\n'.format(stack, count)
+                       for stack, count in stacks)
+
+    def write_collapsed(self, path):
+        _write(path, self.collapsed())
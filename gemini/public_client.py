@@ -5,18 +5,181 @@
 
 from .cached import Cached
 from .debugly import typeassert
+from .ratelimit import shared_limiter, RetryPolicy, PUBLIC_RATE, PUBLIC_BURST
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 import requests
 import time
 import datetime
 
+# Number of connections kept alive per host, enough for the default number
+# of workers used by the batch methods
+POOL_SIZE = 16
+
+# Seconds to wait for Gemini to accept the connection and to send each
+# part of the response
+TIMEOUT = 10
+
+_sessions = {}
+_sessions_lock = Lock()
+
+
+def shared_session(url):
+    """
+    Returns the requests.Session used for the host of url, creating it on
+    first use. Every client talking to a host shares its connection pool,
+    so a PublicClient and a PrivateClient for the same environment don't
+    open separate connections.
+    """
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        if host not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
 
 class PublicClient(metaclass=Cached):
     @typeassert(sandbox=bool)
     def __init__(self, sandbox=False):
+        self.sandbox = sandbox
         if sandbox:
             self.public_base_url = 'https://api.sandbox.gemini.com/v1'
+            self.public_base_url_v2 = 'https://api.sandbox.gemini.com/v2'
         else:
             self.public_base_url = 'https://api.gemini.com/v1'
+            self.public_base_url_v2 = 'https://api.gemini.com/v2'
+        self._session = shared_session(self.public_base_url)
+        self._rate_limiter = shared_limiter(self.public_base_url,
+                                            PUBLIC_RATE, PUBLIC_BURST)
+        self.retry_policy = RetryPolicy()
+        self.timeout = TIMEOUT
+
+    def _send(self, send, limiter, retry_policy, resend_if=None):
+        """
+        Waits on limiter then calls send, which must perform the request
+        and return the response. Responses with a status in
+        retry_policy.statuses, and connection errors if the policy allows,
+        are retried after backing off. Responses for which resend_if
+        returns True are sent again straight away. Once the retries are
+        used up an HTTPError is raised, so a throttled request can always
+        be told apart from an error returned by Gemini.
+
+        Returns:
+            The decoded JSON body of the response
+        """
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                r = send()
+            except (requests.ConnectionError, requests.Timeout):
+                if (not retry_policy.connection_errors or
+                        attempt >= retry_policy.max_retries):
+                    raise
+                time.sleep(retry_policy.delay(attempt))
+            else:
+                resend = resend_if is not None and resend_if(r)
+                if not resend and r.status_code not in retry_policy.statuses:
+                    return r.json()
+                if attempt >= retry_policy.max_retries:
+                    r.raise_for_status()
+                if not resend:
+                    time.sleep(retry_policy.delay(
+                        attempt, r.headers.get('Retry-After')))
+            attempt += 1
+
+    def _get(self, path, params=None, base_url=None):
+        url = (base_url or self.public_base_url) + path
+        return self._send(lambda: self._session.get(url, params=params,
+                                                    timeout=self.timeout),
+                          self._rate_limiter, self.retry_policy)
+
+    def rate_limit_stats(self):
+        """
+        Returns:
+            dict: How long requests spent queued on the client side rate
+            limit. See RateLimiter.stats
+        """
+        return {'public': self._rate_limiter.stats()}
+
+    def _walk_forward(self, fetch, id_key, limit, since=None, until=None):
+        """
+        Pages forward through records carrying a timestampms, calling
+        fetch(since) for each page with the timestampms of the newest record
+        seen so far. Records repeated on the next page because they share
+        that timestamp are dropped by their id_key.
+
+        The endpoints walked this way have no id cursor, so if a full page
+        only holds records already seen, more than limit records share one
+        timestamp and the rest of them can't be reached. A ValueError is
+        raised rather than silently skipping them.
+
+        Yields:
+            dict: The records, oldest first, until one is newer than until
+            or fewer than limit records are returned
+        """
+        seen = set()
+        while True:
+            page = fetch(since)
+            records = sorted((record for record in page
+                              if record[id_key] not in seen),
+                             key=lambda record: (record['timestampms'],
+                                                 record[id_key]))
+            for record in records:
+                if until is not None and record['timestampms'] > until:
+                    return
+                yield record
+            if len(page) < limit:
+                return
+            if not records:
+                raise ValueError('More than {} records share timestampms {}, '
+                                 'increase the page size to read past them'
+                                 .format(limit, since))
+            if records[-1]['timestampms'] != since:
+                since = records[-1]['timestampms']
+                seen = set()
+            seen.update(record[id_key] for record in records
+                        if record['timestampms'] == since)
+
+    def _batch(self, func, product_ids, max_workers):
+        """
+        Calls func once for every product_id on a bounded pool of worker
+        threads. Requests made by func still go through the client's rate
+        limiter. max_workers is capped at POOL_SIZE, the number of
+        connections the client keeps open to a host.
+
+        Returns:
+            dict: Maps each product_id to its response. If a request failed
+            the value is an error dict in the same shape Gemini uses
+            example: {
+                'btcusd': {...},
+                'ethusd': {
+                    'result': 'error',
+                    'reason': 'ConnectionError',
+                    'message': '...'
+                }
+            }
+        """
+        def _call(product_id):
+            try:
+                return func(product_id)
+            except (requests.RequestException, ValueError) as e:
+                return {
+                    'result': 'error',
+                    'reason': type(e).__name__,
+                    'message': str(e)
+                }
+
+        with ThreadPoolExecutor(max_workers=min(max_workers,
+                                                POOL_SIZE)) as executor:
+            results = executor.map(_call, product_ids)
+            return dict(zip(product_ids, results))
 
     def symbols(self):
         """
@@ -26,8 +189,7 @@ class PublicClient(metaclass=Cached):
             list: Will output an array of supported symbols
             example: ['btcusd', 'ethbtc', 'ethusd']
         """
-        r = requests.get(self.public_base_url + '/symbols')
-        return r.json()
+        return self._get('/symbols')
 
     @typeassert(product_id=str)
     def symbol_details(self, product_id):
@@ -51,8 +213,7 @@ class PublicClient(metaclass=Cached):
                 "wrap_enabled":false
             }
         """
-        r = requests.get(self.public_base_url + '/symbols/details/' + product_id)
-        return r.json()
+        return self._get('/symbols/details/' + product_id)
 
     @typeassert(product_id=str)
     def get_ticker(self, product_id):
@@ -76,8 +237,7 @@ class PublicClient(metaclass=Cached):
                     'last': '6398.99'
                 }
         """
-        r = requests.get(self.public_base_url + '/pubticker/' + product_id)
-        return r.json()
+        return self._get('/pubticker/' + product_id)
 
     @typeassert(product_id=str)
     def get_current_order_book(self, product_id):
@@ -102,8 +262,95 @@ class PublicClient(metaclass=Cached):
               ]
             }
         """
-        r = requests.get(self.public_base_url + '/book/' + product_id)
-        return r.json()
+        return self._get('/book/' + product_id)
+
+    def get_price_feed(self):
+        """
+        This endpoint retrieves the latest price and 24 hour change of every
+        trading pair in a single request. Prefer it to calling
+        self.get_ticker for each symbol when only prices are needed.
+
+        Returns:
+            list: One entry per pair
+            example: [
+                {
+                    'pair': 'BTCUSD',
+                    'price': '9500.00',
+                    'percentChange24h': '-0.0123'
+                },
+                ...
+            ]
+        """
+        return self._get('/pricefeed')
+
+    @typeassert(product_id=str, time_frame=str)
+    def get_candles(self, product_id, time_frame):
+        """
+        This endpoint retrieves time-intervaled OHLCV data for a symbol.
+
+        Args:
+            product_id(str): Can be any value in self.symbols()
+            time_frame(str): One of '1m', '5m', '15m', '30m', '1hr', '6hr'
+            or '1day'
+
+        Returns:
+            list: One array per candle, newest first, in the form
+            [time in milliseconds, open, high, low, close, volume]
+            example: [
+                [1559755800000, 7781.6, 7820.23, 7776.56, 7819.39, 34.7624802159],
+                [1559755500000, 7781.6, 7782.7, 7772.94, 7781.6, 19.62011325],
+                ...
+            ]
+        """
+        return self._get('/candles/{}/{}'.format(product_id, time_frame),
+                         base_url=self.public_base_url_v2)
+
+    @typeassert(product_ids=list, max_workers=int)
+    def get_tickers(self, product_ids, max_workers=8):
+        """
+        Retrieves the ticker of several symbols concurrently.
+
+        Args:
+            product_ids(list): Values in self.symbols()
+            max_workers(int): Maximum number of requests in flight, at
+            most POOL_SIZE
+
+        Returns:
+            dict: Maps each symbol to the output of self.get_ticker
+        """
+        return self._batch(self.get_ticker, product_ids, max_workers)
+
+    @typeassert(product_ids=list, max_workers=int)
+    def get_current_order_books(self, product_ids, max_workers=8):
+        """
+        Retrieves the order book of several symbols concurrently.
+
+        Args:
+            product_ids(list): Values in self.symbols()
+            max_workers(int): Maximum number of requests in flight, at
+            most POOL_SIZE
+
+        Returns:
+            dict: Maps each symbol to the output of
+            self.get_current_order_book
+        """
+        return self._batch(self.get_current_order_book, product_ids,
+                           max_workers)
+
+    @typeassert(product_ids=list, max_workers=int)
+    def symbols_details(self, product_ids, max_workers=8):
+        """
+        Retrieves the details of several symbols concurrently.
+
+        Args:
+            product_ids(list): Values in self.symbols()
+            max_workers(int): Maximum number of requests in flight, at
+            most POOL_SIZE
+
+        Returns:
+            dict: Maps each symbol to the output of self.symbol_details
+        """
+        return self._batch(self.symbol_details, product_ids, max_workers)
 
     @typeassert(product_id=str, since=str)
     def get_trade_history(self, product_id, since=None):
@@ -132,13 +379,53 @@ class PublicClient(metaclass=Cached):
             ]
         """
         if since is None:
-            r = requests.get(self.public_base_url + '/trades/' + product_id)
+            return self._get('/trades/' + product_id)
         else:
             self.timestamp = time.mktime(datetime.datetime.strptime(since,
                                                                     "%d/%m/%Y").timetuple())
-            r = requests.get(self.public_base_url + '/trades/{}?since={}'.format(
+            return self._get('/trades/{}?since={}'.format(
                 product_id, int(self.timestamp)))
-        return r.json()
+
+    @typeassert(product_id=str, since=int, until=int, since_tid=int,
+                limit_trades=int)
+    def iter_trade_history(self, product_id, since=None, until=None,
+                           since_tid=None, limit_trades=500):
+        """
+        Walks forward through the trade history one page at a time,
+        following the tid of the newest trade on each page. Trades are
+        yielded lazily from oldest to newest and every tid is yielded
+        only once.
+
+        Args:
+            product_id(str): Can be any value in self.symbols()
+            since(int): Milliseconds since the epoch to start from
+            until(int): Milliseconds since the epoch to stop at. Default
+            is to stop at the most recent trade
+            since_tid(int): Only trades after this tid are returned. Takes
+            precedence over since
+            limit_trades(int): Page size, at most 500
+
+        Yields:
+            dict: The same fields returned by self.get_trade_history
+        """
+        params = {'limit_trades': limit_trades}
+        if since_tid is not None:
+            params['since_tid'] = since_tid
+        elif since is not None:
+            params['timestamp'] = since
+        while True:
+            page = self._get('/trades/' + product_id, params)
+            trades = sorted((trade for trade in page
+                             if since_tid is None or trade['tid'] > since_tid),
+                            key=lambda trade: trade['tid'])
+            for trade in trades:
+                if until is not None and trade['timestampms'] > until:
+                    return
+                yield trade
+            if not trades or len(page) < limit_trades:
+                return
+            since_tid = trades[-1]['tid']
+            params = {'limit_trades': limit_trades, 'since_tid': since_tid}
 
     @typeassert(product_id=str, since=str)
     def get_auction_history(self, product_id, since=None):
@@ -167,10 +454,56 @@ class PublicClient(metaclass=Cached):
             ]
         """
         if since is None:
-            r = requests.get(self.public_base_url + '/auction/' + product_id)
+            return self._get('/auction/' + product_id)
         else:
             self.timestamp = time.mktime(datetime.datetime.strptime(since,
                                                                     "%d/%m/%Y").timetuple())
-            r = requests.get(self.public_base_url + '/auction/{}?since={}'.format(
+            return self._get('/auction/{}?since={}'.format(
                 product_id, int(self.timestamp)))
-        return r.json()
+
+    @typeassert(product_id=str, since=int, until=int,
+                limit_auction_results=int, include_indicative=bool)
+    def iter_auction_history(self, product_id, since=None, until=None,
+                             limit_auction_results=500,
+                             include_indicative=True):
+        """
+        Walks forward through the auction history one page at a time,
+        following the timestampms of the newest event on each page. Events
+        sharing the boundary timestamp with the previous page are dropped
+        by their eid, so each event is yielded only once, oldest first.
+
+        Args:
+            product_id(str): Can be any value in self.symbols()
+            since(int): Milliseconds since the epoch to start from
+            until(int): Milliseconds since the epoch to stop at. Default
+            is to stop at the most recent event
+            limit_auction_results(int): Page size, at most 500
+            include_indicative(bool): Whether to include publication of
+            indicative prices and quantities
+
+        Yields:
+            dict: An auction event
+            example: {
+                'auction_id': 3,
+                'auction_price': '628.775',
+                'auction_quantity': '66.32225622',
+                'eid': 4066,
+                'highest_bid_price': '628.82',
+                'lowest_ask_price': '629.48',
+                'collar_price': '629.15',
+                'auction_result': 'success',
+                'timestamp': 1471902531,
+                'timestampms': 1471902531225,
+                'event_type': 'auction'
+            }
+        """
+        def fetch(since):
+            params = {
+                'limit_auction_results': limit_auction_results,
+                'include_indicative': str(include_indicative).lower()
+            }
+            if since is not None:
+                params['timestamp'] = since
+            return self._get('/auction/{}/history'.format(product_id), params)
+        return self._walk_forward(fetch, 'eid', limit_auction_results,
+                                  since, until)
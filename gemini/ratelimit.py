@@ -0,0 +1,161 @@
+# ratelimit.py
+# Mohammad Usman
+#
+# Token buckets and a retry policy used to keep requests within Gemini's
+# rate limits
+
+from threading import Lock
+import random
+import time
+
+# Gemini allows 120 requests per minute on public endpoints and recommends
+# not exceeding 1 request per second on average. Short bursts stay well
+# within the per minute limit.
+PUBLIC_RATE = 1
+PUBLIC_BURST = 5
+
+# Private endpoints allow 600 requests per minute and Gemini recommends
+# not exceeding 5 requests per second on average.
+PRIVATE_RATE = 5
+PRIVATE_BURST = 5
+
+
+class RateLimiter:
+    """
+    A thread safe token bucket. Each call to acquire takes one token,
+    blocking until one is available. Tokens are refilled at `rate` per second
+    up to a maximum of `capacity`.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+        self.acquired = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def _take(self, start):
+        """
+        Takes a token if one is available. start is the time the caller
+        began waiting, or None if it hasn't waited yet.
+
+        Returns:
+            tuple: (waited, None) if a token was taken, otherwise (now,
+            delay) where delay is the number of seconds until one will be
+            available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                waited = 0.0 if start is None else now - start
+                self.acquired += 1
+                if waited > 0:
+                    self.queued += 1
+                    self.total_wait += waited
+                    self.max_wait = max(self.max_wait, waited)
+                return waited, None
+            return now, (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until one is available.
+
+        Returns:
+            float: The number of seconds spent waiting
+        """
+        start = None
+        while True:
+            now, delay = self._take(start)
+            if delay is None:
+                return now
+            if start is None:
+                start = now
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """
+        Same as self.acquire, but waits with asyncio.sleep so the event loop
+        keeps running.
+        """
+        # Imported here, since only async clients need it and it is slow
+        # to import
+        import asyncio
+        start = None
+        while True:
+            now, delay = self._take(start)
+            if delay is None:
+                return now
+            if start is None:
+                start = now
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        """
+        Returns:
+            dict: How many tokens were handed out, how many callers had to
+            queue for one and how long they spent queued in seconds
+            example: {
+                'acquired': 250,
+                'queued': 12,
+                'total_wait': 3.71,
+                'max_wait': 0.49
+            }
+        """
+        with self._lock:
+            return {
+                'acquired': self.acquired,
+                'queued': self.queued,
+                'total_wait': self.total_wait,
+                'max_wait': self.max_wait
+            }
+
+
+_limiters = {}
+_limiters_lock = Lock()
+
+
+def shared_limiter(key, rate, capacity=1):
+    """
+    Returns the RateLimiter registered under key, creating it on first use.
+    Clients talking to the same host with the same credentials pass the
+    same key so that they draw from one bucket.
+    """
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(rate, capacity)
+        return _limiters[key]
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed request is retried and how long to back off.
+    The delay grows exponentially with every attempt and is drawn uniformly
+    from [0, delay] ("full jitter") so that clients backing off together do
+    not retry together. A Retry-After header sent by Gemini takes precedence.
+    """
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=8.0,
+                 statuses=(429, 500, 502, 503, 504), connection_errors=True):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.connection_errors = connection_errors
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * 2 ** attempt))
@@ -0,0 +1,134 @@
+# responses.py
+# Mohammad Usman
+#
+# Optional typed records for REST responses. Numeric fields are kept as the
+# strings Gemini sends and only turned into a Decimal the first time they
+# are read.
+
+from decimal import Decimal
+
+
+class DecimalField:
+    """
+    Reads a numeric field stored in a slot. The first read converts the
+    string to a Decimal and writes it back to the slot, so the conversion
+    happens at most once per record.
+    """
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, (str, int, float)):
+            value = Decimal(str(value))
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+
+class Record:
+    """
+    Base class of the typed records. Subclasses list every field in
+    __slots__, so records carry no per instance __dict__. Numeric fields are
+    stored in a slot with a leading underscore and exposed through a
+    DecimalField of the same name without it.
+    """
+    __slots__ = ()
+
+    def __init__(self, data):
+        for slot in self.__slots__:
+            setattr(self, slot, data.get(slot.lstrip('_')))
+
+    @classmethod
+    def from_list(cls, data):
+        return [cls(item) for item in data]
+
+    def to_dict(self):
+        return {slot.lstrip('_'): getattr(self, slot.lstrip('_'))
+                for slot in self.__slots__}
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.to_dict())
+
+
+class Ticker(Record):
+    """
+    The output of PublicClient.get_ticker
+    """
+    __slots__ = ('_bid', '_ask', '_last', 'volume')
+    bid = DecimalField('_bid')
+    ask = DecimalField('_ask')
+    last = DecimalField('_last')
+
+
+class BookEntry(Record):
+    """
+    One of the bids or asks of PublicClient.get_current_order_book
+    """
+    __slots__ = ('_price', '_amount', 'timestamp')
+    price = DecimalField('_price')
+    amount = DecimalField('_amount')
+
+
+class Trade(Record):
+    """
+    A trade of PublicClient.get_trade_history
+    """
+    __slots__ = ('tid', 'timestamp', 'timestampms', '_price', '_amount',
+                 'exchange', 'type')
+    price = DecimalField('_price')
+    amount = DecimalField('_amount')
+
+
+class Order(Record):
+    """
+    The output of PrivateClient.new_order, cancel_order and
+    status_of_order
+    """
+    __slots__ = ('order_id', 'id', 'client_order_id', 'symbol', 'exchange',
+                 '_avg_execution_price', 'side', 'type', 'timestamp',
+                 'timestampms', 'is_live', 'is_cancelled', 'is_hidden',
+                 'was_forced', '_executed_amount', '_remaining_amount',
+                 'options', '_price', '_original_amount')
+    avg_execution_price = DecimalField('_avg_execution_price')
+    executed_amount = DecimalField('_executed_amount')
+    remaining_amount = DecimalField('_remaining_amount')
+    price = DecimalField('_price')
+    original_amount = DecimalField('_original_amount')
+
+
+class Balance(Record):
+    """
+    One currency of PrivateClient.get_balance
+    """
+    __slots__ = ('type', 'currency', '_amount', '_available',
+                 '_availableForWithdrawal')
+    amount = DecimalField('_amount')
+    available = DecimalField('_available')
+    availableForWithdrawal = DecimalField('_availableForWithdrawal')
+
+
+def order_book(book):
+    """
+    Turns the output of PublicClient.get_current_order_book into lists of
+    BookEntry.
+
+    Returns:
+        dict: example: {
+            'bids': [BookEntry(...), ...],
+            'asks': [BookEntry(...), ...]
+        }
+    """
+    return {
+        'bids': BookEntry.from_list(book.get('bids', [])),
+        'asks': BookEntry.from_list(book.get('asks', []))
+    }
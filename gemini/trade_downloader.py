@@ -0,0 +1,180 @@
+# trade_downloader.py
+# Mohammad Usman
+#
+# Keeps a local copy of Gemini's public trade history up to date
+
+from .debugly import typeassert
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import os
+import csv
+import json
+
+
+class TradeDownloader:
+    """
+    Downloads the trade history of several symbols into a directory, with
+    one csv file per symbol. The tid of the last trade written for each
+    symbol is checkpointed to checkpoint.json, so an interrupted sync
+    resumes where it stopped and later syncs only fetch new trades.
+    """
+    headers = ['tid', 'timestampms', 'timestamp', 'price', 'amount',
+               'exchange', 'type']
+
+    @typeassert(directory=str, checkpoint_every=int)
+    def __init__(self, client, directory, checkpoint_every=500):
+        """
+        Args:
+            client(PublicClient): Used to fetch the trades
+            directory(str): Directory the csv and checkpoint files are kept in
+            checkpoint_every(int): Number of trades written between
+            checkpoints
+        """
+        self.client = client
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._checkpoint_path = os.path.join(directory, 'checkpoint.json')
+        self.checkpoints = self._load_checkpoints()
+
+    def _load_checkpoints(self):
+        try:
+            with open(self._checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_checkpoint(self, product_id, tid):
+        """
+        Records tid for product_id, replacing checkpoint.json atomically so
+        a crash can never leave it half written.
+        """
+        with self._lock:
+            self.checkpoints[product_id] = tid
+            tmp_path = self._checkpoint_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.checkpoints, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._checkpoint_path)
+
+    def path(self, product_id):
+        return os.path.join(self.directory, '{}.csv'.format(product_id.lower()))
+
+    def _recover(self, product_id):
+        """
+        Drops a partially written last row left behind by a crash and
+        returns the tid of the last complete row, or None if the file is
+        empty or missing.
+        """
+        try:
+            f = open(self.path(product_id), 'rb+')
+        except FileNotFoundError:
+            return None
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            end = tail.rfind(b'\n') + 1
+            if end < len(tail):
+                f.truncate(size - len(tail) + end)
+            lines = tail[:end].splitlines()
+        if not lines:
+            return None
+        tid = lines[-1].split(b',', 1)[0]
+        return int(tid) if tid.isdigit() else None
+
+    @typeassert(product_id=str)
+    def last_tid(self, product_id):
+        """
+        Returns the tid of the most recent trade stored for product_id.
+        Trades written after the last checkpoint are taken into account.
+        """
+        tids = [tid for tid in (self.checkpoints.get(product_id),
+                                self._recover(product_id))
+                if tid is not None]
+        return max(tids) if tids else None
+
+    @typeassert(product_id=str, since=int)
+    def sync_symbol(self, product_id, since=None):
+        """
+        Appends every trade newer than the stored history of product_id.
+
+        Args:
+            product_id(str): Can be any value in client.symbols()
+            since(int): Milliseconds since the epoch to start from when
+            nothing has been stored for product_id yet. Ignored otherwise
+
+        Returns:
+            int: The number of trades written
+        """
+        last_tid = self.last_tid(product_id)
+        if last_tid is not None:
+            trades = self.client.iter_trade_history(product_id,
+                                                    since_tid=last_tid)
+        elif since is not None:
+            trades = self.client.iter_trade_history(product_id, since=since)
+        else:
+            trades = self.client.iter_trade_history(product_id)
+        path = self.path(product_id)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        written = 0
+        with open(path, 'a', newline='') as f:
+            f_csv = csv.DictWriter(f, self.headers, extrasaction='ignore')
+            if new_file:
+                f_csv.writeheader()
+            try:
+                for trade in trades:
+                    f_csv.writerow(trade)
+                    last_tid = trade['tid']
+                    written += 1
+                    if written % self.checkpoint_every == 0:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        self._save_checkpoint(product_id, last_tid)
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+                if last_tid is not None:
+                    self._save_checkpoint(product_id, last_tid)
+        return written
+
+    @typeassert(product_ids=list, since=int, max_workers=int)
+    def sync(self, product_ids, since=None, max_workers=4):
+        """
+        Syncs several symbols in parallel.
+
+        Args:
+            product_ids(list): Values in client.symbols()
+            since(int): See self.sync_symbol
+            max_workers(int): Number of symbols synced at the same time
+
+        Returns:
+            dict: Maps each symbol to the number of trades written, or to
+            an error dict if its sync failed. Network and file errors only
+            fail the symbol they happened on
+            example: {
+                'btcusd': 1250,
+                'ethusd': {
+                    'result': 'error',
+                    'reason': 'PermissionError',
+                    'message': '...'
+                }
+            }
+        """
+        def _sync(product_id):
+            try:
+                if since is None:
+                    return self.sync_symbol(product_id)
+                return self.sync_symbol(product_id, since=since)
+            # requests' exceptions are OSErrors too
+            except (OSError, ValueError) as e:
+                return {
+                    'result': 'error',
+                    'reason': type(e).__name__,
+                    'message': str(e)
+                }
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(product_ids, executor.map(_sync, product_ids)))
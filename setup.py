@@ -11,6 +11,7 @@ setup(
     description='A python client for the Gemini API and Websocket',
     python_requires='>=3',
     install_requires=['requests', 'pytest', 'websocket', 'websocket-client'],
+    extras_require={'async': ['aiohttp']},
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Environment :: Console',
@@ -0,0 +1,59 @@
+import datetime
+import requests
+
+
+class Response:
+    """
+    Stands in for requests.Response in tests that don't reach Gemini
+    """
+    def __init__(self, body, status_code=200, headers=None, elapsed=0):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+
+class DetailsClient:
+    """
+    Stands in for PublicClient, counting the symbol_details requests
+    """
+    def __init__(self):
+        self.requests = 0
+
+    def symbol_details(self, symbol):
+        self.requests += 1
+        return {"symbol": symbol.upper(), "tick_size": 1e-08,
+                "quote_increment": 0.01, "min_order_size": "0.00001",
+                "status": "cancel_only" if symbol == "zecusd" else "open"}
+
+    def symbols_details(self, symbols):
+        return {symbol: self.symbol_details(symbol) for symbol in symbols}
+
+
+def event(type, order_id='86560106', **fields):
+    """
+    An order event of the order events websocket, with fields overridden
+    """
+    event = {'api_session': 'lVTsC8CfoxkbkHVBKjEu',
+             'event_id': '86560107',
+             'is_cancelled': False,
+             'is_live': True,
+             'order_id': order_id,
+             'order_type': 'exchange limit',
+             'original_amount': '0.1',
+             'price': '10000.00',
+             'side': 'buy',
+             'socket_sequence': 38,
+             'symbol': 'btcusd',
+             'timestamp': '1512080804',
+             'timestampms': 1512080804958,
+             'type': type}
+    event.update(fields)
+    return event
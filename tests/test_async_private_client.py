@@ -0,0 +1,135 @@
+import sys
+import json
+import base64
+import hmac
+import hashlib
+import asyncio
+import pytest
+sys.path.insert(0, '..')
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+from gemini.async_private_client import AsyncPrivateClient
+from gemini.ratelimit import RateLimiter
+
+# Keys of their own, so the cached clients of other tests aren't redirected
+PUBLIC_KEY = 'async-private-client-public-key'
+PRIVATE_KEY = 'async-private-client-private-key'
+
+
+class StubGemini:
+    """
+    A local stand-in for Gemini's REST API. Private requests must be
+    signed with PRIVATE_KEY.
+    """
+    def __init__(self, invalid_nonces=0):
+        self.invalid_nonces = invalid_nonces
+        self.nonces = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        app = web.Application()
+        app.router.add_post('/v1/{method:.*}', self.private)
+        app.router.add_get('/v1/pubticker/{symbol}', self.ticker)
+        self.runner = web.AppRunner(app)
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return 'http://127.0.0.1:{}'.format(port)
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def ticker(self, request):
+        return web.json_response({'last': '1', 'symbol':
+                                  request.match_info['symbol']})
+
+    async def private(self, request):
+        b64_payload = request.headers['X-GEMINI-PAYLOAD'].encode('utf-8')
+        signature = hmac.new(PRIVATE_KEY.encode('utf-8'), b64_payload,
+                             hashlib.sha384).hexdigest()
+        if signature != request.headers['X-GEMINI-SIGNATURE']:
+            return web.json_response({'result': 'error',
+                                      'reason': 'InvalidSignature'},
+                                     status=400)
+        payload = json.loads(base64.b64decode(b64_payload))
+        if self.invalid_nonces:
+            self.invalid_nonces -= 1
+            return web.json_response({'result': 'error',
+                                      'reason': 'InvalidNonce'}, status=400)
+        self.nonces.append(payload['nonce'])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return web.json_response(dict(payload, order_id=payload.get(
+            'order_id', '1')))
+
+
+def run(test, **kwargs):
+    async def _run():
+        server = StubGemini(**kwargs)
+        url = await server.start()
+        client = AsyncPrivateClient(PUBLIC_KEY, PRIVATE_KEY, sandbox=True)
+        client._base_url = url
+        client.public_base_url = url + '/v1'
+        # The stub isn't rate limited, and a fresh limiter keeps the
+        # requests made by earlier tests from throttling this one
+        client._private_rate_limiter = RateLimiter(100, 100)
+        try:
+            async with client:
+                return await test(client), server
+        finally:
+            await server.stop()
+    return asyncio.run(_run())
+
+
+class TestAsyncPrivateClient:
+    def test_signed_request(self):
+        async def test(client):
+            return await client.status_of_order('123')
+
+        result, server = run(test)
+        assert result['request'] == '/v1/order/status'
+        assert result['order_id'] == '123'
+        assert server.nonces == [result['nonce']]
+
+    def test_public_request(self):
+        async def test(client):
+            return await client.get_ticker('btcusd')
+
+        result, server = run(test)
+        assert result == {'last': '1', 'symbol': 'btcusd'}
+
+    def test_invalid_nonce_is_signed_again(self):
+        async def test(client):
+            return await client.get_balance()
+
+        result, server = run(test, invalid_nonces=2)
+        assert result['request'] == '/v1/balances'
+        assert server.nonces == [result['nonce']]
+
+    def test_batch_runs_concurrently(self):
+        async def test(client):
+            return await client.cancel_orders([str(i) for i in range(5)])
+
+        result, server = run(test)
+        assert sorted(result) == [str(i) for i in range(5)]
+        assert all(r['request'] == '/v1/order/cancel' for r in result.values())
+        assert len(set(server.nonces)) == 5
+        assert server.max_in_flight > 1
+
+    def test_new_orders(self):
+        async def test(client):
+            return await client.new_orders([
+                {'symbol': 'btcusd', 'amount': '1', 'price': '1',
+                 'side': 'buy'},
+                {'symbol': 'ethusd', 'amount': '2', 'price': '1',
+                 'side': 'sell'}])
+
+        result, server = run(test)
+        assert sorted(r['symbol'] for r in result.values()) == ['btcusd',
+                                                                  'ethusd']
+        for client_order_id, r in result.items():
+            assert r['client_order_id'] == client_order_id
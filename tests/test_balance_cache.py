@@ -0,0 +1,109 @@
+from .keys import public_key, private_key
+import sys
+import time
+from decimal import Decimal
+sys.path.insert(0, '..')
+from gemini import BalanceCache, OrderEventsWS
+
+
+class Client:
+    """
+    Answers get_balance and symbol_details like PrivateClient
+    """
+    def __init__(self):
+        self.symbol_details_calls = 0
+        self.during_get_balance = None
+
+    def get_balance(self):
+        if self.during_get_balance is not None:
+            self.during_get_balance()
+        return [{'type': 'exchange', 'currency': 'BTC', 'amount': '1',
+                 'available': '1', 'availableForWithdrawal': '1'},
+                {'type': 'exchange', 'currency': 'USD', 'amount': '10000',
+                 'available': '9000', 'availableForWithdrawal': '9000'}]
+
+    def symbol_details(self, symbol):
+        self.symbol_details_calls += 1
+        return {'symbol': symbol.upper(), 'base_currency': 'BTC',
+                'quote_currency': 'USD'}
+
+
+def fill(side, amount, price, fee, timestampms=None):
+    return {'type': 'fill', 'order_id': '86560106', 'symbol': 'btcusd',
+            'side': side, 'socket_sequence': 40, 'timestampms': timestampms,
+            'fill': {'trade_id': '1', 'liquidity': 'Maker', 'price': price,
+                     'amount': amount, 'fee': fee, 'fee_currency': 'USD'}}
+
+
+class TestBalanceCache:
+    def test_on_event(self):
+        r = BalanceCache(Client(), symbols=['btcusd'])
+        r.sync()
+        assert r.available('btc') == Decimal('1')
+        r.on_event(fill('buy', '0.5', '1000', '1.25'))
+        assert r.position('BTC') == Decimal('1.5')
+        assert r.position('USD') == Decimal('9498.75')
+        assert r.available('USD') == Decimal('8498.75')
+        r.on_event(fill('sell', '1.5', '2000', '3'))
+        assert r.position('BTC') == 0
+        assert r.position('USD') == Decimal('12495.75')
+        r.on_event({'type': 'booked', 'order_id': '1'})
+        assert r.available('ETH') == 0
+
+    def test_attach(self):
+        r = BalanceCache(Client(), symbols=['btcusd'])
+        r.sync()
+        ws = OrderEventsWS(public_key, private_key, sandbox=True)
+        r.attach(ws)
+        try:
+            ws.on_message([fill('buy', '1', '1000', '0')])
+        finally:
+            ws.remove_listener(r.on_event)
+        assert r.position('BTC') == Decimal('2')
+
+    def test_no_requests_on_the_listener_thread(self):
+        client = Client()
+        r = BalanceCache(client, symbols=['BTCUSD'])
+        r.sync()
+        assert client.symbol_details_calls == 1
+        r.on_event(fill('buy', '1', '1000', '0'))
+        assert client.symbol_details_calls == 1
+        assert r.position('BTC') == Decimal('2')
+
+    def test_unknown_symbol_is_resolved_in_the_background(self):
+        client = Client()
+        r = BalanceCache(client)
+        r.sync()
+
+        def wait_for_resolution():
+            deadline = time.monotonic() + 2
+            while r._resolving and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        def failing(symbol):
+            raise ValueError('offline')
+        client.symbol_details, working = failing, client.symbol_details
+        r.on_event(fill('buy', '1', '1000', '0'))
+        wait_for_resolution()
+        # Held back until the currencies are known
+        assert r.position('BTC') == Decimal('1')
+        client.symbol_details = working
+        r.on_event(fill('buy', '1', '1000', '0'))
+        wait_for_resolution()
+        assert r.position('BTC') == Decimal('3')
+
+    def test_fills_during_sync(self):
+        client = Client()
+        r = BalanceCache(client, symbols=['btcusd'])
+        r.sync()
+        now = int(time.time() * 1000)
+
+        def fills():
+            # Already in the balances being fetched, and one made after
+            r.on_event(fill('buy', '1', '1000', '0', timestampms=now - 60000))
+            r.on_event(fill('buy', '0.5', '1000', '0',
+                            timestampms=now + 60000))
+        client.during_get_balance = fills
+        r.sync()
+        assert r.position('BTC') == Decimal('1.5')
+        assert r.position('USD') == Decimal('9500')
@@ -0,0 +1,33 @@
+import sys
+sys.path.insert(0, '..')
+from gemini import feeds
+from benchmarks.run import run
+from gemini import OrderEventsWS
+
+
+class TestFeeds:
+    def test_feeds_are_reproducible(self):
+        assert (list(feeds.market_data_frames(50, seed=1)) ==
+                list(feeds.market_data_frames(50, seed=1)))
+        assert (list(feeds.order_event_frames(50, seed=1)) !=
+                list(feeds.order_event_frames(50, seed=2)))
+
+    def test_order_events_are_in_sequence(self):
+        r = OrderEventsWS('feed-public-key', 'feed-private-key')
+        for frame in feeds.order_event_frames(500):
+            r.on_message(frame)
+        assert r.sequence_gaps == 0
+        assert r.duplicates == 0
+        assert r.heartbeat_monitor.count == 10
+        assert len(r.order_state) > 0
+
+
+class TestRun:
+    def test_run(self):
+        report = run(n=200, depth=20)
+        assert sorted(report['results']) == [
+            'GeminiOrderBook.on_message', 'MarketDataWS.on_message',
+            'OrderEventsWS.on_message', 'PrivateClient.api_query']
+        for result in report['results'].values():
+            assert result['messages_per_sec'] > 0
+            assert result['p50_us'] <= result['p99_us'] <= result['max_us']
@@ -0,0 +1,52 @@
+from .keys import public_key, private_key
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, '..')
+from gemini import PublicClient, PrivateClient, MarketDataWS
+from gemini.cached import Cached
+
+
+class Slow(metaclass=Cached):
+    created = 0
+
+    def __init__(self, name, options=None):
+        time.sleep(0.01)
+        Slow.created += 1
+        self.name = name
+
+
+class TestCached:
+    def test_arguments_are_normalized(self):
+        r = PublicClient(sandbox=True)
+        assert PublicClient(True) is r
+        assert PublicClient() is PublicClient(False)
+        assert PublicClient() is PublicClient(sandbox=False)
+        assert PublicClient() is not r
+        assert (PrivateClient(public_key, private_key, True) is
+                PrivateClient(public_key, private_key, sandbox=True))
+        assert MarketDataWS('btcusd') is MarketDataWS('btcusd', sandbox=False)
+
+    def test_concurrent_construction(self):
+        Slow.created = 0
+        barrier = threading.Barrier(8)
+
+        def create(i):
+            barrier.wait()
+            return Slow('a')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            instances = list(executor.map(create, range(8)))
+        assert all(instance is instances[0] for instance in instances)
+        assert Slow.created == 1
+
+    def test_unhashable_and_list_arguments(self):
+        assert Slow('b', ['x']) is Slow('b', options=['x'])
+        assert Slow('b', {'x': [1]}) is Slow('b', {'x': [1]})
+        assert Slow('b', {'x': {1}}) is not Slow('b', {'x': {1}})
+
+    def test_clients_share_connections(self):
+        public = PublicClient(sandbox=True)
+        private = PrivateClient(public_key, private_key, sandbox=True)
+        assert public._session is private._session
+        assert PublicClient()._session is not public._session
@@ -0,0 +1,171 @@
+import sys
+import json
+import time
+import pytest
+import requests
+sys.path.insert(0, '..')
+pytest.importorskip('aiohttp')
+from websocket import create_connection, WebSocketConnectionClosedException
+from gemini import PrivateClient, OrderEventsWS
+from gemini.fake_exchange import FakeExchange
+from gemini.ratelimit import RateLimiter
+
+# Keys of their own, so the cached clients of other tests aren't redirected
+PUBLIC_KEY = 'fake-exchange-public-key'
+PRIVATE_KEY = 'fake-exchange-private-key'
+
+
+@pytest.fixture
+def exchange():
+    fake = FakeExchange({PUBLIC_KEY: PRIVATE_KEY}, heartbeat_interval=0.05,
+                        market_data_rate=200)
+    with fake:
+        yield fake
+
+
+@pytest.fixture
+def client(exchange):
+    r = PrivateClient(PUBLIC_KEY, PRIVATE_KEY, sandbox=True)
+    exchange.connect(r)
+    r._private_rate_limiter = RateLimiter(100, 100)
+    return r
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class TestRest:
+    def test_public_endpoints(self, client):
+        assert client.symbols() == ['btcusd', 'ethusd']
+        assert client.get_ticker('btcusd')['ask'] == '6400.01'
+        book = client.get_current_order_book('ethusd')
+        assert book['bids'][0]['price'] == '449.99'
+        assert client.symbol_details('btcusd')['status'] == 'open'
+        assert client.get_ticker('dogeusd')['reason'] == 'InvalidSymbol'
+
+    def test_order_lifecycle(self, client, exchange):
+        order = client.new_order('btcusd', '1', '6300', 'buy', [],
+                                 client_order_id='resting')
+        assert order['is_live'] is True
+        assert [o['order_id'] for o in client.active_orders()] == [order['order_id']]
+
+        exchange.fill(order['order_id'], '0.25')
+        status = client.status_of_order(order['order_id'])
+        assert status['executed_amount'] == '0.25'
+        assert status['remaining_amount'] == '0.75'
+        trade, = client.get_past_trades('btcusd')
+        assert trade['aggressor'] is False
+        assert trade['client_order_id'] == 'resting'
+
+        assert client.cancel_order(order['order_id'])['is_cancelled']
+        assert client.active_orders() == []
+
+    def test_crossing_orders(self, client):
+        taker = client.new_order('btcusd', '2', '6500', 'buy', [])
+        assert taker['executed_amount'] == '2'
+        assert taker['avg_execution_price'] == '6400.01'
+        ioc = client.new_order('btcusd', '1', '6000', 'buy')
+        assert ioc['is_cancelled'] is True
+        maker = client.new_order('btcusd', '1', '6500', 'buy',
+                                 ['maker-or-cancel'])
+        assert maker['is_cancelled'] is True
+        balances = {b['currency']: b['amount'] for b in client.get_balance()}
+        assert balances['BTC'] == '1000002'
+
+    def test_trade_pagination(self, client, exchange):
+        order = client.new_order('ethusd', '7', '440', 'buy', [])
+        for _ in range(7):
+            exchange.fill(order['order_id'], '1')
+            # Trades of their own millisecond, so each page moves forward
+            time.sleep(0.002)
+        tids = [t['tid'] for t in client.iter_past_trades('ethusd',
+                                                           limit_trades=3)]
+        assert len(tids) == 7 and tids == sorted(tids)
+        public = [t['tid'] for t in client.iter_trade_history(
+            'ethusd', since_tid=tids[0] - 1, limit_trades=3)]
+        assert public == tids
+        newest = requests.get(exchange.url + '/v1/trades/ethusd',
+                              params={'limit_trades': 3}).json()
+        assert [t['tid'] for t in newest] == tids[:-4:-1]
+
+    def test_invalid_parameter(self, exchange):
+        r = requests.get(exchange.url + '/v1/trades/btcusd',
+                         params={'limit_trades': 'ten'})
+        assert r.status_code == 400
+        assert r.json()['reason'] == 'InvalidParameter'
+        r = requests.get(exchange.url + '/v1/book/btcusd',
+                         params={'limit_bids': 'all'})
+        assert r.json()['reason'] == 'InvalidParameter'
+
+    def test_bad_signature(self, exchange):
+        r = PrivateClient(PUBLIC_KEY, 'wrong-private-key', sandbox=True)
+        exchange.connect(r)
+        assert r.get_balance()['reason'] == 'InvalidSignature'
+        assert exchange.stats['rejected'] == 1
+
+    def test_nonce_must_increase(self, client, exchange):
+        headers = client._signed_headers('/v1/balances', {})
+        url = exchange.url + '/v1/balances'
+        assert requests.post(url, headers=headers).status_code == 200
+        r = requests.post(url, headers=headers)
+        assert r.status_code == 400
+        assert r.json()['reason'] == 'InvalidNonce'
+
+    def test_latency(self, client, exchange):
+        exchange.latency = 0.1
+        start = time.monotonic()
+        client.symbols()
+        assert time.monotonic() - start >= 0.1
+
+
+class TestWebsockets:
+    def test_market_data(self, exchange):
+        exchange.gap_every = 5
+        ws = create_connection(exchange.ws_url + '/v1/marketdata/btcusd')
+        try:
+            initial = json.loads(ws.recv())
+            assert len(initial['events']) == 2 * exchange.depth
+            sequences = [json.loads(ws.recv())['socket_sequence']
+                         for _ in range(8)]
+        finally:
+            ws.close()
+        assert sequences == [1, 2, 3, 4, 6, 7, 8, 9]
+
+    def test_disconnect_after(self, exchange):
+        exchange.disconnect_after = 3
+        ws = create_connection(exchange.ws_url + '/v1/marketdata/ethusd')
+        frames = 0
+        try:
+            while ws.recv():
+                frames += 1
+        except WebSocketConnectionClosedException:
+            pass
+        assert frames == 3
+        assert exchange.stats['disconnects'] == 1
+
+    def test_order_events(self, client, exchange):
+        r = OrderEventsWS(PUBLIC_KEY, PRIVATE_KEY, sandbox=True,
+                          symbol_filter=['btcusd'])
+        exchange.connect(r)
+        r.on_open = lambda: None
+        r.start()
+        try:
+            wait_for(lambda: r.heartbeat_monitor.count > 0)
+            order = client.new_order('btcusd', '1', '6300', 'buy', [])
+            client.new_order('ethusd', '1', '400', 'buy', [])
+
+            def booked():
+                state = r.order_state.status_of_order(order['order_id'])
+                return state is not None and state['last_event'] == 'booked'
+            wait_for(booked)
+            exchange.gap_every = 2
+            exchange.fill(order['order_id'])
+            wait_for(lambda: r.sequence_gaps > 0)
+        finally:
+            r.close()
+        assert r.order_book['subscription_ack'][0]['symbolFilter'] == ['btcusd']
+        assert all(o['symbol'] == 'btcusd' for o in r.order_state.active_orders())
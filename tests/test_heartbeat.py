@@ -0,0 +1,112 @@
+from .keys import public_key, private_key
+from .fakes import Response
+import sys
+import json
+import base64
+import time
+import requests
+sys.path.insert(0, '..')
+from gemini import PrivateClient, HeartbeatKeeper
+from gemini.heartbeat import HeartbeatMonitor
+
+
+def client():
+    return PrivateClient(public_key, private_key, sandbox=True)
+
+
+class TestHeartbeatKeeper:
+    def test_beat(self, monkeypatch):
+        failures = []
+        r = HeartbeatKeeper(client(), on_failure=failures.append)
+        requests_sent = []
+
+        def post(url, headers=None, timeout=None):
+            requests_sent.append(
+                json.loads(base64.b64decode(headers['X-GEMINI-PAYLOAD'])))
+            if len(requests_sent) == 2:
+                raise requests.ConnectionError('connection reset')
+            return Response({'result': 'ok'})
+        monkeypatch.setattr(r._session, 'post', post)
+        assert r.beat() is True
+        assert r.beat() is False
+        assert requests_sent[0]['request'] == '/v1/heartbeat'
+        assert requests_sent[1]['nonce'] > requests_sent[0]['nonce']
+        assert isinstance(failures[0], requests.ConnectionError)
+        stats = r.stats()
+        assert stats['beats'] == 1
+        assert stats['failures'] == 1
+
+    def test_late(self, monkeypatch):
+        late = []
+        r = HeartbeatKeeper(client(), interval=0.01, on_late=late.append)
+        monkeypatch.setattr(r._session, 'post',
+                            lambda *args, **kwargs: Response({'result': 'ok'}))
+        r.beat()
+        time.sleep(0.05)
+        r.beat()
+        assert len(late) == 1 and late[0] >= 0.05
+        assert r.stats()['late'] == 1
+
+    def test_invalid_nonce_is_resent(self, monkeypatch):
+        r = HeartbeatKeeper(client())
+        nonces = []
+
+        def post(url, headers=None, timeout=None):
+            nonces.append(json.loads(
+                base64.b64decode(headers['X-GEMINI-PAYLOAD']))['nonce'])
+            if len(nonces) == 1:
+                return Response({'result': 'error', 'reason': 'InvalidNonce'},
+                                status_code=400)
+            return Response({'result': 'ok'})
+        monkeypatch.setattr(r._session, 'post', post)
+        assert r.beat() is True
+        assert len(nonces) == 2 and nonces[1] > nonces[0]
+        assert r.stats()['failures'] == 0
+
+    def test_late_while_failing(self, monkeypatch):
+        late = []
+        r = HeartbeatKeeper(client(), interval=0.01, jitter=0,
+                            on_late=late.append, on_failure=lambda e: None)
+
+        def post(*args, **kwargs):
+            raise requests.ConnectionError('connection refused')
+        monkeypatch.setattr(r._session, 'post', post)
+        r.start()
+        time.sleep(0.1)
+        r.stop()
+        # Reported once for the whole stretch without a successful beat
+        assert len(late) == 1 and late[0] > 0.015
+        assert r.stats()['beats'] == 0
+        assert r.stats()['late'] == 1
+
+    def test_start(self, monkeypatch):
+        r = HeartbeatKeeper(client(), interval=0.02, jitter=0.01)
+        monkeypatch.setattr(r._session, 'post',
+                            lambda *args, **kwargs: Response({'result': 'ok'}))
+        r.start()
+        time.sleep(0.15)
+        r.stop()
+        assert 4 <= r.stats()['beats'] <= 10
+
+
+class TestHeartbeatMonitor:
+    def test_record(self):
+        r = HeartbeatMonitor(size=3)
+        assert r.is_alive() is False
+        for sequence, timestampms in [(0, 0), (1, 5000), (2, 10100),
+                                      (3, 25000), (5, 30000)]:
+            r.record({'type': 'heartbeat', 'sequence': sequence,
+                      'timestampms': timestampms})
+        assert len(r.heartbeats) == 3
+        stats = r.stats()
+        assert stats['count'] == 5
+        assert stats['missed'] == 2
+        assert stats['sequence_gaps'] == 1
+        assert stats['last_sequence'] == 5
+        assert r.is_alive() is True
+
+    def test_new_connection_is_not_a_gap(self):
+        r = HeartbeatMonitor()
+        for sequence in [7, 8, 0, 1]:
+            r.record({'type': 'heartbeat', 'sequence': sequence})
+        assert r.sequence_gaps == 0
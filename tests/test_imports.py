@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_modules(code):
+    """
+    Runs code in a fresh interpreter and returns the modules it loaded
+    """
+    out = subprocess.check_output(
+        [sys.executable, '-c',
+         code + '; import sys, json; print(json.dumps(list(sys.modules)))'],
+        cwd=ROOT)
+    return set(json.loads(out.decode('utf-8')))
+
+
+class TestImports:
+    def test_import_is_lazy(self):
+        modules = loaded_modules('import gemini')
+        for name in ['requests', 'websocket', 'gemini.public_client']:
+            assert name not in modules
+
+    def test_public_client_only_loads_what_it_needs(self):
+        modules = loaded_modules('import gemini; gemini.PublicClient')
+        assert 'requests' in modules
+        # requests itself loads csv and hmac
+        for name in ['websocket', 'xml.dom.minidom', 'asyncio', 'aiohttp',
+                     'gemini.private_client']:
+            assert name not in modules
+
+    def test_export_modules_load_on_export(self):
+        modules = loaded_modules('import gemini; gemini.OrderEventsWS; '
+                                 'gemini.MarketDataWS')
+        assert 'websocket' in modules
+        for name in ['xml.dom.minidom', 'xml.etree.ElementTree']:
+            assert name not in modules
+
+    def test_submodules(self):
+        # As used in the README, with nothing imported beforehand
+        out = subprocess.check_output(
+            [sys.executable, '-c',
+             'import gemini; '
+             'print(gemini.nonce.nonce_allocator("k").next() > 0, '
+             'gemini.ratelimit.RetryPolicy(max_retries=5).max_retries, '
+             'gemini.public_client.POOL_SIZE > 0)'],
+            cwd=ROOT)
+        assert out.decode('utf-8').split() == ['True', '5', 'True']
+
+    def test_names(self):
+        import gemini
+        assert gemini.PublicClient.__name__ == 'PublicClient'
+        assert 'TradeDownloader' in dir(gemini)
+        try:
+            gemini.Unknown
+        except AttributeError:
+            pass
+        else:
+            assert False
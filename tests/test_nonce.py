@@ -0,0 +1,31 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, '..')
+from gemini.nonce import NonceAllocator, nonce_allocator
+
+
+class TestNonceAllocator:
+    def test_next_across_threads(self):
+        r = NonceAllocator()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            nonces = list(executor.map(lambda i: r.next(), range(2000)))
+        assert len(set(nonces)) == 2000
+
+    def test_next_is_increasing(self):
+        r = NonceAllocator()
+        nonces = [r.next() for i in range(100)]
+        assert nonces == sorted(nonces)
+
+    def test_shared_file(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'nonce')
+        first, second = NonceAllocator(path), NonceAllocator(path)
+        a = first.next()
+        with open(path, 'w') as f:
+            f.write(str(a + 10000))
+        assert second.next() == a + 10001
+        assert first.next() == a + 10002
+
+    def test_nonce_allocator(self):
+        assert nonce_allocator('key') is nonce_allocator('key')
+        assert nonce_allocator('key') is not nonce_allocator('other')
@@ -0,0 +1,65 @@
+from .fakes import event
+import sys
+import os
+sys.path.insert(0, '..')
+from gemini.order_journal import OrderEventJournal
+from gemini.order_state import OrderStateStore
+
+
+class TestOrderEventJournal:
+    def test_replay(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'events.jsonl')
+        r = OrderEventJournal(path, sync_every=2)
+        r.append(event('booked', order_id='1', timestampms=1))
+        r.append(event('booked', order_id='2', timestampms=2))
+        r.append(event('cancelled', order_id='2', is_live=False,
+                       timestampms=3))
+        r.close()
+
+        store = OrderStateStore()
+        restarted = OrderEventJournal(path)
+        assert restarted.replay(store) == 3
+        assert restarted.last_timestampms == 3
+        assert [o['order_id'] for o in store.active_orders()] == ['1']
+        assert store.status_of_order('2')['is_cancelled'] is True
+
+    def test_partial_line_is_dropped(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'events.jsonl')
+        r = OrderEventJournal(path)
+        r.append(event('booked', order_id='1'))
+        r.close()
+        with open(path, 'a') as f:
+            f.write('{"type": "boo')
+        assert len(list(r.events())) == 1
+        r.append(event('booked', order_id='2'))
+        r.close()
+        assert [e['order_id'] for e in r.events()] == ['1', '2']
+
+    def test_compact(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'events.jsonl')
+        store = OrderStateStore()
+        r = OrderEventJournal(path)
+        for e in [event('booked', order_id='1'), event('booked', order_id='2'),
+                  event('closed', order_id='2', is_live=False)]:
+            store.apply(e)
+            r.append(e)
+        store.remove('2')
+        r.compact(store)
+        r.append(event('fill', order_id='1'))
+        r.close()
+        assert [e['type'] for e in r.events()] == ['booked', 'fill']
+
+    def test_compact_while_appending(self, tmp_path):
+        path = os.path.join(str(tmp_path), 'events.jsonl')
+        store = OrderStateStore()
+        r = OrderEventJournal(path)
+        booked = event('booked', order_id='1')
+        store.apply(booked)
+        r.append(booked)
+        # Compacted after the store has the fill but before the journal does
+        fill = event('fill', order_id='1')
+        store.apply(fill)
+        r.compact(store)
+        r.append(fill)
+        r.close()
+        assert [e['type'] for e in r.events()] == ['booked', 'fill']
@@ -0,0 +1,86 @@
+from .keys import public_key, private_key
+import sys
+import json
+import base64
+import pytest
+import requests
+sys.path.insert(0, '..')
+from gemini import PrivateClient, OrderLatencyTracker
+from gemini.order_latency import LatencyHistogram
+from .fakes import Response
+
+
+def client():
+    return PrivateClient(public_key, private_key, sandbox=True)
+
+
+def event(type, client_order_id, symbol='btcusd'):
+    return {'type': type, 'order_id': '1', 'client_order_id': client_order_id,
+            'symbol': symbol}
+
+
+class TestLatencyHistogram:
+    def test_percentiles(self):
+        r = LatencyHistogram()
+        for ms in [0.5] * 50 + [15] * 40 + [150] * 9 + [20000]:
+            r.record(ms)
+        assert r.percentile(50) == 1
+        assert r.percentile(90) == 20
+        assert r.percentile(99) == 200
+        assert r.percentile(100) == 20000
+        assert r.to_dict()['count'] == 100
+
+
+class TestOrderLatencyTracker:
+    def test_lifecycle(self, monkeypatch):
+        r = client()
+        tracker = OrderLatencyTracker()
+        monkeypatch.setattr(r, 'order_tracker', tracker)
+        sent = []
+
+        def post(url, headers=None, timeout=None):
+            payload = json.loads(base64.b64decode(headers['X-GEMINI-PAYLOAD']))
+            sent.append(payload['client_order_id'])
+            # The order fills before the response arrives
+            tracker.on_event(event('accepted', payload['client_order_id']))
+            tracker.on_event(event('fill', payload['client_order_id']))
+            return Response(dict(payload, order_id='1'))
+        monkeypatch.setattr(r._session, 'post', post)
+
+        r.new_order('btcusd', '1', '1', 'buy')
+        r.new_order('btcusd', '1', '1', 'buy', client_order_id='mine')
+        assert len(sent[0]) == 32 and sent[1] == 'mine'
+        stats = tracker.stats()['btcusd']
+        assert sorted(stats) == ['accepted', 'fill', 'response']
+        assert all(stage['count'] == 2 for stage in stats.values())
+        assert tracker.pending() == 0
+
+    def test_booked_order_stays_pending(self):
+        tracker = OrderLatencyTracker()
+        tracker.sent('a', 'ethusd')
+        tracker.responded('a', {'order_id': '1'})
+        tracker.on_event(event('booked', 'a', 'ethusd'))
+        tracker.on_event(event('booked', 'a', 'ethusd'))
+        assert tracker.histogram('ethusd', 'booked').count == 1
+        assert tracker.pending() == 1
+        tracker.on_event(event('cancelled', 'a', 'ethusd'))
+        assert tracker.pending() == 0
+
+    def test_failed_request_is_forgotten(self, monkeypatch):
+        r = client()
+        tracker = OrderLatencyTracker()
+        monkeypatch.setattr(r, 'order_tracker', tracker)
+
+        def post(url, headers=None, timeout=None):
+            raise requests.ConnectionError('connection reset')
+        monkeypatch.setattr(r._session, 'post', post)
+        with pytest.raises(requests.ConnectionError):
+            r.new_order('btcusd', '1', '1', 'buy')
+        assert tracker.pending() == 0
+        assert tracker.stats() == {}
+
+    def test_max_pending(self):
+        tracker = OrderLatencyTracker(max_pending=3)
+        for i in range(5):
+            tracker.sent(str(i), 'btcusd')
+        assert tracker.pending() == 3
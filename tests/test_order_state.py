@@ -0,0 +1,62 @@
+from .fakes import event
+import sys
+sys.path.insert(0, '..')
+from gemini.order_state import OrderStateStore
+
+
+class TestOrderStateStore:
+    def test_apply(self):
+        r = OrderStateStore()
+        r.apply({'type': 'heartbeat', 'socket_sequence': 1})
+        assert len(r) == 0
+        r.apply(event('accepted'))
+        r.apply(event('booked'))
+        assert r.status_of_order('86560106')['last_event'] == 'booked'
+        assert len(r.active_orders()) == 1
+        assert r.active_orders('ethusd') == []
+        r.apply(event('fill', executed_amount='0.1', remaining_amount='0'))
+        r.apply(event('closed', is_live=False))
+        status = r.status_of_order('86560106')
+        assert status['executed_amount'] == '0.1'
+        assert status['is_live'] is False
+        assert r.active_orders() == []
+        assert r.status_of_order('unknown') is None
+
+    def test_reconcile(self):
+        r = OrderStateStore()
+        r.apply(event('booked', order_id='1'))
+        r.apply(event('booked', order_id='2'))
+        # Order 2 was cancelled and order 3 placed while disconnected
+        rest = [dict(event('booked', order_id='1'), id='1'),
+                dict(event('booked', order_id='3'), id='3')]
+        assert r.reconcile(rest, as_of=2 ** 62) == 2
+        assert [o['order_id'] for o in r.active_orders()] == ['1', '3']
+        assert r.status_of_order('2')['last_event'] == 'reconciled'
+        # An event received after the snapshot was taken wins
+        r.apply(event('booked', order_id='4'))
+        assert r.reconcile(rest, as_of=0) == 0
+        assert r.status_of_order('4')['is_live'] is True
+
+    def test_history_and_client_order_id(self):
+        r = OrderStateStore()
+        r.apply(event('accepted', client_order_id='ladder-1'))
+        r.apply(event('booked', client_order_id='ladder-1'))
+        r.apply(event('accepted', order_id='2'))
+        assert [e['type'] for e in r.history('86560106')] == ['accepted',
+                                                              'booked']
+        assert r.status_of_client_order('ladder-1')['order_id'] == '86560106'
+        assert r.status_of_client_order('unknown') is None
+        assert r.remove('86560106') is True
+        assert r.remove('86560106') is False
+        assert r.status_of_client_order('ladder-1') is None
+        assert r.history('86560106') == []
+        assert len(r) == 1
+
+    def test_retention(self):
+        r = OrderStateStore(retention=0)
+        r.apply(event('booked', order_id='1'))
+        r.apply(event('cancelled', order_id='2', is_live=False))
+        # Closed orders are dropped on the next update
+        r.apply(event('booked', order_id='3'))
+        assert r.status_of_order('2') is None
+        assert [o['order_id'] for o in r.active_orders()] == ['1', '3']
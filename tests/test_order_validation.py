@@ -0,0 +1,42 @@
+from .fakes import DetailsClient
+import sys
+import pytest
+sys.path.insert(0, '..')
+from gemini.order_validation import OrderValidator
+
+
+class TestOrderValidator:
+    def test_rounds_to_increments(self):
+        r = OrderValidator(DetailsClient())
+        assert r.normalize("btcusd", "0.123456789", "6400.287", "buy") == \
+            ("0.12345678", "6400.28")
+        assert r.normalize("btcusd", "0.123456789", "6400.281", "sell") == \
+            ("0.12345678", "6400.29")
+
+    def test_details_are_cached(self):
+        client = DetailsClient()
+        r = OrderValidator(client)
+        for i in range(10):
+            r.normalize("BTCUSD", "1", "1", "buy")
+        assert client.requests == 1
+
+    def test_preload(self):
+        client = DetailsClient()
+        r = OrderValidator(client)
+        r.preload(["btcusd", "ethusd"])
+        r.normalize("ethusd", "1", "1", "buy")
+        assert client.requests == 2
+
+    @pytest.mark.parametrize("symbol, amount, price, side", [
+        ("btcusd", "0.000001", "6400", "buy"),
+        ("btcusd", "-1", "6400", "buy"),
+        ("btcusd", "1", "0.001", "buy"),
+        ("btcusd", "1", "abc", "buy"),
+        ("btcusd", "NaN", "6400", "buy"),
+        ("btcusd", "1", "6400", "ask"),
+        ("zecusd", "1", "100", "buy"),
+    ])
+    def test_rejects(self, symbol, amount, price, side):
+        r = OrderValidator(DetailsClient())
+        with pytest.raises(ValueError):
+            r.normalize(symbol, amount, price, side)
@@ -2,14 +2,51 @@ from .keys import public_key, private_key
 import sys
 import os
 import time
+import pytest
 sys.path.insert(0, '..')
 from gemini import OrderEventsWS
+from gemini.gap_recovery import GapRecovery
 
 
 def client():
     return OrderEventsWS(public_key, private_key, sandbox=True)
 
 
+class RecoveryClient:
+    """
+    Stands in for PrivateClient during gap recovery. Order 1 was filled
+    twice and cancelled, order 2 is still live.
+    """
+    def __init__(self):
+        self.symbols = []
+        self.since = None
+
+    def active_orders(self):
+        return [{'order_id': '2', 'symbol': 'ethusd', 'is_live': True}]
+
+    def iter_past_trades(self, symbol, since=0):
+        self.symbols.append(symbol)
+        self.since = since
+        if symbol != 'btcusd':
+            return iter([])
+        return iter([{'tid': tid, 'order_id': '1', 'type': 'Buy',
+                      'timestamp': 2, 'timestampms': 2000 + tid,
+                      'price': '1', 'amount': '1', 'fee_amount': '0',
+                      'fee_currency': 'USD', 'aggressor': True}
+                     for tid in (100, 101)])
+
+
+def subscribe(r):
+    """
+    Starts a new subscription, as after connecting. Instances are shared
+    between tests, and the ack resets the expected socket_sequence.
+    """
+    r.on_message({'accountId': 2117, 'apiSessionFilter': [],
+                  'eventTypeFilter': [], 'symbolFilter': [],
+                  'subscriptionId': 'ws-order-events-2117-b01s1aqlv776oceke7t0',
+                  'type': 'subscription_ack'})
+
+
 class TestOrderEventsWS:
     def test_reset_order_book(self):
         r = client()
@@ -49,7 +86,7 @@ class TestOrderEventsWS:
                 assert len(r.order_book[key]) == 1
             else:
                 assert len(r.order_book[key]) == 0
-        for key in r.order_book.keys():
+        for sequence, key in enumerate(list(r.order_book.keys())):
             if key != "subscription_ack" and key != "heartbeat":
                 r.on_message([{'api_session': 'lVTsC8CfoxkbkHVBKjEu',
                                'behavior': 'immediate-or-cancel',
@@ -62,7 +99,7 @@ class TestOrderEventsWS:
                                'original_amount': '0.1',
                                'price': '10000.00',
                                'side': 'buy',
-                               'socket_sequence': 38,
+                               'socket_sequence': sequence,
                                'symbol': 'btcusd',
                                'timestamp': '1512080804',
                                'timestampms': 1512080804958,
@@ -72,6 +109,8 @@ class TestOrderEventsWS:
 
     def test_remove_order(self):
         r = client()
+        r._reset_order_book()
+        subscribe(r)
         r.on_message([{'api_session': 'lVTsC8CfoxkbkHVBKjEu',
                        'behavior': 'immediate-or-cancel',
                        'event_id': '86560107',
@@ -91,9 +130,12 @@ class TestOrderEventsWS:
         assert len(r.order_book['accepted']) == 1
         r.remove_order('accepted', '86560106')
         assert len(r.order_book['accepted']) == 0
+        # Removing an order that isn't recorded only prints a message
+        r.remove_order('accepted', '86560106')
 
     def test_export_to_csv(self):
         r = client()
+        subscribe(r)
         r.on_message({'sequence': 0,
                       'socket_sequence': 0,
                       'timestampms': 1512080326919,
@@ -105,6 +147,7 @@ class TestOrderEventsWS:
 
     def test_export_to_xml(self):
         r = client()
+        subscribe(r)
         r.on_message({'sequence': 0,
                       'socket_sequence': 0,
                       'timestampms': 1512080326919,
@@ -113,3 +156,145 @@ class TestOrderEventsWS:
         r.export_to_xml(r'{}'.format(os.getcwd()), 'heartbeat')
         assert "gemini_order_events.xml" in os.listdir(r'{}'.format(os.getcwd()))
         os.remove("gemini_order_events.xml")
+
+    def test_order_state(self):
+        r = client()
+        r.order_state.reset()
+        subscribe(r)
+        r.on_message([{'order_id': '86560106', 'symbol': 'btcusd',
+                       'is_live': True, 'socket_sequence': 40,
+                       'type': 'booked'}])
+        assert r.order_state.status_of_order('86560106')['is_live'] is True
+        r.on_message([{'order_id': '86560106', 'symbol': 'btcusd',
+                       'is_live': False, 'socket_sequence': 41,
+                       'type': 'cancelled'}])
+        assert r.order_state.active_orders() == []
+
+    def test_heartbeats_are_bounded(self):
+        r = client()
+        r._reset_order_book()
+        subscribe(r)
+        for sequence in range(500):
+            r.on_message({'sequence': sequence, 'socket_sequence': sequence,
+                          'timestampms': 1512080326919 + 5000 * sequence,
+                          'trace_id': 'b01s1aqlv776oceke7t0',
+                          'type': 'heartbeat'})
+        assert len(r.order_book['heartbeat']) == 100
+        assert r.order_book['heartbeat'][-1]['sequence'] == 499
+        liveness = r.liveness()
+        assert liveness['alive'] is True
+        assert liveness['missed'] == 0
+
+    def test_filters(self):
+        r = client()
+        assert r.subscription_url() == r.base_url
+        btc = OrderEventsWS(public_key, private_key, sandbox=True,
+                            symbol_filter=['BTCUSD'],
+                            event_type_filter=['fill', 'closed'])
+        eth = OrderEventsWS(public_key, private_key, sandbox=True,
+                            symbol_filter=['ethusd'])
+        assert btc is not r and btc is not eth
+        assert btc is OrderEventsWS(public_key, private_key, sandbox=True,
+                                    symbol_filter=['BTCUSD'],
+                                    event_type_filter=['fill', 'closed'])
+        assert btc.subscription_url() == (
+            'wss://api.sandbox.gemini.com/v1/order/events?symbolFilter=btcusd'
+            '&eventTypeFilter=fill&eventTypeFilter=closed')
+        with pytest.raises(ValueError):
+            OrderEventsWS(public_key, private_key, sandbox=True,
+                          event_type_filter=['filled'])
+
+    def test_sequence_gaps(self):
+        r = client()
+        r.order_state.reset()
+        subscribe(r)
+        gaps = r.sequence_gaps
+        duplicates = r.duplicates
+        booked = {'order_id': '1', 'symbol': 'btcusd', 'is_live': True,
+                  'type': 'booked', 'timestampms': 1512080804958}
+        r.on_message([dict(booked, socket_sequence=0)])
+        r.on_message([dict(booked, socket_sequence=0, order_id='2')])
+        assert r.duplicates == duplicates + 1
+        assert r.order_state.status_of_order('2') is None
+        r.on_message([dict(booked, socket_sequence=3, order_id='3')])
+        assert r.sequence_gaps == gaps + 1
+        assert r.order_state.status_of_order('3')['is_live'] is True
+
+    def test_failing_listener(self, monkeypatch):
+        r = client()
+        subscribe(r)
+        errors = []
+        monkeypatch.setattr(r, 'on_error', errors.append)
+        events = []
+
+        def failing(event):
+            raise ValueError('listener failed')
+        r.add_listener(failing)
+        r.add_listener(events.append)
+        try:
+            r.on_message([{'order_id': '5', 'type': 'accepted',
+                           'socket_sequence': 0},
+                          {'order_id': '5', 'type': 'booked',
+                           'socket_sequence': 0}])
+        finally:
+            r.remove_listener(failing)
+            r.remove_listener(events.append)
+        assert [e['type'] for e in events] == ['accepted', 'booked']
+        assert [str(e) for e in errors] == ['listener failed'] * 2
+
+    def test_gap_recovery(self):
+        r = client()
+        r.order_state.reset()
+        subscribe(r)
+        recovery = GapRecovery(RecoveryClient())
+        r.gap_recovery = recovery
+        fills = []
+        r.add_listener(fills.append)
+        try:
+            r.on_message([{'order_id': '1', 'symbol': 'btcusd',
+                           'is_live': True, 'type': 'booked',
+                           'socket_sequence': 0, 'timestampms': 1000}])
+            r.on_message([{'order_id': '2', 'symbol': 'ethusd',
+                           'is_live': True, 'type': 'booked',
+                           'socket_sequence': 1, 'timestampms': 1500}])
+            r.on_message([{'order_id': '1', 'symbol': 'btcusd',
+                           'type': 'fill', 'socket_sequence': 2,
+                           'timestampms': 2000,
+                           'fill': {'trade_id': '100', 'amount': '1',
+                                    'price': '1', 'fee': '0',
+                                    'fee_currency': 'USD'}}])
+            # Frames 3 and 4 are lost: order 1 was filled again and
+            # cancelled, order 2 is unaffected
+            r.on_message({'type': 'heartbeat', 'socket_sequence': 5,
+                          'sequence': 1, 'timestampms': 9000})
+        finally:
+            r.gap_recovery = None
+            r.remove_listener(fills.append)
+        assert recovery.client.symbols == ['btcusd', 'ethusd']
+        assert recovery.client.since == 2000
+        recovered = [e for e in fills if e.get('recovered')]
+        assert [e['fill']['trade_id'] for e in recovered] == ['101']
+        assert r.order_state.status_of_order('1')['is_live'] is False
+        assert r.order_state.status_of_order('2')['is_live'] is True
+
+    def test_gap_on_first_frame(self):
+        r = client()
+        r.order_state.reset()
+        r._reset_order_book()
+        # As on a websocket that hasn't received anything yet
+        r._last_timestampms = None
+        subscribe(r)
+        recovery = GapRecovery(RecoveryClient())
+        r.gap_recovery = recovery
+        try:
+            # No frame before the gap carries a timestampms
+            r.on_message({'type': 'heartbeat', 'socket_sequence': 0,
+                          'sequence': 0})
+            r.on_message([{'order_id': '1', 'symbol': 'btcusd',
+                           'is_live': True, 'type': 'booked',
+                           'socket_sequence': 2, 'timestampms': 3000}])
+        finally:
+            r.gap_recovery = None
+        assert recovery.recoveries == 1
+        assert recovery.client.symbols == ['btcusd']
+        assert recovery.client.since == 0
@@ -1,13 +1,46 @@
 from .keys import public_key, private_key
+from .fakes import DetailsClient, Response
 import sys
+import json
+import base64
+import threading
+import pytest
+import requests
 sys.path.insert(0, '..')
 from gemini import PrivateClient
+from gemini.order_validation import OrderValidator
 
 
 def client():
     return PrivateClient(public_key, private_key, sandbox=True)
 
 
+def echo(url, headers=None, timeout=None):
+    """
+    Stands in for Session.post, answering with the decoded payload
+    """
+    payload = json.loads(base64.b64decode(headers['X-GEMINI-PAYLOAD']))
+    if payload.get('order_id') == 'unknown':
+        raise requests.ConnectionError('connection reset')
+    return Response(dict(payload, order_id=payload.get('order_id', '1')))
+
+
+def trades_server(timestamps):
+    """
+    Stands in for Session.post on /v1/mytrades, given the timestampms of
+    each tid. Like Gemini it returns the trades on or after the requested
+    timestamp, newest first.
+    """
+    trades = [{"tid": tid, "timestampms": timestampms, "price": "1",
+               "amount": "1"} for tid, timestampms in sorted(timestamps.items())]
+
+    def post(url, headers=None, timeout=None):
+        payload = json.loads(base64.b64decode(headers['X-GEMINI-PAYLOAD']))
+        page = [t for t in trades if t["timestampms"] >= payload["timestamp"]]
+        return Response(page[:payload["limit_trades"]][::-1])
+    return post
+
+
 class TestPrivateClient:
     def test_new_order(self):
         r = client()
@@ -156,3 +189,112 @@ class TestPrivateClient:
         r = client()
         revive_hearbeat = r.revive_hearbeat()
         assert type(revive_hearbeat) is dict
+
+    def test_new_orders(self, monkeypatch):
+        r = client()
+        monkeypatch.setattr(r._session, "post", echo)
+        orders = [{"symbol": "btcusd", "amount": "0.02", "price": str(6400 + i),
+                   "side": "buy", "options": ["maker-or-cancel"]}
+                  for i in range(5)]
+        orders[0]["client_order_id"] = "first"
+        new_orders = r.new_orders(orders, max_workers=3)
+        assert len(new_orders) == 5
+        assert new_orders["first"]["price"] == "6400"
+        for client_order_id, order in new_orders.items():
+            assert order["client_order_id"] == client_order_id
+            assert order["request"] == "/v1/order/new"
+        nonces = [order["nonce"] for order in new_orders.values()]
+        assert len(set(nonces)) == 5
+
+    def test_cancel_orders(self, monkeypatch):
+        r = client()
+        monkeypatch.setattr(r._session, "post", echo)
+        cancel_orders = r.cancel_orders(["1", "unknown"])
+        assert cancel_orders["1"]["request"] == "/v1/order/cancel"
+        assert cancel_orders["unknown"]["result"] == "error"
+
+    def test_iter_past_trades(self, monkeypatch):
+        r = client()
+        # Trades 3, 4 and 5 share a timestamp and straddle a page boundary
+        timestamps = {1: 1001, 2: 1002, 3: 1003, 4: 1003, 5: 1003, 6: 1006,
+                      7: 1007, 8: 1008}
+        monkeypatch.setattr(r._session, "post", trades_server(timestamps))
+        result = list(r.iter_past_trades("btcusd", limit_trades=4))
+        assert [t["tid"] for t in result] == [1, 2, 3, 4, 5, 6, 7, 8]
+
+    def test_iter_past_trades_crowded_timestamp(self, monkeypatch):
+        r = client()
+        monkeypatch.setattr(r._session, "post",
+                            trades_server({1: 1000, 2: 1000, 3: 1000}))
+        result = []
+        with pytest.raises(ValueError):
+            for trade in r.iter_past_trades("btcusd", limit_trades=2):
+                result.append(trade["tid"])
+        assert result == [1, 2]
+        result = list(r.iter_past_trades("btcusd", limit_trades=4))
+        assert [t["tid"] for t in result] == [1, 2, 3]
+
+    def test_new_orders_checks_every_order_first(self, monkeypatch):
+        r = client()
+        sent = []
+        monkeypatch.setattr(r._session, "post",
+                            lambda *args, **kwargs: sent.append(args))
+        good = {"symbol": "btcusd", "amount": "1", "price": "1",
+                "side": "buy", "client_order_id": "a"}
+        with pytest.raises(TypeError):
+            r.new_orders([good, dict(good, client_order_id="b", amount=1)])
+        with pytest.raises(TypeError):
+            r.new_orders([good, dict(good, client_order_id="b", colour="red")])
+        assert sent == []
+
+    def test_new_orders_resigns_out_of_order_nonces(self, monkeypatch):
+        r = client()
+        # The two requests are held until both are signed, then the one
+        # with the higher nonce reaches the exchange first
+        arrived = threading.Barrier(2)
+        first_done = threading.Event()
+        last_nonce = [0]
+        lock = threading.Lock()
+        calls = []
+
+        def post(url, headers=None, timeout=None):
+            payload = json.loads(base64.b64decode(headers['X-GEMINI-PAYLOAD']))
+            nonce = payload["nonce"]
+            with lock:
+                calls.append(nonce)
+                held = len(calls) <= 2
+            if held:
+                arrived.wait()
+                if nonce != max(calls[:2]):
+                    first_done.wait()
+            with lock:
+                if nonce <= last_nonce[0]:
+                    response = Response({"result": "error",
+                                         "reason": "InvalidNonce",
+                                         "message": "Nonce has not increased"},
+                                        400)
+                else:
+                    last_nonce[0] = nonce
+                    response = Response(dict(payload, order_id="1"))
+            if held and nonce == max(calls[:2]):
+                first_done.set()
+            return response
+        monkeypatch.setattr(r._session, "post", post)
+        orders = [{"symbol": "btcusd", "amount": "1", "price": str(i),
+                   "side": "buy", "client_order_id": str(i)} for i in range(2)]
+        new_orders = r.new_orders(orders, max_workers=2)
+        assert len(calls) == 3
+        for client_order_id, order in new_orders.items():
+            assert order["client_order_id"] == client_order_id
+
+    def test_new_order_validation(self, monkeypatch):
+        r = client()
+        monkeypatch.setattr(r._session, "post", echo)
+        monkeypatch.setattr(r, "order_validator",
+                            OrderValidator(DetailsClient()))
+        new_order = r.new_order("btcusd", "0.123456789", "6400.287", "buy")
+        assert (new_order["amount"], new_order["price"]) == ("0.12345678",
+                                                             "6400.28")
+        monkeypatch.setattr(r._session, "post", None)
+        with pytest.raises(ValueError):
+            r.new_order("btcusd", "0.000001", "6400", "buy")
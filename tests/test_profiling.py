@@ -0,0 +1,180 @@
+from .fakes import Response
+import sys
+import json
+import time
+import asyncio
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+import requests
+sys.path.insert(0, '..')
+from gemini import OrderEventsWS, PrivateClient
+from gemini.profiling import (Profiler, SamplingProfiler, TimedHTTPAdapter,
+                              take_connect_time)
+from gemini.public_client import shared_session
+from gemini.ratelimit import RateLimiter
+
+
+def profiled_ws():
+    r = OrderEventsWS('profiling-public-key', 'profiling-private-key')
+    r.listeners = []
+    return r
+
+
+class FakeSocket:
+    """
+    Hands out frames to BaseWebSocket._listen, stopping it after the last
+    """
+    def __init__(self, r, frames):
+        self.r = r
+        self.frames = list(frames)
+
+    def recv(self):
+        frame = self.frames.pop(0)
+        if not self.frames:
+            self.r.stop = True
+        return json.dumps(frame)
+
+
+def slow_listener(event):
+    time.sleep(0.002)
+
+
+class TestProfiler:
+    def test_websocket_callbacks(self):
+        r = profiled_ws()
+        r.add_listener(slow_listener)
+        profiler = Profiler()
+        profiler.attach(r)
+        r.ws = FakeSocket(r, [
+            {'type': 'subscription_ack', 'symbolFilter': []},
+            [{'type': 'accepted', 'order_id': '1', 'socket_sequence': 0,
+              'timestampms': 1}],
+            [{'type': 'booked', 'order_id': '1', 'socket_sequence': 1,
+              'timestampms': 2}]])
+        r.stop = False
+        r._listen()
+        profiler.detach(r)
+        assert r.profiler is None
+
+        stats = profiler.stats()
+        assert stats[('OrderEventsWS', 'decode')]['count'] == 3
+        assert stats[('OrderEventsWS', 'on_message')]['count'] == 3
+        listener = stats[('OrderEventsWS', 'on_message', 'slow_listener')]
+        assert listener['count'] == 2
+        assert listener['total_ms'] >= 4
+
+        lines = dict(line.rsplit(' ', 1)
+                     for line in profiler.collapsed().splitlines())
+        # The listener's time isn't counted again in on_message
+        assert int(lines['OrderEventsWS;on_message;slow_listener']) >= 4000
+        assert int(lines.get('OrderEventsWS;on_message', 0)) < 4000
+
+    def test_chrome_trace(self):
+        profiler = Profiler(trace_events=2)
+        profiler.record(('a',), 0, 3000)
+        profiler.record(('a', 'b'), 0, 1000)
+        profiler.record(('a', 'c'), 1000, 2000)
+        trace = profiler.chrome_trace()['traceEvents']
+        assert [event['name'] for event in trace] == ['b', 'c']
+        assert trace[0]['ph'] == 'X'
+        assert trace[0]['dur'] == 1.0
+        assert profiler.stats()[('a',)]['count'] == 1
+        profiler.reset()
+        assert profiler.stats() == {}
+
+    def test_api_query(self, monkeypatch):
+        r = PrivateClient('profiling-public-key', 'profiling-private-key')
+        r._private_rate_limiter = RateLimiter(100, 100)
+        monkeypatch.setattr(r._session, 'post', lambda url, headers, timeout:
+                            Response({'result': 'ok'}, elapsed=0.001))
+        profiler = Profiler()
+        profiler.attach(r)
+        assert r.api_query('/v1/heartbeat') == {'result': 'ok'}
+        stats = profiler.stats()
+        assert sorted(path[-1] for path in stats) == ['decode', 'read',
+                                                      'server', 'sign']
+        assert all(path[:2] == ('PrivateClient.api_query', '/v1/heartbeat')
+                   for path in stats)
+
+    def test_async_api_query(self):
+        pytest.importorskip('aiohttp')
+        from gemini.async_private_client import AsyncPrivateClient
+        from gemini.fake_exchange import FakeExchange
+        keys = ('profiling-async-public-key', 'profiling-async-private-key')
+        profiler = Profiler()
+        with FakeExchange(dict([keys])) as exchange:
+            r = AsyncPrivateClient(*keys)
+            exchange.connect(r)
+            r._private_rate_limiter = RateLimiter(100, 100)
+            profiler.attach(r)
+
+            async def query():
+                async with r:
+                    return await r.get_balance()
+            assert isinstance(asyncio.run(query()), list)
+        stats = profiler.stats()
+        assert sorted(path[-1] for path in stats) == ['decode', 'read',
+                                                      'server', 'sign']
+        assert all(path[:2] == ('AsyncPrivateClient.api_query', '/v1/balances')
+                   for path in stats)
+
+    def test_attach_times_connections(self):
+        class Client:
+            _session = shared_session('https://profiling.example.com')
+        assert not isinstance(Client._session.get_adapter('https://'),
+                              TimedHTTPAdapter)
+        r = Client()
+        Profiler().attach(r)
+        adapter = Client._session.get_adapter('https://')
+        assert isinstance(adapter, TimedHTTPAdapter)
+        Profiler().attach(r)
+        assert Client._session.get_adapter('https://') is adapter
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTimedHTTPAdapter:
+    def test_connect_time(self):
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        Thread(target=server.handle_request, daemon=True).start()
+        session = requests.Session()
+        session.mount('http://', TimedHTTPAdapter())
+        take_connect_time()
+        try:
+            session.get('http://127.0.0.1:{}/'.format(server.server_port))
+        finally:
+            server.server_close()
+        assert take_connect_time() > 0
+        assert take_connect_time() == 0
+
+
+def spin(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+class TestSamplingProfiler:
+    def test_samples(self):
+        sampler = SamplingProfiler(interval=0.001, thread_names=['spinner'])
+        with sampler:
+            assert sampler.running
+            thread = Thread(target=spin, args=(0.2,), name='spinner')
+            thread.start()
+            thread.join()
+        assert not sampler.running
+        assert sampler.samples > 0
+        stacks = sampler.collapsed().splitlines()
+        assert stacks
+        assert all(line.startswith('spinner;') for line in stacks)
+        assert any('test_profiling:spin ' in line for line in stacks)
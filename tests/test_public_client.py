@@ -1,6 +1,10 @@
 import sys
+import pytest
+import requests
 sys.path.insert(0, '..')
 from gemini import PublicClient
+from gemini.ratelimit import RateLimiter, RetryPolicy
+from .fakes import Response
 
 
 def client():
@@ -57,3 +61,85 @@ class TestPublicClient:
         assert "min_order_size" in symbol_details
         assert "status" in symbol_details
         assert "wrap_enabled" in symbol_details
+
+    def test_get_tickers(self, monkeypatch):
+        r = client()
+
+        def get_ticker(product_id):
+            if product_id == "BADUSD":
+                raise requests.ConnectionError("connection refused")
+            return {"bid": "1", "ask": "2", "last": "1"}
+        monkeypatch.setattr(r, "get_ticker", get_ticker)
+        tickers = r.get_tickers(["BTCUSD", "ETHUSD", "BADUSD"], max_workers=2)
+        assert list(tickers.keys()) == ["BTCUSD", "ETHUSD", "BADUSD"]
+        assert tickers["BTCUSD"]["bid"] == "1"
+        assert tickers["BADUSD"]["result"] == "error"
+        assert tickers["BADUSD"]["reason"] == "ConnectionError"
+
+    def test_iter_trade_history(self, monkeypatch):
+        r = client()
+        trades = [{"tid": tid, "timestampms": 1000 + tid, "price": "1",
+                   "amount": "1", "type": "buy"} for tid in range(1, 8)]
+        calls = []
+
+        def get(url, params=None, timeout=None):
+            calls.append(params)
+            since_tid = params.get("since_tid", 0)
+            page = [t for t in trades if t["tid"] > since_tid]
+            # Gemini returns the newest trades first
+            return Response(page[:params["limit_trades"]][::-1])
+        monkeypatch.setattr(r._session, "get", get)
+        result = list(r.iter_trade_history("BTCUSD", since=1000,
+                                           limit_trades=3))
+        assert [t["tid"] for t in result] == [1, 2, 3, 4, 5, 6, 7]
+        assert calls[0]["timestamp"] == 1000
+        assert calls[1]["since_tid"] == 3
+        result = list(r.iter_trade_history("BTCUSD", since_tid=2,
+                                           until=1005, limit_trades=3))
+        assert [t["tid"] for t in result] == [3, 4, 5]
+
+    def test_retry(self, monkeypatch):
+        r = client()
+        monkeypatch.setattr(r, "_rate_limiter", RateLimiter(1000, 1000))
+        monkeypatch.setattr(r, "retry_policy", RetryPolicy(max_retries=2,
+                                                           backoff=0))
+        responses = [Response({}, 429), Response({}, 503),
+                     Response(["btcusd"])]
+        monkeypatch.setattr(r._session, "get",
+                            lambda url, params=None, timeout=None: responses.pop(0))
+        assert r.symbols() == ["btcusd"]
+        responses = [Response({}, 429, {"Retry-After": "0"})] * 3
+        with pytest.raises(requests.HTTPError):
+            r.symbols()
+        assert r.rate_limit_stats()["public"]["acquired"] == 6
+
+    def test_get_candles(self, monkeypatch):
+        r = client()
+        urls = []
+
+        def get(url, params=None, timeout=None):
+            urls.append(url)
+            return Response([[1559755800000, 7781.6, 7820.23, 7776.56,
+                              7819.39, 34.7624802159]])
+        monkeypatch.setattr(r._session, "get", get)
+        candles = r.get_candles("btcusd", "5m")
+        assert candles[0][4] == 7819.39
+        assert urls == ["https://api.sandbox.gemini.com/v2/candles/btcusd/5m"]
+        r.get_price_feed()
+        assert urls[1] == "https://api.sandbox.gemini.com/v1/pricefeed"
+
+    def test_timeout(self, monkeypatch):
+        r = client()
+        monkeypatch.setattr(r, "_rate_limiter", RateLimiter(1000, 1000))
+        monkeypatch.setattr(r, "retry_policy", RetryPolicy(backoff=0))
+        monkeypatch.setattr(r, "timeout", 2.5)
+        timeouts = []
+
+        def get(url, params=None, timeout=None):
+            timeouts.append(timeout)
+            if len(timeouts) == 1:
+                raise requests.Timeout("read timed out")
+            return Response(["btcusd"])
+        monkeypatch.setattr(r._session, "get", get)
+        assert r.symbols() == ["btcusd"]
+        assert timeouts == [2.5, 2.5]
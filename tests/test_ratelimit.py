@@ -0,0 +1,28 @@
+import sys
+import time
+sys.path.insert(0, '..')
+from gemini.ratelimit import RateLimiter, RetryPolicy, shared_limiter
+
+
+class TestRateLimiter:
+    def test_acquire(self):
+        r = RateLimiter(rate=20, capacity=2)
+        assert r.acquire() == 0
+        assert r.acquire() == 0
+        start = time.monotonic()
+        assert r.acquire() > 0
+        assert time.monotonic() - start >= 0.04
+        stats = r.stats()
+        assert stats['acquired'] == 3
+        assert stats['queued'] == 1
+        assert stats['total_wait'] == stats['max_wait'] > 0
+
+    def test_shared_limiter(self):
+        assert shared_limiter('test', 1) is shared_limiter('test', 1)
+        assert shared_limiter('test', 1) is not shared_limiter('other', 1)
+
+    def test_retry_policy(self):
+        r = RetryPolicy(backoff=1, max_backoff=4)
+        assert 0 <= r.delay(0) <= 1
+        assert 0 <= r.delay(5) <= 4
+        assert r.delay(0, retry_after='2') == 2
@@ -0,0 +1,47 @@
+import sys
+from decimal import Decimal
+sys.path.insert(0, '..')
+from gemini.responses import Ticker, Trade, Balance, order_book
+
+
+class TestResponses:
+    def test_trade(self):
+        r = Trade({'timestamp': 1510408136,
+                   'timestampms': 1510408136595,
+                   'tid': 2199657585,
+                   'price': '6399.02',
+                   'amount': '0.03906848',
+                   'exchange': 'gemini',
+                   'type': 'buy'})
+        assert not hasattr(r, '__dict__')
+        assert r._price == '6399.02'
+        assert r.price == Decimal('6399.02')
+        assert r._price is r.price
+        assert r.tid == 2199657585
+        assert r.to_dict()['amount'] == Decimal('0.03906848')
+
+    def test_ticker(self):
+        r = Ticker({'bid': '6398.99',
+                    'ask': '6399.00',
+                    'volume': {'BTC': '15122.8052525982',
+                               'USD': '100216283.474911855175',
+                               'timestamp': 1510407900000},
+                    'last': '6398.99'})
+        assert r.ask - r.bid == Decimal('0.01')
+        assert r.volume['BTC'] == '15122.8052525982'
+
+    def test_order_book(self):
+        r = order_book({'bids': [{'price': '6399.00', 'amount': '1',
+                                  'timestamp': '1510408074'}],
+                        'asks': []})
+        assert r['bids'][0].price == Decimal('6399.00')
+        assert r['asks'] == []
+
+    def test_balance(self):
+        r = Balance.from_list([{'type': 'exchange',
+                                'currency': 'BTC',
+                                'amount': '19.17997442',
+                                'available': '19.17997442',
+                                'availableForWithdrawal': '19.17997442'}])
+        assert r[0].available == Decimal('19.17997442')
+        assert r[0].currency == 'BTC'
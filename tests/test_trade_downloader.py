@@ -0,0 +1,58 @@
+import sys
+import csv
+sys.path.insert(0, '..')
+from gemini import PublicClient, TradeDownloader
+
+TRADES = [{'tid': tid, 'timestampms': 1000 + tid, 'timestamp': 1,
+           'price': '1.00', 'amount': '0.1', 'exchange': 'gemini',
+           'type': 'buy'} for tid in range(1, 11)]
+
+
+def client(monkeypatch, trades):
+    r = PublicClient(sandbox=True)
+
+    def iter_trade_history(product_id, since=None, since_tid=None):
+        for trade in trades:
+            if since_tid is None or trade['tid'] > since_tid:
+                yield trade
+    monkeypatch.setattr(r, 'iter_trade_history', iter_trade_history)
+    return r
+
+
+def read_tids(path):
+    with open(path, newline='') as f:
+        return [int(row['tid']) for row in csv.DictReader(f)]
+
+
+class TestTradeDownloader:
+    def test_sync(self, monkeypatch, tmp_path):
+        r = TradeDownloader(client(monkeypatch, TRADES[:6]), str(tmp_path),
+                            checkpoint_every=2)
+        assert r.sync(['btcusd', 'ethusd']) == {'btcusd': 6, 'ethusd': 6}
+        assert r.checkpoints == {'btcusd': 6, 'ethusd': 6}
+        r = TradeDownloader(client(monkeypatch, TRADES), str(tmp_path))
+        assert r.sync_symbol('btcusd') == 4
+        assert read_tids(r.path('btcusd')) == list(range(1, 11))
+
+    def test_resume_after_crash(self, monkeypatch, tmp_path):
+        r = TradeDownloader(client(monkeypatch, TRADES[:4]), str(tmp_path),
+                            checkpoint_every=2)
+        r.sync_symbol('btcusd')
+        # Simulate a crash after rows 5 and half of 6 were written but
+        # before the checkpoint was updated
+        r._save_checkpoint('btcusd', 2)
+        with open(r.path('btcusd'), 'a') as f:
+            f.write('5,1005,1,1.00,0.1,gemini,buy\n6,100')
+        r = TradeDownloader(client(monkeypatch, TRADES), str(tmp_path))
+        assert r.last_tid('btcusd') == 5
+        assert r.sync_symbol('btcusd') == 5
+        assert read_tids(r.path('btcusd')) == [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+
+    def test_sync_reports_io_errors(self, monkeypatch, tmp_path):
+        r = TradeDownloader(client(monkeypatch, TRADES), str(tmp_path))
+        # A directory where the csv file should be makes opening it fail
+        (tmp_path / 'ethusd.csv').mkdir()
+        result = r.sync(['btcusd', 'ethusd'])
+        assert result['btcusd'] == 10
+        assert result['ethusd']['result'] == 'error'
+        assert result['ethusd']['reason'] == 'IsADirectoryError'